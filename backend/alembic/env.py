@@ -7,6 +7,7 @@ from app.database import Base  # Добавляем импорт
 from app.models.user import User  # Импортируем модели
 from app.models.tracking import Tracking
 from app.models.price_history import PriceHistory
+from app.models.parse_job import ParseJob
 import os
 
 # this is the Alembic Config object, which provides
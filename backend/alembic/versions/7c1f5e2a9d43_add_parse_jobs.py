@@ -0,0 +1,49 @@
+"""Add parse_jobs queue table
+
+Revision ID: 7c1f5e2a9d43
+Revises: 20d9013b090c
+Create Date: 2026-10-17 22:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1f5e2a9d43'
+down_revision: Union[str, None] = '20d9013b090c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('parse_jobs',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('wb_item_id', sa.Integer(), nullable=False),
+    sa.Column('tracking_id', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('priority', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('locked_by', sa.String(length=100), nullable=True),
+    sa.Column('locked_until', sa.TIMESTAMP(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('result', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('finished_at', sa.TIMESTAMP(), nullable=True),
+    sa.ForeignKeyConstraint(['tracking_id'], ['trackings.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_parse_jobs_claim', 'parse_jobs', ['priority', 'run_after'], unique=False,
+                    postgresql_where=sa.text("status IN ('queued', 'running')"))
+    op.create_index('ix_parse_jobs_tracking_id', 'parse_jobs', ['tracking_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_parse_jobs_tracking_id', table_name='parse_jobs')
+    op.drop_index('ix_parse_jobs_claim', table_name='parse_jobs', postgresql_where=sa.text("status IN ('queued', 'running')"))
+    op.drop_table('parse_jobs')
@@ -0,0 +1,28 @@
+"""Add refresh_trackings to parse_jobs
+
+Revision ID: b3e8d41f6a20
+Revises: 7c1f5e2a9d43
+Create Date: 2026-10-17 23:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8d41f6a20'
+down_revision: Union[str, None] = '7c1f5e2a9d43'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('parse_jobs', sa.Column('refresh_trackings', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+    op.create_index('ix_parse_jobs_wb_item_id', 'parse_jobs', ['wb_item_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_parse_jobs_wb_item_id', table_name='parse_jobs')
+    op.drop_column('parse_jobs', 'refresh_trackings')
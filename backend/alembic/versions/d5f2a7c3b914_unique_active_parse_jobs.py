@@ -0,0 +1,56 @@
+"""Unique active parse_jobs per tracking and per item refresh
+
+Revision ID: d5f2a7c3b914
+Revises: b3e8d41f6a20
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f2a7c3b914'
+down_revision: Union[str, None] = 'b3e8d41f6a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE = "status IN ('queued', 'running')"
+
+
+def _retire_duplicates(key: str, where: str) -> None:
+    # Из уже накопившихся дублей активной остается одна задача: выполняемая, иначе самая старая
+    op.execute(f"""
+        UPDATE parse_jobs
+        SET status = 'dead', last_error = 'duplicate of an active job', finished_at = now()
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY {key} ORDER BY status = 'running' DESC, created_at, id
+                ) AS rn
+                FROM parse_jobs
+                WHERE {where}
+            ) ranked
+            WHERE rn > 1
+        )
+    """)
+
+
+def upgrade() -> None:
+    _retire_duplicates('wb_item_id', f"refresh_trackings AND {ACTIVE}")
+    _retire_duplicates('tracking_id', f"tracking_id IS NOT NULL AND {ACTIVE}")
+    op.create_index(
+        'uq_parse_jobs_active_refresh', 'parse_jobs', ['wb_item_id'], unique=True,
+        postgresql_where=sa.text(f"refresh_trackings AND {ACTIVE}"),
+    )
+    op.create_index(
+        'uq_parse_jobs_active_tracking', 'parse_jobs', ['tracking_id'], unique=True,
+        postgresql_where=sa.text(ACTIVE),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_parse_jobs_active_tracking', table_name='parse_jobs')
+    op.drop_index('uq_parse_jobs_active_refresh', table_name='parse_jobs')
@@ -1,6 +1,6 @@
 from pydantic import Field
 from pydantic_settings import BaseSettings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -8,6 +8,9 @@ from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
 
 import os
+import shutil
+import threading
+import time
 from selenium.common.exceptions import WebDriverException
 from app.utils.logger import logger
 import tempfile
@@ -34,7 +37,108 @@ class Settings(BaseSettings):
     SELENIUM_HEADLESS: bool = True
     SELENIUM_TIMEOUT: int = 15
     SELENIUM_BINARY_LOCATION: str = "/usr/bin/google-chrome"
-    # CHROME_DRIVER_PATH: str = Field(..., env="CHROME_DRIVER_PATH")
+    SELENIUM_READY_TIMEOUT: int = 10  # Верхняя граница ожидания цены на странице
+    SELENIUM_READY_POLL: float = 0.1
+    # Профиль блокировки ресурсов через CDP для каждого режима парсера: none / media / strict
+    SELENIUM_BLOCK_PROFILES: Dict[str, str] = {"dom": "media", "network": "strict"}
+    # dom - разбор отрисованной страницы, network - JSON карточки из XHR страницы
+    SELENIUM_PARSE_MODE: str = "dom"
+    SELENIUM_HTML_BACKEND: str = "auto"  # auto / lxml / bs4 - разбор page_source
+    # Пул "теплых" браузеров (на каждый процесс-воркер)
+    SELENIUM_POOL_SIZE: int = 1
+    SELENIUM_POOL_MAX_PAGES: int = 50  # После N страниц браузер пересоздается
+    SELENIUM_POOL_MAX_RSS_MB: int = 1024  # Порог памяти Chrome для пересоздания
+    SELENIUM_POOL_LEASE_TIMEOUT: int = 60
+    # browser - отдельный Chrome на каждый слот пула; tabs - один Chrome на процесс,
+    # параллельные парсинги в SELENIUM_TABS_PER_BROWSER вкладках с арендой вкладки
+    SELENIUM_POOL_MODE: str = "browser"
+    SELENIUM_TABS_PER_BROWSER: int = 4
+    # Путь к chromedriver; если задан - ChromeDriverManager не вызывается
+    CHROME_DRIVER_PATH: Optional[str] = None
+    # Офлайн-режим: никаких обращений webdriver_manager к сети,
+    # используется CHROME_DRIVER_PATH или chromedriver из PATH
+    CHROME_DRIVER_OFFLINE: bool = False
+    # Настройки API карточек WB (card.wb.ru)
+    WB_API_TIMEOUT: int = 5
+    WB_API_BATCH_SIZE: int = 50  # Сколько артикулов передавать в одном запросе nm=1;2;3
+    # Кэш результатов /api/products/{article}
+    PRODUCT_CACHE_TTL: int = 600
+    PRODUCT_CACHE_MAX_SIZE: int = 5000
+    # redis://host:6379/0 - общий кэш для всех воркеров uvicorn; пусто - кэш в памяти процесса
+    PRODUCT_CACHE_REDIS_URL: Optional[str] = None
+    # Негативный кэш: короткие TTL для артикулов без результата
+    NEGATIVE_CACHE_TTL_NOT_FOUND: int = 1800
+    # "Нет товара" только по ответу API, без проверки страницы Selenium
+    NEGATIVE_CACHE_TTL_NOT_FOUND_UNCONFIRMED: int = 60
+    NEGATIVE_CACHE_TTL_BLOCKED: int = 60
+    NEGATIVE_CACHE_TTL_OUT_OF_STOCK: int = 300
+    # Координация парсинга между процессами (воркеры API, cron, воркеры очереди) через Redis:
+    # одновременные парсинги одного артикула объединяются. Пусто - PRODUCT_CACHE_REDIS_URL;
+    # без Redis координация действует только внутри процесса
+    PARSER_REDIS_URL: Optional[str] = None
+    PARSE_FLIGHT_LEASE: int = 60  # Аренда парсинга артикула; продлевается, пока парсинг идет
+    PARSE_FLIGHT_POLL_INTERVAL: float = 0.2  # Как часто ожидающие из других процессов проверяют результат
+    # Пакетный парсинг (ParserService.parse_many)
+    PARSER_BACKENDS: List[str] = ["api", "selenium"]
+    PARSER_BATCH_CONCURRENCY: int = 2
+    # Частота запросов к WB (API и страницы Selenium): в секунду и всплеск. С Redis (PARSER_REDIS_URL)
+    # лимит общий для всех процессов, без него - на процесс. Пользовательские запросы его не ждут
+    WB_RATE_LIMIT: float = 2.0
+    WB_RATE_BURST: int = 4
+    # Сколько секунд ждать ответа API, прежде чем параллельно запустить Selenium
+    PARSER_HEDGE_DELAY: float = 1.5
+    # Адаптивный выбор бэкенда: окно последних попыток и минимум для доверия статистике
+    PARSER_ROUTING_WINDOW: int = 50
+    PARSER_ROUTING_MIN_SAMPLES: int = 5
+    # Отдельная статистика по артикулу (для артикулов, которые стабильно не отдает API)
+    PARSER_ROUTING_PER_ARTICLE: bool = False
+    PARSER_ROUTING_MAX_ARTICLES: int = 10000
+    # Размыкатель: сколько неудач подряд отключают бэкенд и через сколько секунд его перепроверить
+    PARSER_BREAKER_FAILURES: int = 5
+    PARSER_BREAKER_COOLDOWN: int = 60
+    # Сколько ответов без данных подряд (нет товара / без цены) тоже отключают бэкенд
+    PARSER_BREAKER_EMPTY_RESULTS: int = 20
+    # Фоновая проба отключенного бэкенда: таймаут и артикул-канарейка (заведомо существующий
+    # товар в наличии). Без канарейки API пробуется артикулом запроса, а Selenium не пробуется
+    # (полный парсинг страницы ради проверки слишком дорог) - он возвращается в работу на
+    # испытание, и первая же неудача снова его отключает
+    PARSER_PROBE_TIMEOUT: int = 15
+    PARSER_PROBE_ARTICLE: str = ""
+    # Общий асинхронный HTTP-клиент (keep-alive пул соединений)
+    HTTP_CLIENT_TIMEOUT: int = 10
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 100
+    HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST: int = 8
+    HTTP_CLIENT_KEEPALIVE: int = 30
+    # Диагностическая трасса парсинга: off / warning / info / debug
+    PARSER_TRACE: str = "off"
+    PARSER_TRACE_MAX_ARTICLES: int = 200
+    PARSER_TRACE_MAX_EVENTS: int = 500
+    # Пул процессов-воркеров Selenium в API (app.state.process_pool)
+    PARSER_WORKERS: int = 2
+    PARSER_WORKER_MAX_TASKS: int = 100  # После N парсингов воркер перезапускается (0 - без ограничения)
+    PARSER_WORKER_MAX_RSS_MB: int = 2048  # Порог памяти воркера вместе с его Chrome для пересоздания пула
+    PARSER_WORKER_RSS_CHECK_INTERVAL: float = 10.0  # Не чаще раза в N секунд проверять эту память
+    PARSER_WORKER_SHUTDOWN_TIMEOUT: int = 10  # Сколько ждать воркеры при остановке, прежде чем убить
+    # Очередь к Selenium: интерактивные парсинги (сайт, бот) обслуживаются раньше плановых
+    PARSE_QUEUE_CAPACITY: int = 0  # Одновременных Selenium-парсингов процесса (0 - по PARSER_WORKERS)
+    PARSE_QUEUE_INTERACTIVE_RESERVE: int = 1  # Слоты, которые плановые парсинги не занимают
+    # Мощность, общая для всех процессов (через Redis, PARSER_REDIS_URL): Selenium-парсингов
+    # одновременно во всех воркерах API, прогоне из cron и воркерах очереди. Резерв
+    # и приоритет интерактивных действуют и здесь. Не больше, чем браузеров у этих процессов
+    # вместе: API - PARSE_QUEUE_CAPACITY или PARSER_WORKERS (воркер пула процессов парсит по
+    # одной странице), cron - PARSER_BATCH_CONCURRENCY, воркер очереди - PARSE_JOB_WORKER_CONCURRENCY.
+    # Пусто - эта сумма для одного процесса каждого вида; при нескольких процессах API или
+    # воркеров очереди задайте явно. 0 - только очередь процесса
+    PARSE_SHARED_CAPACITY: Optional[int] = None
+    PARSE_SHARED_LEASE: int = 120  # Аренда слота; продлевается, пока парсинг идет
+    PARSE_SHARED_POLL_INTERVAL: float = 0.2  # Как часто ожидающие проверяют свободные слоты
+    # Очередь задач парсинга в Postgres (parse_jobs) и воркеры run_parse_worker.py
+    PARSE_JOB_VISIBILITY_TIMEOUT: int = 180  # Не завершенная за это время задача снова доступна воркерам
+    PARSE_JOB_MAX_ATTEMPTS: int = 3  # После стольких неудачных попыток задача уходит в dead
+    PARSE_JOB_RETRY_BACKOFF: int = 30  # Пауза перед повтором: backoff * 2^(попытка - 1) секунд
+    PARSE_JOB_POLL_INTERVAL: float = 2.0  # Пауза воркера, когда очередь пуста
+    PARSE_JOB_WORKER_CONCURRENCY: int = 2  # Задач одновременно в одном процессе воркера (и браузеров в его пуле)
+    PARSE_JOB_MAX_RUNTIME: int = 900  # Дольше аренда выполняющейся задачи не продлевается (зависший воркер)
     # SMTP настройки
     SMTP_SERVER: str = "smtp.yandex.ru"
     SMTP_PORT: int = 465
@@ -55,6 +159,52 @@ class Settings(BaseSettings):
 settings = Settings()
 
 
+_chromedriver_path: Optional[str] = None
+_chromedriver_lock = threading.Lock()
+
+
+def resolve_chromedriver_path() -> str:
+    """
+    Определяет путь к chromedriver один раз на процесс.
+    Порядок: CHROME_DRIVER_PATH -> (офлайн) chromedriver из PATH -> ChromeDriverManager.
+    Воркеры пула получают готовый путь через set_chromedriver_path.
+    """
+    global _chromedriver_path
+    if _chromedriver_path:
+        return _chromedriver_path
+
+    with _chromedriver_lock:
+        if _chromedriver_path:
+            return _chromedriver_path
+
+        started = time.perf_counter()
+        if settings.CHROME_DRIVER_PATH:
+            path, source = settings.CHROME_DRIVER_PATH, "settings"
+        elif settings.CHROME_DRIVER_OFFLINE:
+            path, source = shutil.which("chromedriver"), "PATH"
+            if not path:
+                raise RuntimeError(
+                    "CHROME_DRIVER_OFFLINE is set but CHROME_DRIVER_PATH is empty "
+                    "and chromedriver is not found in PATH"
+                )
+        else:
+            path, source = ChromeDriverManager().install(), "webdriver_manager"
+
+        if not os.path.isfile(path):
+            raise RuntimeError(f"chromedriver not found: {path}")
+
+        _chromedriver_path = path
+        logger.info(f"ChromeDriver resolved via {source} in "
+                    f"{(time.perf_counter() - started) * 1000:.1f}ms: {path}")
+        return path
+
+
+def set_chromedriver_path(path: str):
+    """Передает уже определенный путь к chromedriver в новый процесс (инициализатор воркера)"""
+    global _chromedriver_path
+    _chromedriver_path = path
+
+
 # Конфигурация Selenium (вычисляется при первом использовании)
 def get_selenium_config() -> Dict[str, Any]:
     chrome_options = Options()
@@ -67,7 +217,7 @@ def get_selenium_config() -> Dict[str, Any]:
     
     return {
         'driver': lambda: webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()),
+            service=Service(resolve_chromedriver_path()),
             options=chrome_options
         ),
         'wait_timeout': settings.SELENIUM_TIMEOUT
@@ -83,6 +233,11 @@ def get_driver():
     options = Options()
 
     options.add_argument(f"--user-data-dir={user_data_dir}")
+    # driver.get возвращается после DOMContentLoaded, дальше ждем цену явно
+    options.page_load_strategy = 'eager'
+    if settings.SELENIUM_PARSE_MODE == 'network':
+        # CDP-события Network доступны через performance-лог chromedriver
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
     
     # Основные параметры
     options.add_argument("--headless=new")
@@ -115,20 +270,30 @@ def get_driver():
     options.add_argument("--safebrowsing-disable-auto-update")
     options.add_argument("--disable-web-security")
     options.add_argument("--disable-features=VizDisplayCompositor")
+    # Фоновые вкладки не должны замедляться - в режиме вкладок страницы грузятся параллельно
+    options.add_argument("--disable-background-timer-throttling")
+    options.add_argument("--disable-backgrounding-occluded-windows")
+    options.add_argument("--disable-renderer-backgrounding")
 
 
     service = None
     driver = None
 
     try:
-        # Автоматическая установка ChromeDriver
+        # Путь к ChromeDriver определяется один раз на процесс
+        resolve_started = time.perf_counter()
+        driver_path = resolve_chromedriver_path()
+        resolve_ms = (time.perf_counter() - resolve_started) * 1000
+
         service = Service(
-            ChromeDriverManager().install(),
+            driver_path,
             service_args=['--verbose'],
             log_path='/tmp/chromedriver.log'
         )
         
+        launch_started = time.perf_counter()
         driver = webdriver.Chrome(service=service, options=options)
+        launch_ms = (time.perf_counter() - launch_started) * 1000
 
         # Изменяем свойства браузера
         driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
@@ -138,22 +303,27 @@ def get_driver():
                 });
             '''
         })
-        # Устанавливаем таймауты
+        # Устанавливаем таймауты. Неявное ожидание отключено: готовность
+        # страницы проверяется явно, а implicit wait замедляет каждый промах find_element
         driver.set_page_load_timeout(60)
-        driver.implicitly_wait(10)
+        driver.implicitly_wait(0)
+
+        # Сохраняем путь к профилю, чтобы удалить его при закрытии драйвера
+        driver.temp_dir = temp_dir
 
-        logger.info(f"WebDriver successfully initialized with temp dir: {temp_dir}")
+        logger.info(f"WebDriver successfully initialized with temp dir: {temp_dir} "
+                    f"(driver lookup: {resolve_ms:.1f}ms, browser launch: {launch_ms:.0f}ms)")
         return driver
      
     except WebDriverException as e:
         logger.error(f"WebDriver initialization failed: {str(e)}")
         if driver:
             driver.quit()
+        shutil.rmtree(temp_dir, ignore_errors=True)
         raise
     except Exception as e:
         logger.error(f"Unexpected error during WebDriver initialization: {str(e)}")
         if driver:
             driver.quit()
-        import shutil
         shutil.rmtree(temp_dir, ignore_errors=True)
         raise
\ No newline at end of file
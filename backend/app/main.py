@@ -4,7 +4,7 @@ print(sys.path)
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-import concurrent.futures
+import asyncio
 import logging
 import time
 import os
@@ -21,7 +21,12 @@ from app.routes.telegram_auth import router as telegram_auth_router
 from app.routes.telegram_oauth import router as telegram_oauth_router
 
 from app.database import engine
-from app.models import user, tracking as tracking_models, price_history
+from app.services.http_client import close_http_client
+from app.services.redis_client import close_redis
+from app.services.parser_service import ParserService
+from app.services.product_cache import ProductCache
+from app.services.worker_pool import ParserWorkerPool
+from app.models import user, tracking as tracking_models, price_history, parse_job
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -42,11 +47,22 @@ async def lifespan(app: FastAPI):
     user.Base.metadata.create_all(bind=engine)
     tracking_models.Base.metadata.create_all(bind=engine)
     price_history.Base.metadata.create_all(bind=engine)
+    parse_job.Base.metadata.create_all(bind=engine)
     
-    # Инициализируем Process Pool Executor для Selenium
-    logger.info("Initializing Process Pool Executor...")
-    process_pool = concurrent.futures.ProcessPoolExecutor(max_workers=2)
+    # Пул процессов для Selenium: путь к ChromeDriver определяется один раз
+    # и передается воркерам, воркеры пересоздаются по числу задач и памяти
+    logger.info("Initializing parser worker pool...")
+    process_pool = ParserWorkerPool()
     app.state.process_pool = process_pool
+    logger.info(f"Parser worker pool: {process_pool.workers} workers, "
+                f"max {process_pool.max_tasks} tasks / {process_pool.max_rss_mb} MB per worker")
+    
+    # Кэш результатов парсинга по артикулу
+    app.state.product_cache = ProductCache()
+    logger.info(f"Product cache: {app.state.product_cache.backend.name}, TTL {app.state.product_cache.ttl}s")
+    
+    # Оркестрация парсинга (гонка API и Selenium) в основном процессе
+    app.state.parser_service = ParserService()
     
     logger.info("✅ Telegram bot: Run separately with 'python run_bot.py'")
     logger.info("✅ Application startup completed")
@@ -56,10 +72,16 @@ async def lifespan(app: FastAPI):
     # === SHUTDOWN LOGIC ===
     logger.info("Shutting down application...")
     
-    # Завершаем Process Pool Executor
+    await app.state.product_cache.close()
+    
+    # Закрываем пул HTTP-соединений и клиент Redis координации парсинга
+    await close_http_client()
+    await close_redis()
+
+    # Завершаем воркеры и добиваем оставшиеся после них Chrome/chromedriver
     if process_pool:
-        logger.info("Shutting down Process Pool Executor...")
-        process_pool.shutdown(wait=False)
+        logger.info("Shutting down parser worker pool...")
+        await asyncio.get_running_loop().run_in_executor(None, process_pool.close)
     
     logger.info("✅ Application shutdown completed")
 
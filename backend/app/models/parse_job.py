@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Text, TIMESTAMP, Index, and_
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.sql import func
+from app.database import Base
+import uuid
+
+class ParseJob(Base):
+    __tablename__ = "parse_jobs"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    wb_item_id = Column(Integer, nullable=False)
+    # Плановое обновление отслеживания; пусто - разовый парсинг артикула
+    tracking_id = Column(UUID(as_uuid=True), ForeignKey("trackings.id", ondelete="CASCADE"), nullable=True)
+    # Плановое обновление артикула: результат пишется во все его активные отслеживания
+    refresh_trackings = Column(Boolean, nullable=False, default=False, server_default="false")
+    priority = Column(Integer, nullable=False, default=0)  # Меньше - раньше (индекс в PRIORITIES)
+    status = Column(String(16), nullable=False, default="queued")  # queued / running / done / dead
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_after = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    locked_by = Column(String(100))
+    locked_until = Column(TIMESTAMP)
+    last_error = Column(Text)
+    result = Column(JSONB)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    finished_at = Column(TIMESTAMP)
+    
+    __table_args__ = (
+        # Выборка воркером: только незавершенные задачи
+        Index(
+            "ix_parse_jobs_claim", "priority", "run_after",
+            postgresql_where=status.in_(["queued", "running"]),
+        ),
+        Index("ix_parse_jobs_tracking_id", "tracking_id"),
+        Index("ix_parse_jobs_wb_item_id", "wb_item_id"),
+        # Не больше одной ждущей или выполняемой задачи на отслеживание и на обновление
+        # артикула - дубли отсекает сама БД (enqueue: INSERT ... ON CONFLICT DO NOTHING)
+        Index(
+            "uq_parse_jobs_active_refresh", "wb_item_id", unique=True,
+            postgresql_where=and_(refresh_trackings, status.in_(["queued", "running"])),
+        ),
+        Index(
+            "uq_parse_jobs_active_tracking", "tracking_id", unique=True,
+            postgresql_where=status.in_(["queued", "running"]),
+        ),
+    )
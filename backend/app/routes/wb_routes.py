@@ -1,20 +1,35 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+from uuid import UUID
+from app.config import settings
+from app.database import get_db
+from app.models.parse_job import ParseJob
+from app.services import job_queue
 from app.services.parser_service import ParserService
+from app.services.singleflight import parse_flight
+from app.services.parse_queue import PRIORITY_INTERACTIVE, parse_queue
+from app.services.base_parser import ParserBlockedError, ProductNotFoundError
+from app.services.product_cache import OUTCOME_BLOCKED, OUTCOME_NOT_FOUND, OUTCOME_OUT_OF_STOCK
+from app.services.rate_limiter import wb_rate_limiter
 from async_timeout import timeout
 import asyncio
 import logging
 from app.utils.logger import get_parser_logger
+from app.utils.timing import parse_timings
+from app.utils.trace import parse_trace
 
 router = APIRouter()
 logger = get_parser_logger()
 
 @router.get("/products/{article}")
-async def get_product(article: str, request: Request):
+async def get_product(article: str, request: Request, response: Response):
     """
     Парсинг товара с Wildberries через изолированный процесс
     """
     # Получаем process_pool из state приложения
     process_pool = request.app.state.process_pool
+    product_cache = request.app.state.product_cache
+    parser_service = request.app.state.parser_service
 
     try:
         logger.info(f"Parsing product: {article}")
@@ -25,17 +40,80 @@ async def get_product(article: str, request: Request):
                 detail="Артикул должен содержать только цифры (минимум 6 символов)"
             )
         
-        # Запускаем парсинг в отдельном процессе с таймаутом
+        # Свежий результат из кэша отдаем сразу, без парсинга
+        cached = await product_cache.get(article)
+        if cached is not None:
+            data, age = cached
+            logger.info(f"Cache hit for {article} (age {age:.0f}s)")
+            response.headers["X-Cache"] = "HIT"
+            response.headers["Age"] = str(int(age))
+            return data
+        
+        # Недавно выяснили, что товара нет / страница заблокирована - не парсим повторно
+        negative = await product_cache.get_negative(article)
+        if negative is not None:
+            outcome, data, remaining = negative
+            logger.info(f"Negative cache hit for {article}: {outcome} ({remaining:.0f}s left)")
+            response.headers["X-Cache"] = "NEGATIVE"
+            return negative_response(outcome, data, remaining)
+        
+        # Запускаем парсинг с таймаутом: сначала API, Selenium - в отдельном процессе,
+        # если API не ответил за PARSER_HEDGE_DELAY.
+        # Одновременные запросы одного артикула ждут один и тот же парсинг
         async with timeout(45):
             # Используем ProcessPoolExecutor для изоляции
-            data = await asyncio.get_event_loop().run_in_executor(
-                process_pool, 
-                parse_product_wrapper, 
-                article
-            )
+            async def run_selenium(article: str):
+                try:
+                    data, report = await asyncio.get_event_loop().run_in_executor(
+                        process_pool, 
+                        parse_product_wrapper, 
+                        article
+                    )
+                except Exception as e:
+                    record_worker_report(article, getattr(e, 'report', None))
+                    raise
+                record_worker_report(article, report)
+                return data
+            
+            try:
+                # Пользователь ждет ответа (сайт или Telegram-бот) - Selenium вне очереди плановых;
+                # лимит к WB не ждем, но запросы в него засчитываются
+                data = await parse_flight.do(
+                    article, lambda: parser_service.parse_hedged(
+                        article, selenium_runner=run_selenium, priority=PRIORITY_INTERACTIVE,
+                        rate_limiter=wb_rate_limiter
+                    )
+                )
+            except ProductNotFoundError as e:
+                # Вердикт одного API (Selenium не проверял страницу) - кэшируем ненадолго
+                await product_cache.set_negative(
+                    article, OUTCOME_NOT_FOUND,
+                    ttl=None if e.confirmed else settings.NEGATIVE_CACHE_TTL_NOT_FOUND_UNCONFIRMED
+                )
+                raise HTTPException(status_code=404, detail="Товар не найден")
+            except ParserBlockedError:
+                await product_cache.set_negative(article, OUTCOME_BLOCKED)
+                raise HTTPException(
+                    status_code=503,
+                    detail="Wildberries не отдал данные товара, попробуйте позже",
+                    headers={"Retry-After": str(product_cache.negative_ttls[OUTCOME_BLOCKED])}
+                )
             logger.info(f"Successfully parsed product: {article}")
+        
+        if data.get('price') is None:
+            # Карточка без цены - товара нет в наличии; кэшируем на короткий срок
+            await product_cache.set_negative(article, OUTCOME_OUT_OF_STOCK, data)
+            response.headers["X-Cache"] = "MISS"
             return data
+        
+        await product_cache.set(article, data)
+        response.headers["X-Cache"] = "MISS"
+        response.headers["Age"] = "0"
+        return data
                 
+    except HTTPException:
+        raise
+        
     except asyncio.TimeoutError:
         logger.warning(f"Timeout parsing article: {article}")
         raise HTTPException(status_code=408, detail="Parser timeout")
@@ -45,15 +123,150 @@ async def get_product(article: str, request: Request):
         raise HTTPException(status_code=500, detail=str(e))
     
 
+def negative_response(outcome: str, data, remaining: float):
+    """Ответ по записи негативного кэша"""
+    if outcome == OUTCOME_NOT_FOUND:
+        raise HTTPException(status_code=404, detail="Товар не найден")
+    if outcome == OUTCOME_BLOCKED:
+        raise HTTPException(
+            status_code=503,
+            detail="Wildberries не отдал данные товара, попробуйте позже",
+            headers={"Retry-After": str(max(1, int(remaining)))}
+        )
+    # OUTCOME_OUT_OF_STOCK - отдаем карточку без цены
+    return data
+
+
+@router.get("/products-cache/stats")
+async def get_product_cache_stats(request: Request):
+    """Счетчики кэша товаров"""
+    return request.app.state.product_cache.stats()
+
+
+@router.get("/products-backends/stats")
+async def get_parser_backend_stats(request: Request):
+    """Доля успехов, задержка и состояние размыкателя по бэкендам парсинга"""
+    return request.app.state.parser_service.stats()
+
+
+@router.get("/products-timings/stats")
+async def get_parse_timing_stats():
+    """Гистограммы длительности этапов парсинга по бэкендам"""
+    return parse_timings.as_dict()
+
+
+@router.get("/products/{article}/trace")
+async def get_parse_trace(article: str):
+    """
+    Диагностическая трасса последнего парсинга артикула.
+    Пишется только при PARSER_TRACE отличном от off
+    """
+    lines = parse_trace.dump(article)
+    if not lines:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Трасса для артикула не найдена (PARSER_TRACE={parse_trace.level})"
+        )
+    return {"article": article, "trace": lines}
+
+
+@router.post("/products/{article}/jobs", status_code=202)
+async def create_parse_job(article: str, priority: str = PRIORITY_INTERACTIVE, db: Session = Depends(get_db)):
+    """
+    Ставит парсинг в очередь parse_jobs для воркеров run_parse_worker.py.
+    Результат - GET /products-jobs/{job_id}
+    """
+    if not article.isdigit() or len(article) < 6:
+        raise HTTPException(
+            status_code=400, 
+            detail="Артикул должен содержать только цифры (минимум 6 символов)"
+        )
+    try:
+        job = job_queue.enqueue(db, int(article), priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return parse_job_response(job)
+
+
+@router.get("/products-jobs/stats")
+async def get_parse_job_stats(db: Session = Depends(get_db)):
+    """Задачи parse_jobs по состояниям и классам приоритета"""
+    return job_queue.stats(db)
+
+
+@router.get("/products-jobs/{job_id}")
+async def get_parse_job(job_id: UUID, db: Session = Depends(get_db)):
+    """Состояние задачи парсинга и ее результат"""
+    job = db.query(ParseJob).filter(ParseJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return parse_job_response(job)
+
+
+def parse_job_response(job: ParseJob) -> dict:
+    return {
+        "id": job.id,
+        "article": str(job.wb_item_id),
+        "status": job.status,
+        "priority": job_queue.priority_name(job.priority),
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "last_error": job.last_error,
+        "result": job.result,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+@router.get("/products-queue/stats")
+async def get_parse_queue_stats():
+    """Глубина очереди, занятые слоты и время ожидания Selenium по классам приоритета"""
+    return parse_queue.stats()
+
+
+@router.get("/products-workers/stats")
+async def get_parser_worker_stats(request: Request):
+    """Поколение пула процессов Selenium, пересоздания и память воркеров"""
+    return request.app.state.process_pool.stats()
+
+
+@router.get("/products-inflight/stats")
+async def get_parse_inflight_stats():
+    """Сколько парсингов запущено и сколько запросов присоединились к уже идущим, в том числе в других процессах"""
+    return parse_flight.stats()
+
+
 def parse_product_wrapper(article: str):
     """
     Обертка для запуска в отдельном процессе
-    Каждый процесс создает свой экземпляр ParserService
+    Каждый процесс создает свой экземпляр ParserService.
+    Возвращает (данные, отчет): этапы парсинга и трасса для основного процесса;
+    при ошибке отчет лежит в exception.report
     """
+    # Создаем новый экземпляр для каждого процесса
+    parser_service = ParserService()
     try:
-        # Создаем новый экземпляр для каждого процесса
-        parser_service = ParserService()
-        return parser_service.parse_wb_product(article)
+        data = parser_service.parse_wb_product(article)
     except Exception as e:
         logger.error(f"Error in process for article {article}: {str(e)}")
-        raise
\ No newline at end of file
+        e.report = worker_report(parser_service, article)
+        raise
+    return data, worker_report(parser_service, article)
+
+
+def worker_report(parser_service: ParserService, article: str) -> dict:
+    return {
+        'timings': parser_service.selenium_timings(),
+        'trace': parse_trace.export(article),
+    }
+
+
+def record_worker_report(article: str, report):
+    """Добавляет этапы и трассу парсинга из процесса пула в основной процесс"""
+    if not report:
+        return
+    timings = report.get('timings')
+    if timings:
+        parse_timings.record(timings['backend'], timings['phases'])
+    if report.get('trace'):
+        parse_trace.load(article, report['trace'])
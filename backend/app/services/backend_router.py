@@ -0,0 +1,281 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from app.config import settings
+from app.utils.logger import logger
+
+# Исходы одной попытки парсинга бэкендом
+ATTEMPT_OK = 'ok'                  # данные с ценой
+ATTEMPT_EMPTY = 'empty'            # карточка без цены
+ATTEMPT_NOT_FOUND = 'not_found'
+ATTEMPT_BLOCKED = 'blocked'
+ATTEMPT_ERROR = 'error'
+ATTEMPT_CANCELLED = 'cancelled'    # проиграла гонку и была отменена
+
+# Исходы, которые говорят о неисправности бэкенда (ошибки API, антибот у Selenium).
+# "Нет товара" и "нет в наличии" - ответ по существу, на маршрутизацию не влияют
+FAILURE_OUTCOMES = {ATTEMPT_BLOCKED, ATTEMPT_ERROR}
+# Ответ без данных. По одному - ответ по существу, но длинная серия подряд (API
+# отдает пустой products на все артикулы) - тоже неисправность
+EMPTY_OUTCOMES = {ATTEMPT_EMPTY, ATTEMPT_NOT_FOUND}
+
+
+class BackendStats:
+    """Скользящее окно последних попыток бэкенда: доля успехов и задержка"""
+
+    def __init__(self, window: int):
+        self._samples = deque(maxlen=window)  # (успех, секунды)
+
+    def record(self, outcome: str, seconds: float):
+        if outcome == ATTEMPT_OK or outcome in FAILURE_OUTCOMES:
+            self._samples.append((outcome == ATTEMPT_OK, seconds))
+
+    @property
+    def count(self) -> int:
+        return len(self._samples)
+
+    @property
+    def success_rate(self) -> Optional[float]:
+        if not self._samples:
+            return None
+        return sum(1 for ok, _ in self._samples if ok) / len(self._samples)
+
+    @property
+    def avg_latency(self) -> Optional[float]:
+        if not self._samples:
+            return None
+        return sum(seconds for _, seconds in self._samples) / len(self._samples)
+
+    def expected_time(self) -> float:
+        """
+        Ожидаемое время до валидного результата: средняя длительность попытки,
+        деленная на долю успешных (сколько попыток в среднем нужно на один успех)
+        """
+        success_rate = self.success_rate
+        if not success_rate:
+            return float('inf')
+        return self.avg_latency / success_rate
+
+
+class CircuitBreaker:
+    """
+    Размыкатель для бэкенда: после `failure_threshold` неудач подряд или
+    `empty_threshold` ответов без данных подряд бэкенд выводится из
+    маршрутизации на `cooldown` секунд, затем одна фоновая пробная попытка
+    решает - вернуть его или снова разомкнуть. Проба должна вернуть данные:
+    ответ без данных ее не проходит.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'  # идет пробная попытка
+
+    def __init__(self, failure_threshold: int, cooldown: float, empty_threshold: int):
+        self.failure_threshold = failure_threshold
+        self.empty_threshold = empty_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.empties = 0
+        self.opened_at = 0.0
+
+    def record(self, outcome: str):
+        if outcome == ATTEMPT_CANCELLED:
+            return
+        if outcome in FAILURE_OUTCOMES:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.open()
+        elif outcome in EMPTY_OUTCOMES:
+            self.failures = 0
+            self.empties += 1
+            if self.state == self.HALF_OPEN or self.empties >= self.empty_threshold:
+                self.open()
+        else:
+            self.failures = 0
+            self.empties = 0
+            self.state = self.CLOSED
+
+    def open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+    def trial(self):
+        """Возвращает бэкенд в работу без пробы: первая же неудача снова его размыкает"""
+        self.state = self.CLOSED
+        self.failures = max(0, self.failure_threshold - 1)
+        self.empties = 0
+
+    @property
+    def is_closed(self) -> bool:
+        return self.state == self.CLOSED
+
+    def probe_due(self) -> bool:
+        return self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown
+
+
+class BackendRouter:
+    """
+    Выбор порядка бэкендов парсинга по наблюдаемой статистике.
+
+    Бэкенды с известным конечным ожидаемым временем идут первыми (быстрее - раньше),
+    затем бэкенды без статистики в порядке PARSER_BACKENDS, затем стабильно
+    неуспешные. Бэкенды с разомкнутым размыкателем пропускаются, пока фоновая
+    проба не покажет, что они снова работают.
+    """
+
+    def __init__(
+        self,
+        window: Optional[int] = None,
+        min_samples: Optional[int] = None,
+        per_article: Optional[bool] = None,
+        max_articles: Optional[int] = None,
+        failure_threshold: Optional[int] = None,
+        cooldown: Optional[float] = None,
+        empty_threshold: Optional[int] = None,
+        probe_timeout: Optional[float] = None,
+    ):
+        self.window = window or settings.PARSER_ROUTING_WINDOW
+        self.min_samples = min_samples or settings.PARSER_ROUTING_MIN_SAMPLES
+        self.per_article = settings.PARSER_ROUTING_PER_ARTICLE if per_article is None else per_article
+        self.max_articles = max_articles or settings.PARSER_ROUTING_MAX_ARTICLES
+        self.failure_threshold = failure_threshold or settings.PARSER_BREAKER_FAILURES
+        self.cooldown = cooldown or settings.PARSER_BREAKER_COOLDOWN
+        self.empty_threshold = empty_threshold or settings.PARSER_BREAKER_EMPTY_RESULTS
+        self.probe_timeout = probe_timeout or settings.PARSER_PROBE_TIMEOUT
+
+        self._stats: Dict[str, BackendStats] = {}
+        self._article_stats: "OrderedDict[tuple, BackendStats]" = OrderedDict()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._wins: Dict[str, int] = {}
+        self._outcomes: Dict[str, Dict[str, int]] = {}
+        self._probes: Set[asyncio.Task] = set()
+
+    def order(self, backends: Iterable[str], article: Optional[str] = None) -> List[str]:
+        """Бэкенды в порядке попыток; если все разомкнуты - пробуем все как есть"""
+        backends = list(backends)
+        available = [backend for backend in backends if self._breaker(backend).is_closed]
+        if not available:
+            return backends
+
+        def rank(backend: str):
+            stats = self._stats_for(backend, article)
+            if stats.count < self.min_samples:
+                return (1, backends.index(backend))
+            expected = stats.expected_time()
+            return (2, 0) if expected == float('inf') else (0, expected)
+
+        return sorted(available, key=rank)
+
+    def is_available(self, backend: str) -> bool:
+        return self._breaker(backend).is_closed
+
+    def record(self, backend: str, outcome: str, seconds: float, article: Optional[str] = None):
+        self._outcomes.setdefault(backend, {})
+        self._outcomes[backend][outcome] = self._outcomes[backend].get(outcome, 0) + 1
+        if outcome == ATTEMPT_CANCELLED:
+            return
+
+        self._backend_stats(backend).record(outcome, seconds)
+        if self.per_article and article is not None:
+            self._article_entry(backend, article).record(outcome, seconds)
+
+        breaker = self._breaker(backend)
+        was_closed = breaker.is_closed
+        breaker.record(outcome)
+        if was_closed and not breaker.is_closed:
+            logger.warning(f"Parser backend '{backend}' disabled for {breaker.cooldown}s after "
+                           f"{breaker.failures} failures / {breaker.empties} empty results in a row")
+        elif not was_closed and breaker.is_closed:
+            logger.info(f"Parser backend '{backend}' is healthy again")
+
+    def record_win(self, backend: str):
+        self._wins[backend] = self._wins.get(backend, 0) + 1
+
+    def schedule_probes(self, backends: Iterable[str], probes: Dict[str, Callable[[], Awaitable[None]]]):
+        """
+        Запускает в фоне пробную попытку для разомкнутых бэкендов, у которых истек cooldown.
+        `probes[backend]()` выполняет попытку и сам записывает ее исход через record;
+        проба дольше probe_timeout считается ошибкой. Бэкенд без пробы возвращается
+        в работу на испытание (CircuitBreaker.trial).
+        """
+        for backend in backends:
+            breaker = self._breaker(backend)
+            if not breaker.probe_due():
+                continue
+            probe = probes.get(backend)
+            if probe is None:
+                breaker.trial()
+                logger.info(f"Parser backend '{backend}' re-enabled on trial")
+                continue
+            breaker.state = CircuitBreaker.HALF_OPEN
+            logger.info(f"Re-probing parser backend '{backend}'")
+            task = asyncio.ensure_future(self._run_probe(backend, probe))
+            self._probes.add(task)
+            task.add_done_callback(self._probes.discard)
+
+    async def _run_probe(self, backend: str, probe: Callable[[], Awaitable[None]]):
+        breaker = self._breaker(backend)
+        try:
+            await asyncio.wait_for(probe(), self.probe_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Probe of parser backend '{backend}' timed out after {self.probe_timeout}s")
+            self.record(backend, ATTEMPT_ERROR, self.probe_timeout)
+        except Exception as e:
+            logger.warning(f"Probe of parser backend '{backend}' failed: {str(e)}")
+        finally:
+            # Проба прервана без исхода - ждем следующего окна
+            if breaker.state == CircuitBreaker.HALF_OPEN:
+                breaker.open()
+
+    def stats(self) -> dict:
+        result = {}
+        for backend in sorted(set(self._stats) | set(self._outcomes)):
+            stats = self._backend_stats(backend)
+            breaker = self._breaker(backend)
+            expected = stats.expected_time() if stats.count else None
+            result[backend] = {
+                'samples': stats.count,
+                'success_rate': round(stats.success_rate, 3) if stats.count else None,
+                'avg_latency': round(stats.avg_latency, 3) if stats.count else None,
+                'expected_time': None if expected in (None, float('inf')) else round(expected, 3),
+                'wins': self._wins.get(backend, 0),
+                'outcomes': dict(self._outcomes.get(backend, {})),
+                'circuit': breaker.state,
+                'consecutive_failures': breaker.failures,
+                'consecutive_empty': breaker.empties,
+            }
+        return result
+
+    def _stats_for(self, backend: str, article: Optional[str]) -> BackendStats:
+        if self.per_article and article is not None:
+            entry = self._article_stats.get((backend, article))
+            if entry is not None and entry.count >= self.min_samples:
+                return entry
+        return self._backend_stats(backend)
+
+    def _backend_stats(self, backend: str) -> BackendStats:
+        if backend not in self._stats:
+            self._stats[backend] = BackendStats(self.window)
+        return self._stats[backend]
+
+    def _article_entry(self, backend: str, article: str) -> BackendStats:
+        key = (backend, article)
+        entry = self._article_stats.get(key)
+        if entry is None:
+            entry = self._article_stats[key] = BackendStats(self.window)
+        self._article_stats.move_to_end(key)
+        while len(self._article_stats) > self.max_articles:
+            self._article_stats.popitem(last=False)
+        return entry
+
+    def _breaker(self, backend: str) -> CircuitBreaker:
+        if backend not in self._breakers:
+            self._breakers[backend] = CircuitBreaker(self.failure_threshold, self.cooldown, self.empty_threshold)
+        return self._breakers[backend]
+
+
+# Общий объект процесса: статистика копится по всем экземплярам ParserService
+backend_router = BackendRouter()
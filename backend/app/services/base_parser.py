@@ -1,5 +1,6 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Optional
 
 class BaseParser(ABC):
     @abstractmethod
@@ -14,6 +15,45 @@ class BaseParser(ABC):
         """
         pass
 
+class AsyncBaseParser(ABC):
+    """Асинхронный парсер - вызывается через await прямо из event loop"""
+
+    @abstractmethod
+    async def parse_async(self, article: str) -> Dict[str, Any]:
+        """Асинхронный парсинг одного товара
+        Args:
+            article: Артикул товара
+        Returns:
+            Словарь с данными товара
+        Raises:
+            ParserError: В случае ошибок парсинга
+        """
+        pass
+
+    async def parse_many(self, articles: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Парсинг нескольких товаров; None для артикулов, которые не удалось получить"""
+        unique = list(dict.fromkeys(str(article) for article in articles))
+        results = await asyncio.gather(
+            *(self.parse_async(article) for article in unique),
+            return_exceptions=True
+        )
+        return {
+            article: None if isinstance(result, Exception) else result
+            for article, result in zip(unique, results)
+        }
+
 class ParserError(Exception):
     """Базовое исключение для ошибок парсинга"""
-    pass
\ No newline at end of file
+    pass
+
+class ProductNotFoundError(ParserError):
+    """Товара с таким артикулом не существует"""
+
+    def __init__(self, *args, confirmed: bool = True):
+        super().__init__(*args)
+        # False - вывод только по ответу API (артикула нет в card.wb.ru), страница товара не проверялась
+        self.confirmed = confirmed
+
+class ParserBlockedError(ParserError):
+    """Страница не отдала данных (антибот-защита или пустая отрисовка)"""
+    pass
@@ -0,0 +1,108 @@
+import asyncio
+from typing import Any, Optional
+
+import aiohttp
+
+from app.config import settings
+from app.utils.logger import logger
+
+
+class HttpClientError(Exception):
+    """Ошибка HTTP-запроса асинхронного клиента"""
+    pass
+
+
+class AsyncHttpClient:
+    """
+    Асинхронный HTTP-клиент с пулом keep-alive соединений.
+
+    Одна aiohttp-сессия переиспользуется всеми запросами, поэтому TCP/TLS
+    рукопожатие выполняется только при открытии нового соединения.
+    Число соединений ограничено глобально и на каждый хост.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        max_connections_per_host: Optional[int] = None,
+        keepalive_timeout: Optional[float] = None,
+    ):
+        self.timeout = timeout or settings.HTTP_CLIENT_TIMEOUT
+        self.max_connections = max_connections or settings.HTTP_CLIENT_MAX_CONNECTIONS
+        self.max_connections_per_host = max_connections_per_host or settings.HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST
+        self.keepalive_timeout = keepalive_timeout or settings.HTTP_CLIENT_KEEPALIVE
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        # Сессия привязана к event loop: для нового loop (asyncio.run в скрипте) создаем новую
+        if self._session is None or self._session.closed or self._loop is not loop:
+            if self._session is not None:
+                self._close_stale(self._session, self._loop)
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    limit_per_host=self.max_connections_per_host,
+                    keepalive_timeout=self.keepalive_timeout,
+                ),
+            )
+            self._loop = loop
+        return self._session
+
+    @staticmethod
+    def _close_stale(session: aiohttp.ClientSession, loop: asyncio.AbstractEventLoop):
+        """
+        Закрывает сессию прошлого event loop. Ее соединения принадлежат тому loop,
+        поэтому и закрываются в нем; если он уже закрыт, закрыть их штатно нельзя -
+        коннектор только помечается закрытым
+        """
+        if session.closed:
+            return
+        if loop.is_running():
+            # Прошлый loop работает в другом потоке
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+            return
+        connector = session.connector
+        session.detach()
+        if connector is not None:
+            asyncio.ensure_future(connector.close(), loop=asyncio.get_running_loop() if loop.is_closed() else loop)
+
+    async def get_json(self, url: str, timeout: Optional[float] = None, **kwargs) -> Any:
+        if timeout is not None:
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+        try:
+            async with self.session.get(url, **kwargs) as response:
+                response.raise_for_status()
+                # WB отдает JSON с content-type text/plain
+                return await response.json(content_type=None)
+        except asyncio.TimeoutError:
+            raise HttpClientError(f"Timeout after {timeout or self.timeout}s: {url}")
+        except aiohttp.ClientError as e:
+            raise HttpClientError(f"{type(e).__name__}: {str(e)}")
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+_client: Optional[AsyncHttpClient] = None
+
+
+def get_http_client() -> AsyncHttpClient:
+    """Общий HTTP-клиент процесса"""
+    global _client
+    if _client is None:
+        _client = AsyncHttpClient()
+    return _client
+
+
+async def close_http_client():
+    if _client is not None:
+        await _client.close()
+        logger.info("HTTP client closed")
@@ -0,0 +1,266 @@
+from datetime import timedelta
+from typing import Optional
+import uuid
+
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from app.config import settings
+from app.models.parse_job import ParseJob
+from app.services.parse_queue import PRIORITIES, PRIORITY_SCHEDULED
+from app.utils.logger import logger
+
+# Состояния задачи парсинга
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'   # взята воркером до locked_until
+JOB_DONE = 'done'
+JOB_DEAD = 'dead'         # попытки исчерпаны, ждет разбора человеком
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+# last_error дублей, которые миграция d5f2a7c3b914 вывела в dead перед созданием уникальных индексов
+DUPLICATE_ERROR = 'duplicate of an active job'
+
+
+def priority_rank(priority: str) -> int:
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown parse priority: {priority}")
+    return PRIORITIES.index(priority)
+
+
+def priority_name(rank: int) -> str:
+    return PRIORITIES[rank]
+
+
+def enqueue(
+    db: Session,
+    wb_item_id: int,
+    priority: str = PRIORITY_SCHEDULED,
+    tracking_id: Optional[uuid.UUID] = None,
+    refresh_trackings: bool = False,
+    max_attempts: Optional[int] = None,
+) -> Optional[ParseJob]:
+    """
+    Ставит задачу парсинга в очередь.
+
+    tracking_id - обновить одно отслеживание; refresh_trackings - обновить
+    все активные отслеживания артикула. Если такое обновление уже ждет
+    или выполняется, новая задача не создается (None). Дубли отсекают
+    частичные уникальные индексы parse_jobs (INSERT ... ON CONFLICT DO NOTHING),
+    так что одновременные enqueue из разных процессов не создадут двух задач
+    """
+    job_id = db.execute(
+        insert(ParseJob)
+        .values(
+            id=uuid.uuid4(),
+            wb_item_id=wb_item_id,
+            tracking_id=tracking_id,
+            refresh_trackings=refresh_trackings,
+            priority=priority_rank(priority),
+            status=JOB_QUEUED,
+            attempts=0,
+            max_attempts=max_attempts or settings.PARSE_JOB_MAX_ATTEMPTS,
+        )
+        .on_conflict_do_nothing()
+        .returning(ParseJob.id)
+    ).scalar()
+    db.commit()
+    if job_id is None:
+        return None
+    return db.get(ParseJob, job_id)
+
+
+def claim(db: Session, worker_id: str, visibility_timeout: Optional[int] = None) -> Optional[ParseJob]:
+    """
+    Берет следующую задачу: самую приоритетную, затем самую старую.
+
+    SELECT ... FOR UPDATE SKIP LOCKED: воркеры на любых хостах не блокируют
+    друг друга и не получают одну задачу дважды. Задача в running, чей
+    locked_until истек (воркер умер или завис), снова доступна - это и есть
+    таймаут видимости. Время берется из БД, поэтому часы хостов не важны.
+    """
+    visibility_timeout = visibility_timeout or settings.PARSE_JOB_VISIBILITY_TIMEOUT
+    while True:
+        job = db.query(ParseJob).filter(
+            or_(
+                and_(ParseJob.status == JOB_QUEUED, ParseJob.run_after <= func.now()),
+                and_(ParseJob.status == JOB_RUNNING, ParseJob.locked_until < func.now()),
+            )
+        ).order_by(
+            ParseJob.priority, ParseJob.run_after
+        ).with_for_update(skip_locked=True).limit(1).first()
+
+        if job is None:
+            db.commit()
+            return None
+
+        if job.status == JOB_RUNNING:
+            logger.warning(f"Parse job {job.id} lost by {job.locked_by} (visibility timeout expired)")
+            if job.attempts >= job.max_attempts:
+                _dead_letter(job, "Visibility timeout expired on the last attempt")
+                db.commit()
+                continue
+
+        job.status = JOB_RUNNING
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.locked_until = func.now() + timedelta(seconds=visibility_timeout)
+        db.commit()
+        db.refresh(job)
+        # Отвязываем от сессии: последующие commit не перечитают поля задачи,
+        # а locked_by и attempts нужны как есть для проверки владения в _finish
+        db.expunge(job)
+        return job
+
+
+def complete(db: Session, job: ParseJob, result: Optional[dict], error: Optional[str] = None) -> bool:
+    """
+    Завершает задачу. False - задачу уже забрал другой воркер
+    (этот не уложился в таймаут видимости), результат не записан
+    """
+    return _finish(db, job, {
+        ParseJob.status: JOB_DONE,
+        ParseJob.result: result,
+        ParseJob.last_error: error,
+        ParseJob.finished_at: func.now(),
+    })
+
+
+def fail(db: Session, job: ParseJob, error: str, retry: bool = True) -> bool:
+    """
+    Неудачная попытка: повтор с экспоненциальной паузой или dead,
+    если попытки исчерпаны или повтор бессмыслен
+    """
+    if retry and job.attempts < job.max_attempts:
+        delay = settings.PARSE_JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+        values = {
+            ParseJob.status: JOB_QUEUED,
+            ParseJob.run_after: func.now() + timedelta(seconds=delay),
+            ParseJob.locked_by: None,
+            ParseJob.locked_until: None,
+            ParseJob.last_error: error,
+        }
+    else:
+        values = {
+            ParseJob.status: JOB_DEAD,
+            ParseJob.last_error: error,
+            ParseJob.finished_at: func.now(),
+        }
+    finished = _finish(db, job, values)
+    if finished and values[ParseJob.status] == JOB_DEAD:
+        logger.error(f"Parse job {job.id} (article {job.wb_item_id}) moved to dead after {job.attempts} attempts: {error}")
+    return finished
+
+
+def extend_lease(db: Session, job: ParseJob, visibility_timeout: Optional[int] = None) -> bool:
+    """Продлевает locked_until выполняющейся задачи. False - задача уже не наша"""
+    visibility_timeout = visibility_timeout or settings.PARSE_JOB_VISIBILITY_TIMEOUT
+    updated = _owned(db, job).update(
+        {ParseJob.locked_until: func.now() + timedelta(seconds=visibility_timeout)},
+        synchronize_session=False
+    )
+    db.commit()
+    return bool(updated)
+
+
+def lock_owned(db: Session, job: ParseJob) -> bool:
+    """
+    Блокирует строку задачи до конца текущей транзакции, если задача все еще наша.
+    Записи результата, сделанные в этой же транзакции до complete, попадут в БД
+    только вместе с завершением задачи
+    """
+    return _owned(db, job).with_for_update().first() is not None
+
+
+def _owned(db: Session, job: ParseJob):
+    # Задача все еще наша: тот же воркер и та же попытка
+    return db.query(ParseJob).filter(
+        ParseJob.id == job.id,
+        ParseJob.status == JOB_RUNNING,
+        ParseJob.locked_by == job.locked_by,
+        ParseJob.attempts == job.attempts,
+    )
+
+
+def _finish(db: Session, job: ParseJob, values: dict) -> bool:
+    updated = _owned(db, job).update(values, synchronize_session=False)
+    if not updated:
+        # Вместе с завершением откатываются и записи результата этой транзакции
+        db.rollback()
+        logger.warning(f"Parse job {job.id} was taken over by another worker, result dropped")
+        return False
+    db.commit()
+    return True
+
+
+def _dead_letter(job: ParseJob, error: str):
+    job.status = JOB_DEAD
+    job.last_error = error
+    job.finished_at = func.now()
+    logger.error(f"Parse job {job.id} (article {job.wb_item_id}) moved to dead: {error}")
+
+
+def retry_dead(db: Session, job_id: Optional[uuid.UUID] = None) -> int:
+    """
+    Возвращает задачу (или все задачи) из dead в очередь с новым набором попыток.
+
+    Не возвращаются задачи, у которых уже есть активная пара (то же отслеживание
+    или то же обновление артикула - их отсекают уникальные индексы parse_jobs),
+    и дубли, выведенные миграцией. Возвращает число задач, вернувшихся в очередь;
+    0 - возвращать нечего
+    """
+    active = aliased(ParseJob)
+    has_active_twin = exists().where(
+        active.status.in_(ACTIVE_STATUSES),
+        or_(
+            and_(ParseJob.tracking_id.isnot(None), active.tracking_id == ParseJob.tracking_id),
+            and_(ParseJob.refresh_trackings, active.refresh_trackings, active.wb_item_id == ParseJob.wb_item_id),
+        ),
+    )
+    query = db.query(ParseJob.id).filter(
+        ParseJob.status == JOB_DEAD,
+        ~has_active_twin,
+        or_(ParseJob.last_error.is_(None), ParseJob.last_error != DUPLICATE_ERROR),
+    )
+    if job_id is not None:
+        query = query.filter(ParseJob.id == job_id)
+
+    retried = 0
+    for (dead_id,) in query.order_by(ParseJob.created_at).all():
+        try:
+            # Две мертвые задачи одного отслеживания вернуть нельзя - вторая упрется в индекс
+            with db.begin_nested():
+                retried += db.query(ParseJob).filter(
+                    ParseJob.id == dead_id,
+                    ParseJob.status == JOB_DEAD,
+                ).update({
+                    ParseJob.status: JOB_QUEUED,
+                    ParseJob.attempts: 0,
+                    ParseJob.run_after: func.now(),
+                    ParseJob.locked_by: None,
+                    ParseJob.locked_until: None,
+                    ParseJob.finished_at: None,
+                }, synchronize_session=False)
+        except IntegrityError:
+            logger.info(f"Parse job {dead_id} not retried: an active job for it already exists")
+    db.commit()
+    return retried
+
+
+def stats(db: Session) -> dict:
+    """Число задач по состояниям и классам приоритета, возраст самой старой ожидающей"""
+    counts = db.query(ParseJob.status, ParseJob.priority, func.count()).group_by(
+        ParseJob.status, ParseJob.priority
+    ).all()
+    result = {status: {name: 0 for name in PRIORITIES} for status in (JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_DEAD)}
+    for status, rank, count in counts:
+        result.setdefault(status, {})[priority_name(rank)] = count
+
+    oldest = db.query(func.extract('epoch', func.now() - func.min(ParseJob.run_after))).filter(
+        ParseJob.status == JOB_QUEUED,
+        ParseJob.run_after <= func.now()
+    ).scalar()
+    return {
+        'jobs': result,
+        'oldest_queued_seconds': round(float(oldest), 1) if oldest is not None else None,
+    }
@@ -0,0 +1,287 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from app.config import settings
+from app.services.redis_client import get_redis, keep_lease, redis_url, release_lease
+from app.utils.logger import logger
+from app.utils.timing import Histogram
+
+T = TypeVar('T')
+
+# Классы приоритета парсинга
+PRIORITY_INTERACTIVE = 'interactive'  # пользователь ждет ответа: сайт, Telegram-бот
+PRIORITY_SCHEDULED = 'scheduled'      # плановое обновление цен отслеживаний
+# Порядок обслуживания: раньше в списке - раньше получает слот
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_SCHEDULED)
+
+
+def deployment_browsers() -> int:
+    """
+    Браузеры одного процесса API, прогона из cron и воркера очереди вместе -
+    мощность по умолчанию для SharedCapacity
+    """
+    return (
+        (settings.PARSE_QUEUE_CAPACITY or settings.PARSER_WORKERS)
+        + settings.PARSER_BATCH_CONCURRENCY
+        + settings.PARSE_JOB_WORKER_CONCURRENCY
+    )
+
+
+class SharedCapacity:
+    """
+    Браузерная мощность, общая для всех процессов (воркеры API, прогон из cron,
+    воркеры очереди), в Redis.
+
+    Слоты - ключи с арендой: SET NX с продлением, пока парсинг идет; слот
+    упавшего процесса освобождается, когда истечет аренда. Интерактивные
+    парсинги берут любой слот, начиная с резервных; плановые - только слоты
+    сверх interactive_reserve и ни одного, пока интерактивный парсинг в каком-либо
+    процессе ждет слота. Ожидающие опрашивают Redis раз в poll_interval.
+    Без Redis (или если он недоступен) ограничение не действует - остается
+    очередь процесса.
+    """
+
+    PREFIX = 'm2r:capacity:'
+    # Ожидающий интерактивный парсинг перестает учитываться, если не обновлял отметку столько секунд
+    WAITER_TTL = 5
+
+    def __init__(
+        self,
+        capacity: Optional[int] = None,
+        interactive_reserve: Optional[int] = None,
+        lease: Optional[float] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        if capacity is None:
+            capacity = settings.PARSE_SHARED_CAPACITY
+        browsers = deployment_browsers()
+        if capacity is None:
+            capacity = browsers
+        elif capacity > browsers and redis_url():
+            # Лишние слоты не ограничивают ничего: парсинг все равно ждет браузер своего процесса
+            logger.warning(f"PARSE_SHARED_CAPACITY={capacity} exceeds the {browsers} browsers of one API, "
+                           f"cron and queue worker process; make sure that many browsers actually run")
+        self.capacity = capacity
+        reserve = settings.PARSE_QUEUE_INTERACTIVE_RESERVE if interactive_reserve is None else interactive_reserve
+        # Те же лимиты классов, что и в очереди процесса
+        self.scheduled_limit = max(1, self.capacity - reserve)
+        self.lease = lease or settings.PARSE_SHARED_LEASE
+        self.poll_interval = poll_interval or settings.PARSE_SHARED_POLL_INTERVAL
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0 and bool(redis_url())
+
+    async def acquire(self, priority: str) -> Optional[Tuple[str, str, asyncio.Future]]:
+        """Ждет общий слот; возвращает аренду для release или None, если ограничения нет"""
+        client = get_redis() if self.capacity > 0 else None
+        if client is None:
+            return None
+        if priority == PRIORITY_INTERACTIVE:
+            slots = range(self.capacity)
+        else:
+            slots = range(self.capacity - self.scheduled_limit, self.capacity)
+        token = uuid.uuid4().hex
+        waiters_key = self.PREFIX + 'interactive-waiters'
+        try:
+            try:
+                while True:
+                    if priority == PRIORITY_INTERACTIVE:
+                        await client.zadd(waiters_key, {token: time.time() + self.WAITER_TTL})
+                        key = await self._try_slots(client, slots, token)
+                    else:
+                        await client.zremrangebyscore(waiters_key, '-inf', time.time())
+                        # Пока пользователь где-то ждет, плановые новых слотов не берут
+                        key = None if await client.zcard(waiters_key) else await self._try_slots(client, slots, token)
+                    if key is not None:
+                        break
+                    await asyncio.sleep(self.poll_interval)
+            finally:
+                if priority == PRIORITY_INTERACTIVE:
+                    await self._forget_waiter(client, waiters_key, token)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Shared parse capacity unavailable, using process queue only: {str(e)}")
+            return None
+
+        lease_ms = int(self.lease * 1000)
+        heartbeat = asyncio.ensure_future(keep_lease(client, key, token, lease_ms, f"Parse slot {key}"))
+        return key, token, heartbeat
+
+    async def _forget_waiter(self, client, waiters_key: str, token: str):
+        try:
+            await client.zrem(waiters_key, token)
+        except Exception:
+            pass  # Отметка устареет сама через WAITER_TTL
+
+    async def _try_slots(self, client, slots: range, token: str) -> Optional[str]:
+        for slot in slots:
+            key = f'{self.PREFIX}slot:{slot}'
+            if await client.set(key, token, nx=True, px=int(self.lease * 1000)):
+                return key
+        return None
+
+    async def release(self, lease: Optional[Tuple[str, str, asyncio.Future]]):
+        if lease is None:
+            return
+        key, token, heartbeat = lease
+        heartbeat.cancel()
+        try:
+            await release_lease(get_redis(), key, token)
+        except Exception as e:
+            # Слот освободится, когда истечет аренда
+            logger.warning(f"Failed to release parse slot {key}: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'capacity': self.capacity,
+            'scheduled_limit': self.scheduled_limit,
+            'errors': self.errors,
+        }
+
+
+class ParseQueue:
+    """
+    Очередь за браузерной мощностью с классами приоритета.
+
+    Одновременно выполняется не больше `capacity` Selenium-парсингов.
+    Освободившийся слот получает ожидающий из самого приоритетного класса
+    (внутри класса - по порядку прихода), поэтому интерактивный запрос обходит
+    все плановые. Плановые парсинги занимают не больше capacity - interactive_reserve
+    слотов: они заполняют простаивающую мощность, а пользователю не приходится
+    ждать, пока закончатся уже идущие. Начатый парсинг не прерывается.
+
+    Очередь действует внутри процесса. С `shared` получивший слот парсинг
+    ждет еще и слот SharedCapacity - мощности, общей для всех процессов.
+    """
+
+    def __init__(
+        self,
+        capacity: Optional[int] = None,
+        interactive_reserve: Optional[int] = None,
+        shared: Optional[SharedCapacity] = None,
+    ):
+        self.capacity = capacity or settings.PARSE_QUEUE_CAPACITY or settings.PARSER_WORKERS
+        reserve = settings.PARSE_QUEUE_INTERACTIVE_RESERVE if interactive_reserve is None else interactive_reserve
+        self.limits = {
+            PRIORITY_INTERACTIVE: self.capacity,
+            # Хотя бы один слот плановым оставляем, иначе они не выполнятся никогда
+            PRIORITY_SCHEDULED: max(1, self.capacity - reserve),
+        }
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {priority: deque() for priority in PRIORITIES}
+        self._running = {priority: 0 for priority in PRIORITIES}
+        self._enqueued = {priority: 0 for priority in PRIORITIES}
+        self._max_queued = {priority: 0 for priority in PRIORITIES}
+        self._wait_times = {priority: Histogram() for priority in PRIORITIES}
+        self.shared = shared
+        self._shared_wait_times = {priority: Histogram() for priority in PRIORITIES}
+
+    async def acquire(self, priority: str = PRIORITY_INTERACTIVE):
+        """Ждет свободный слот для класса priority"""
+        if priority not in self._waiters:
+            raise ValueError(f"Unknown parse priority: {priority}")
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self._enqueued[priority] += 1
+        waiters = self._waiters[priority]
+        future = loop.create_future()
+        waiters.append(future)
+        self._max_queued[priority] = max(self._max_queued[priority], len(waiters))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                if future in waiters:
+                    waiters.remove(future)
+            else:
+                # Слот успели выдать одновременно с отменой - возвращаем его
+                self.release(priority)
+            raise
+        self._wait_times[priority].observe(loop.time() - started)
+
+    def release(self, priority: str):
+        self._running[priority] -= 1
+        self._dispatch()
+
+    async def run(self, priority: str, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполняет func() в слоте класса priority.
+
+        Слот держится до конца самой работы: если вызывающего отменили (хедж
+        выиграл API, таймаут запроса), задача в пуле все равно дорабатывает,
+        и пока она занимает воркер, следующую из очереди не запускаем.
+        """
+        await self.acquire(priority)
+        lease = None
+        try:
+            if self.shared is not None:
+                started = asyncio.get_running_loop().time()
+                lease = await self.shared.acquire(priority)
+                self._shared_wait_times[priority].observe(asyncio.get_running_loop().time() - started)
+            task = asyncio.ensure_future(func())
+        except BaseException:
+            self.release(priority)
+            if lease is not None:
+                asyncio.ensure_future(self.shared.release(lease))
+            raise
+        task.add_done_callback(lambda done: self._finish(priority, done, lease))
+        return await asyncio.shield(task)
+
+    def _finish(self, priority: str, done: asyncio.Future, lease=None):
+        self.release(priority)
+        if lease is not None:
+            asyncio.ensure_future(self.shared.release(lease))
+        # Ошибку заберет вызывающий; если его отменили - не шумим в лог asyncio
+        if not done.cancelled():
+            done.exception()
+
+    def _dispatch(self):
+        for priority in PRIORITIES:
+            waiters = self._waiters[priority]
+            while waiters and self._can_start(priority):
+                future = waiters.popleft()
+                if future.done():
+                    continue
+                self._running[priority] += 1
+                future.set_result(None)
+
+    def _can_start(self, priority: str) -> bool:
+        return (
+            sum(self._running.values()) < self.capacity
+            and self._running[priority] < self.limits[priority]
+        )
+
+    def stats(self) -> dict:
+        return {
+            'capacity': self.capacity,
+            'classes': {
+                priority: {
+                    'limit': self.limits[priority],
+                    'running': self._running[priority],
+                    'queued': len(self._waiters[priority]),
+                    'max_queued': self._max_queued[priority],
+                    'enqueued': self._enqueued[priority],
+                    'wait': self._wait_times[priority].as_dict(),
+                    'shared_wait': self._shared_wait_times[priority].as_dict(),
+                }
+                for priority in PRIORITIES
+            },
+            'shared': self.shared.stats() if self.shared is not None else None,
+        }
+
+
+# Мощность, общая для всех процессов: пользовательские парсинги в API обходят
+# плановые из cron и воркеров очереди (при настроенном Redis)
+shared_capacity = SharedCapacity()
+# Очередь процесса: маршрут и воркеры очереди, запущенные в одном процессе,
+# делят одну и ту же браузерную мощность
+parse_queue = ParseQueue(shared=shared_capacity)
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import signal
+import socket
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.parse_job import ParseJob
+from app.models.tracking import Tracking
+from app.services.base_parser import ProductNotFoundError
+from app.services.http_client import close_http_client
+from app.services.job_queue import claim, complete, extend_lease, fail, lock_owned, priority_name
+from app.services.parse_queue import ParseQueue, shared_capacity
+from app.services.parser_service import ParserService
+from app.services.rate_limiter import wb_rate_limiter
+from app.services.redis_client import close_redis
+from app.services.singleflight import parse_flight
+from app.services.wb.driver_pool import create_driver_pool
+from app.utils.logger import get_schedule_logger
+from app.utils.parse_on_schedule import add_item_result, check_target_price_reached
+
+logger = get_schedule_logger()
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def process_job(db: Session, job: ParseJob, parser_service: ParserService):
+    """
+    Парсит артикул задачи и применяет результат.
+
+    Пока задача выполняется, ее аренда (locked_until) продлевается: парсинг в
+    потоке браузера не прервать, поэтому задача не должна уйти другому воркеру,
+    пока этот еще работает. Зависший воркер перестает продлевать аренду через
+    PARSE_JOB_MAX_RUNTIME. История цен пишется в одной транзакции с завершением
+    задачи и только если задача все еще наша - потерявший ее воркер ничего не
+    пишет и уведомлений не проверяет.
+
+    Повторяется все, кроме "товар не найден": блокировка WB, ошибки парсера и БД.
+    """
+    article = str(job.wb_item_id)
+    priority = priority_name(job.priority)
+    logger.info(f"Parse job {job.id}: article {article}, {priority}, attempt {job.attempts}/{job.max_attempts}")
+    heartbeat = asyncio.ensure_future(keep_job_lease(job))
+    try:
+        result = await parse_flight.do(article, lambda: parser_service.parse_hedged(
+            article, priority=priority,
+            # Пользовательские задачи лимит не ждут, но расходуют его
+            rate_limiter=wb_rate_limiter
+        ))
+        saved = apply_result(db, job, result)
+    except ProductNotFoundError:
+        complete(db, job, None, error="Product not found")
+        return
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Parse job {job.id} failed: {str(e)}")
+        fail(db, job, str(e))
+        return
+    finally:
+        heartbeat.cancel()
+
+    # Уведомления - только после того, как результат записан вместе с завершением задачи
+    for tracking in saved or []:
+        await check_target_price_reached(tracking, result, db)
+
+
+def apply_result(db: Session, job: ParseJob, result: dict) -> Optional[List[Tracking]]:
+    """
+    Записывает историю цен и завершает задачу одной транзакцией под блокировкой
+    строки задачи. Возвращает отслеживания с новой записью; None - задачу забрал
+    другой воркер, ничего не записано
+    """
+    if not lock_owned(db, job):
+        db.rollback()
+        logger.warning(f"Parse job {job.id} was taken over by another worker, result dropped")
+        return None
+
+    trackings = []
+    if job.refresh_trackings:
+        # Один парсинг артикула на все его отслеживания
+        trackings = db.query(Tracking).filter(
+            Tracking.wb_item_id == job.wb_item_id,
+            Tracking.is_active == True
+        ).all()
+    elif job.tracking_id is not None:
+        tracking = db.query(Tracking).filter(Tracking.id == job.tracking_id).first()
+        if tracking is not None and tracking.is_active:
+            trackings = [tracking]
+
+    saved = add_item_result(trackings, result, db)
+    if not complete(db, job, result):
+        return None
+    return saved
+
+
+async def keep_job_lease(job: ParseJob):
+    """Продлевает аренду задачи каждую треть таймаута видимости, не дольше PARSE_JOB_MAX_RUNTIME"""
+    loop = asyncio.get_running_loop()
+    interval = settings.PARSE_JOB_VISIBILITY_TIMEOUT / 3
+    deadline = loop.time() + settings.PARSE_JOB_MAX_RUNTIME
+    # Своя сессия: основная может быть посреди транзакции результата
+    db: Session = SessionLocal()
+    try:
+        while loop.time() + interval < deadline:
+            await asyncio.sleep(interval)
+            try:
+                if not extend_lease(db, job):
+                    logger.warning(f"Parse job {job.id} lease lost, another worker may take it")
+                    return
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Failed to extend parse job {job.id} lease: {str(e)}")
+        logger.warning(f"Parse job {job.id} runs longer than {settings.PARSE_JOB_MAX_RUNTIME}s, "
+                       f"lease is no longer extended")
+    finally:
+        db.close()
+
+
+async def worker_loop(worker_id: str, parser_service: ParserService, stop: asyncio.Event):
+    db: Session = SessionLocal()
+    try:
+        while not stop.is_set():
+            try:
+                job = claim(db, worker_id)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to claim parse job: {str(e)}")
+                job = None
+            if job is None:
+                # Очередь пуста (или БД недоступна) - ждем, но сразу выходим по сигналу
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=settings.PARSE_JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await process_job(db, job, parser_service)
+    finally:
+        db.close()
+
+
+def log_warm_up(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f"Browser warm-up failed: {str(future.exception())}")
+
+
+async def run_worker(concurrency: Optional[int] = None, worker_id: Optional[str] = None):
+    """
+    Разбирает очередь parse_jobs, пока не придет SIGTERM/SIGINT.
+    Начатые задачи дорабатываются; незавершенные вернутся в очередь по таймауту видимости
+    """
+    concurrency = concurrency or settings.PARSE_JOB_WORKER_CONCURRENCY
+    worker_id = worker_id or default_worker_id()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info(f"Parse worker {worker_id} started, concurrency {concurrency}")
+    # Один ParserService и пул браузеров на все задачи воркера. Браузеров и слотов
+    # очереди столько же, сколько задач одновременно, - задаче не приходится ждать
+    # браузер; браузеры запускаются сразу, а не на первой задаче. Приоритет
+    # пользовательских задач перед плановыми - при выборе задачи и в общей мощности
+    driver_pool = create_driver_pool(concurrency)
+    parser_service = ParserService(
+        driver_pool=driver_pool,
+        parse_queue=ParseQueue(capacity=concurrency, interactive_reserve=0, shared=shared_capacity),
+    )
+    warm_up = None
+    if 'selenium' in settings.PARSER_BACKENDS:
+        warm_up = loop.run_in_executor(None, driver_pool.warm_up)
+        warm_up.add_done_callback(log_warm_up)
+    try:
+        await asyncio.gather(*(
+            worker_loop(f"{worker_id}/{slot}", parser_service, stop) for slot in range(concurrency)
+        ))
+    finally:
+        if warm_up is not None:
+            # Браузер не должен запуститься уже после закрытия пула
+            await asyncio.wait([warm_up])
+        await loop.run_in_executor(None, driver_pool.close)
+        await close_http_client()
+        await close_redis()
+        logger.info(f"Parse worker {worker_id} stopped")
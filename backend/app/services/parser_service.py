@@ -1,12 +1,53 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional
+
+from app.config import settings
+from app.services.backend_router import (
+    ATTEMPT_BLOCKED, ATTEMPT_CANCELLED, ATTEMPT_EMPTY, ATTEMPT_ERROR, ATTEMPT_NOT_FOUND, ATTEMPT_OK,
+    BackendRouter, backend_router,
+)
+from app.services.base_parser import ParserBlockedError, ProductNotFoundError
+from app.services.parse_queue import (
+    PRIORITY_INTERACTIVE, PRIORITY_SCHEDULED, ParseQueue, parse_queue as default_parse_queue,
+)
+from app.services.rate_limiter import RateLimiter
+from app.services.singleflight import parse_flight
 from app.services.wb.api_parser import WBApiParser
 from app.services.wb.selenium_parser import WBSeleniumParser
+from app.services.wb.network_parser import WBNetworkParser
 from app.utils.logger import logger  # Импортируем готовый логгер
 
+# Браузерные парсеры по режиму SELENIUM_PARSE_MODE
+SELENIUM_PARSERS = {
+    'dom': WBSeleniumParser,
+    'network': WBNetworkParser,
+}
+
+def create_selenium_parser(**kwargs) -> WBSeleniumParser:
+    return SELENIUM_PARSERS[settings.SELENIUM_PARSE_MODE](**kwargs)
+
+def classify_attempt(result: Any) -> str:
+    """Исход попытки по ее результату (данные или исключение)"""
+    if isinstance(result, ProductNotFoundError):
+        return ATTEMPT_NOT_FOUND
+    if isinstance(result, ParserBlockedError):
+        return ATTEMPT_BLOCKED
+    if isinstance(result, BaseException):
+        return ATTEMPT_ERROR
+    return ATTEMPT_OK if ParserService._is_valid_result(result) else ATTEMPT_EMPTY
+
 class ParserService:
-    def __init__(self):
+    def __init__(self, driver_pool=None, router: Optional[BackendRouter] = None, parse_queue: Optional[ParseQueue] = None):
         # Ленивая инициализация - создаем парсеры только при первом использовании
         self._api_parser = None
         self._selenium_parser = None
+        # Пул браузеров; по умолчанию - общий пул текущего процесса
+        self._driver_pool = driver_pool
+        # Статистика бэкендов и размыкатели; по умолчанию - общие для процесса
+        self.router = router or backend_router
+        # Очередь за браузерной мощностью с приоритетами; по умолчанию - общая для процесса
+        self.parse_queue = parse_queue or default_parse_queue
         
     @property
     def api_parser(self):
@@ -17,21 +58,331 @@ class ParserService:
     @property
     def selenium_parser(self):
         if self._selenium_parser is None:
-            self._selenium_parser = WBSeleniumParser()
+            self._selenium_parser = create_selenium_parser(driver_pool=self._driver_pool)
         return self._selenium_parser
         
 
         
     def parse_wb_product(self, article: str) -> dict:
+        """
+        Парсинг только через Selenium - точка входа воркера пула процессов
+        (parse_product_wrapper). Выбор между API и Selenium - в parse_hedged
+        """
         try:
-        #     logger.info(f"Trying API parser for article {article}")
-        #     return self.api_parser.parse(article)
-        # except Exception as api_error:
-        #     logger.warning(f"API failed: {str(api_error)}")
-        #     try:
-            logger.info("Falling back to Selenium parser")
+            logger.info(f"Parsing {article} with Selenium")
             return self.selenium_parser.parse(article)
+        except (ProductNotFoundError, ParserBlockedError):
+            # Исход известен - передаем тип ошибки вызывающему (для негативного кэша)
+            raise
         except Exception as selenium_error:
-            error_msg = f"All parsers failed: {str(selenium_error)}"
+            error_msg = f"Selenium parser failed: {str(selenium_error)}"
             logger.error(error_msg)
-            raise Exception(error_msg)
\ No newline at end of file
+            raise Exception(error_msg)
+
+    async def parse_many(
+        self,
+        articles: Iterable[str],
+        concurrency: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Пакетный парсинг с потоковой выдачей результатов.
+
+        Артикулы дедуплицируются; сначала все запрашиваются одним пакетом через API,
+        оставшиеся без валидной цены уходят в Selenium не более чем по `concurrency`
+        одновременно (в потоках `executor`, по умолчанию - executor event loop; тогда
+        и не больше, чем браузеров в пуле).
+        Для каждого артикула выдается словарь {'article', 'data', 'error', 'backend'}
+        сразу по готовности, поэтому сохранять результаты можно не дожидаясь всего пакета.
+        Selenium-парсинги объединяются через parse_flight с одновременными парсингами
+        того же артикула (маршрут, воркеры очереди, в том числе в других процессах);
+        в parse_queue с классом `priority` встает только ведущий парсинг;
+        с rate_limiter каждый запрос к WB (пакет API, страница) берет у него токен.
+        Исходы обоих бэкендов записываются в router, как и в parse_hedged.
+        """
+        unique = list(dict.fromkeys(str(article) for article in articles))
+        concurrency = concurrency or settings.PARSER_BATCH_CONCURRENCY
+        logger.info(f"Batch parsing {len(unique)} articles (concurrency={concurrency})")
+
+        loop = asyncio.get_running_loop()
+        pending = unique
+        if 'api' in settings.PARSER_BACKENDS and unique:
+            self.router.schedule_probes(['api'], self._probes(unique[0], {
+                'api': self._limited(self.api_parser.parse_async, rate_limiter, priority),
+            }))
+        # API с разомкнутым размыкателем не дергаем - все сразу уходит в Selenium
+        if 'api' in settings.PARSER_BACKENDS and unique and self.router.is_available('api'):
+            started = loop.time()
+            try:
+                api_results = await self.api_parser.parse_many(unique, rate_limiter=rate_limiter, priority=priority)
+            except Exception as e:
+                logger.warning(f"API batch failed: {str(e)}")
+                api_results = {article: e for article in unique}
+            # Пакеты идут параллельно: время пакета - время попытки каждого его артикула
+            seconds = loop.time() - started
+
+            pending = []
+            for article in unique:
+                data = api_results.get(article)
+                self.router.record('api', self._batch_outcome(data), seconds, article)
+                if self._is_valid_result(data):
+                    yield {'article': article, 'data': data, 'error': None, 'backend': 'api'}
+                else:
+                    pending.append(article)
+
+        if 'selenium' not in settings.PARSER_BACKENDS:
+            for article in pending:
+                yield {'article': article, 'data': None, 'error': "No data from API", 'backend': 'api'}
+            return
+
+        if executor is None:
+            # Потоки этого процесса делят его пул браузеров: лишние ждали бы свободный
+            # браузер и падали по SELENIUM_POOL_LEASE_TIMEOUT
+            pool_size = self.selenium_parser.driver_pool.size
+            if concurrency > pool_size:
+                logger.info(f"Selenium concurrency {concurrency} limited to driver pool size {pool_size}")
+                concurrency = pool_size
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_selenium(article: str) -> dict:
+            # Токен берем уже получив слот: ожидание в очереди не расходует лимит
+            if rate_limiter is not None:
+                await rate_limiter.acquire(priority)
+            started = loop.time()
+            try:
+                data = await loop.run_in_executor(executor, self._parse_with_selenium, article)
+            except Exception as e:
+                self.router.record('selenium', classify_attempt(e), loop.time() - started, article)
+                raise
+            self.router.record('selenium', classify_attempt(data), loop.time() - started, article)
+            return data
+
+        async def lead(article: str) -> dict:
+            async with semaphore:
+                return await self.parse_queue.run(priority, lambda: run_selenium(article))
+
+        async def parse_one(article: str) -> dict:
+            try:
+                # Сначала объединение, потом слоты: ожидающий чужого парсинга того же
+                # артикула не занимает браузерную мощность, слоты берет только ведущий
+                data = await parse_flight.do(article, lambda: lead(article))
+                return {'article': article, 'data': data, 'error': None, 'backend': 'selenium'}
+            except Exception as e:
+                logger.error(f"Selenium failed for {article}: {str(e)}")
+                return {'article': article, 'data': None, 'error': str(e), 'backend': 'selenium'}
+
+        tasks = [asyncio.ensure_future(parse_one(article)) for article in pending]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Вызывающий мог прервать итерацию - не оставляем висящих задач
+            for task in tasks:
+                task.cancel()
+
+    async def parse_hedged(
+        self,
+        article: str,
+        selenium_runner: Optional[Callable[[str], Awaitable[dict]]] = None,
+        hedge_delay: Optional[float] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> dict:
+        """
+        Хеджированный парсинг одного товара: бэкенды наперегонки.
+
+        Порядок бэкендов выбирает BackendRouter по наблюдаемой доле успехов
+        и задержке (обычно сначала дешевый WBApiParser, Selenium - запасной).
+        Если первый бэкенд за `hedge_delay` секунд (PARSER_HEDGE_DELAY) не вернул
+        данные с ценой - параллельно стартует следующий; если он ответил раньше,
+        но без цены или с ошибкой - следующий стартует сразу. Побеждает первый
+        валидный результат, остальные попытки отменяются (задача в пуле процессов,
+        которая уже выполняется, доработает в фоне, но ее результат не ждут).
+
+        selenium_runner - корутинная функция article -> dict; маршрут передает запуск
+        в пуле процессов, по умолчанию - _parse_with_selenium в executor event loop.
+        Запуск Selenium ждет слот в parse_queue в классе `priority`;
+        с rate_limiter каждая попытка бэкенда берет у него токен.
+
+        Если валидного результата нет ни у кого, приоритет у Selenium: возвращается
+        его карточка без цены или пробрасывается ProductNotFoundError/ParserBlockedError.
+        Такую ошибку только от API (Selenium упал по другой причине) не пробрасываем -
+        она может значить лишь пустой или изменившийся ответ card.wb.ru.
+        """
+        article = str(article)
+        hedge_delay = settings.PARSER_HEDGE_DELAY if hedge_delay is None else hedge_delay
+        loop = asyncio.get_running_loop()
+        if selenium_runner is None:
+            selenium_runner = lambda a: loop.run_in_executor(None, self._parse_with_selenium, a)
+        selenium_limited = self._limited(selenium_runner, rate_limiter, priority)
+        runners = {
+            'api': self._limited(self.api_parser.parse_async, rate_limiter, priority),
+            'selenium': lambda a: self.parse_queue.run(priority, lambda: selenium_limited(a)),
+        }
+        backends = [backend for backend in settings.PARSER_BACKENDS if backend in runners]
+        queue = self.router.order(backends, article)
+        self.router.schedule_probes(backends, self._probes(article, {
+            'api': runners['api'],
+            # Проба не отнимает браузер у пользовательских парсингов
+            'selenium': lambda a: self.parse_queue.run(PRIORITY_SCHEDULED, lambda: selenium_limited(a)),
+        }))
+
+        tasks: Dict[asyncio.Future, str] = {}
+        started: Dict[str, float] = {}
+        results: Dict[str, Any] = {}
+        # Исходы и время попыток этого вызова: экземпляр общий для параллельных парсингов
+        attempts: Dict[str, dict] = {}
+
+        def start_next():
+            backend = queue.pop(0)
+            tasks[asyncio.ensure_future(runners[backend](article))] = backend
+            started[backend] = loop.time()
+            return {task for task in tasks if not task.done()}
+
+        winner = None
+        pending = start_next() if queue else set()
+        try:
+            while winner is None:
+                if queue and not pending:
+                    # Предыдущий бэкенд уже ответил, но без цены - бюджет не ждем
+                    pending = start_next()
+                    continue
+                if not pending:
+                    break
+
+                wait_timeout = None
+                if queue:
+                    last_started = max(started.values())
+                    wait_timeout = max(0.0, last_started + hedge_delay - loop.time())
+                done, pending = await asyncio.wait(
+                    pending, timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Бэкенд не уложился в бюджет - подключаем следующий
+                    logger.info(f"No answer for {article} in {hedge_delay}s, starting '{queue[0]}'")
+                    pending = start_next()
+                    continue
+
+                for task in done:
+                    backend = tasks[task]
+                    result = task.exception() or task.result()
+                    results[backend] = result
+                    outcome = classify_attempt(result)
+                    self._record_attempt(attempts, backend, outcome, loop.time() - started[backend], article)
+                    if winner is None and outcome == ATTEMPT_OK:
+                        winner = backend
+        finally:
+            for task, backend in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    self._record_attempt(attempts, backend, ATTEMPT_CANCELLED, loop.time() - started[backend], article)
+
+        self._log_attempts(article, winner, attempts)
+        if winner is not None:
+            self.router.record_win(winner)
+            return results[winner]
+
+        # Валидной цены нет: доверяем в первую очередь Selenium
+        for backend in ('selenium', 'api'):
+            result = results.get(backend)
+            if backend in results and not isinstance(result, BaseException):
+                return result
+        verdict = self._verdict(results)
+        if verdict is not None:
+            raise verdict
+        errors = "; ".join(f"{backend}: {str(error)}" for backend, error in results.items())
+        error_msg = f"All parsers failed: {errors or 'no backends enabled'}"
+        logger.error(error_msg)
+        raise Exception(error_msg)
+
+    @staticmethod
+    def _verdict(results: Dict[str, Any]) -> Optional[Exception]:
+        """
+        Известный исход без данных ("нет товара" / "заблокировано"), если ему можно верить:
+        его дал Selenium (он смотрит саму страницу) или он один у всех отработавших
+        бэкендов. Иначе None - вызывающий получит общую ошибку, которая не кэшируется
+        """
+        verdicts = (ProductNotFoundError, ParserBlockedError)
+        if isinstance(results.get('selenium'), verdicts):
+            return results['selenium']
+        kinds = {type(result) for result in results.values()}
+        if len(kinds) == 1 and issubclass(kinds.pop(), verdicts):
+            return next(iter(results.values()))
+        return None
+
+    @staticmethod
+    def _limited(runner: Callable[[str], Awaitable[dict]], rate_limiter: Optional[RateLimiter], priority: str):
+        """Запуск бэкенда, который сначала берет токен у rate_limiter"""
+        if rate_limiter is None:
+            return runner
+        async def run(a):
+            await rate_limiter.acquire(priority)
+            return await runner(a)
+        return run
+
+    def _probes(self, article: str, runners: Dict[str, Callable[[str], Awaitable[dict]]]) -> Dict[str, Callable[[], Awaitable[None]]]:
+        """
+        Пробы для разомкнутых бэкендов (BackendRouter.schedule_probes): по артикулу-канарейке
+        PARSER_PROBE_ARTICLE, без него - дешевым запросом API по артикулу запроса.
+        Selenium без канарейки не пробуется - router вернет его в работу на испытание
+        """
+        canary = settings.PARSER_PROBE_ARTICLE
+        probes = {}
+        if 'api' in runners:
+            probes['api'] = lambda: self._probe('api', runners['api'], canary or article)
+        if canary and 'selenium' in runners:
+            probes['selenium'] = lambda: self._probe('selenium', runners['selenium'], canary)
+        return probes
+
+    async def _probe(self, backend: str, runner: Callable[[str], Awaitable[dict]], article: str):
+        """Фоновая пробная попытка бэкенда с разомкнутым размыкателем"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            result = await runner(article)
+        except Exception as e:
+            result = e
+        self.router.record(backend, classify_attempt(result), loop.time() - started, article)
+
+    def _record_attempt(self, attempts: Dict[str, dict], backend: str, outcome: str, seconds: float, article: str):
+        attempts[backend] = {'outcome': outcome, 'seconds': round(seconds, 3)}
+        self.router.record(backend, outcome, seconds, article)
+
+    def _log_attempts(self, article: str, winner: Optional[str], attempts: Dict[str, dict]):
+        summary = ", ".join(
+            f"{backend}={attempt['outcome']}/{attempt['seconds']:.2f}s"
+            for backend, attempt in attempts.items()
+        )
+        logger.info(f"Hedged parse {article}: winner={winner or 'none'} ({summary})")
+
+    def stats(self) -> dict:
+        """Статистика бэкендов: доля успехов, задержка, состояние размыкателя"""
+        return self.router.stats()
+
+    def selenium_timings(self) -> Optional[dict]:
+        """
+        Этапы последнего парсинга через Selenium в виде, пригодном для передачи
+        из процесса пула: {'backend': ..., 'phases': {этап: секунды, 'total': ...}}
+        """
+        parser = self._selenium_parser
+        if parser is None or parser.last_timings is None:
+            return None
+        timer = parser.last_timings
+        return {'backend': parser.timing_key, 'phases': {**timer.as_dict(), 'total': round(timer.total, 4)}}
+
+    def _parse_with_selenium(self, article: str) -> dict:
+        # Отдельный экземпляр парсера на поток: парсер хранит арендованный драйвер в self
+        return create_selenium_parser(driver_pool=self._driver_pool).parse(article)
+
+    @staticmethod
+    def _batch_outcome(data: Any) -> str:
+        """Исход артикула в пакете API: None - в ответе его нет"""
+        if data is None:
+            return ATTEMPT_NOT_FOUND
+        return classify_attempt(data)
+
+    @staticmethod
+    def _is_valid_result(data: Any) -> bool:
+        return isinstance(data, dict) and data.get('price') is not None
@@ -0,0 +1,193 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.config import settings
+from app.utils.logger import logger
+
+# Исходы парсинга, которые кэшируются отдельно и на короткий срок
+OUTCOME_NOT_FOUND = 'not_found'
+OUTCOME_BLOCKED = 'blocked'
+OUTCOME_OUT_OF_STOCK = 'out_of_stock'
+
+NEGATIVE_PREFIX = 'negative:'
+
+
+class MemoryCacheBackend:
+    """LRU-кэш в памяти процесса с TTL на запись"""
+
+    name = 'memory'
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, Tuple[float, float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[Tuple[float, dict]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            stored_at, expires_at, value = item
+            if time.time() >= expires_at:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return stored_at, value
+
+    async def set(self, key: str, value: dict, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._items[key] = (now, now + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    async def delete(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def size(self) -> int:
+        return len(self._items)
+
+    async def close(self):
+        pass
+
+
+class RedisCacheBackend:
+    """
+    Общий кэш в Redis - результаты видны всем воркерам uvicorn.
+    Вытеснение по памяти настраивается в самом Redis (maxmemory-policy allkeys-lru).
+    """
+
+    name = 'redis'
+    PREFIX = 'm2r:product:'
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis  # Опциональная зависимость - нужна только для общего кэша
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Tuple[float, dict]]:
+        raw = await self._client.get(self.PREFIX + key)
+        if raw is None:
+            return None
+        item = json.loads(raw)
+        return item['stored_at'], item['value']
+
+    async def set(self, key: str, value: dict, ttl: float):
+        item = json.dumps({'stored_at': time.time(), 'value': value}, ensure_ascii=False)
+        await self._client.set(self.PREFIX + key, item, ex=max(1, int(ttl)))
+
+    async def delete(self, key: str):
+        await self._client.delete(self.PREFIX + key)
+
+    def size(self) -> Optional[int]:
+        return None
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class ProductCache:
+    """
+    Кэш результатов парсинга по артикулу перед /api/products/{article}.
+    Свежие записи отдаются сразу вместе с возрастом в секундах.
+    """
+
+    def __init__(self, ttl: Optional[int] = None, max_size: Optional[int] = None, redis_url: Optional[str] = None):
+        self.ttl = ttl or settings.PRODUCT_CACHE_TTL
+        redis_url = redis_url or settings.PRODUCT_CACHE_REDIS_URL
+        self.backend = (
+            RedisCacheBackend(redis_url) if redis_url
+            else MemoryCacheBackend(max_size or settings.PRODUCT_CACHE_MAX_SIZE)
+        )
+        self.negative_ttls = {
+            OUTCOME_NOT_FOUND: settings.NEGATIVE_CACHE_TTL_NOT_FOUND,
+            OUTCOME_BLOCKED: settings.NEGATIVE_CACHE_TTL_BLOCKED,
+            OUTCOME_OUT_OF_STOCK: settings.NEGATIVE_CACHE_TTL_OUT_OF_STOCK,
+        }
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.negative_hits = {outcome: 0 for outcome in self.negative_ttls}
+
+    async def get(self, article: str) -> Optional[Tuple[dict, float]]:
+        """Возвращает (данные, возраст в секундах) или None"""
+        try:
+            item = await self.backend.get(str(article))
+        except Exception as e:
+            # Недоступный Redis не должен ломать парсинг
+            self.errors += 1
+            logger.warning(f"Product cache read failed: {str(e)}")
+            item = None
+
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        stored_at, value = item
+        return value, max(0.0, time.time() - stored_at)
+
+    async def set(self, article: str, data: dict, ttl: Optional[float] = None):
+        try:
+            await self.backend.set(str(article), data, ttl or self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Product cache write failed: {str(e)}")
+
+    async def get_negative(self, article: str) -> Optional[Tuple[str, Optional[dict], float]]:
+        """
+        Негативный результат по артикулу: (исход, данные, оставшееся время жизни в секундах).
+        Данные есть только у "нет в наличии" - карточка без цены.
+        """
+        try:
+            item = await self.backend.get(NEGATIVE_PREFIX + str(article))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Negative cache read failed: {str(e)}")
+            return None
+
+        if item is None:
+            return None
+        stored_at, value = item
+        outcome = value['outcome']
+        self.negative_hits[outcome] = self.negative_hits.get(outcome, 0) + 1
+        ttl = value.get('ttl') or self.negative_ttls.get(outcome, 0)
+        remaining = ttl - (time.time() - stored_at)
+        return outcome, value.get('data'), max(0.0, remaining)
+
+    async def set_negative(self, article: str, outcome: str, data: Optional[dict] = None, ttl: Optional[int] = None):
+        """ttl - вместо срока исхода из negative_ttls (например, для неподтвержденного "нет товара")"""
+        ttl = ttl or self.negative_ttls[outcome]
+        try:
+            await self.backend.set(
+                NEGATIVE_PREFIX + str(article),
+                {'outcome': outcome, 'data': data, 'ttl': ttl},
+                ttl
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Negative cache write failed: {str(e)}")
+
+    async def delete(self, article: str):
+        await self.backend.delete(str(article))
+        await self.backend.delete(NEGATIVE_PREFIX + str(article))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'backend': self.backend.name,
+            'ttl': self.ttl,
+            'size': self.backend.size(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_rate': round(self.hits / total, 3) if total else None,
+            'negative_hits': dict(self.negative_hits),
+            'negative_ttls': dict(self.negative_ttls),
+        }
+
+    async def close(self):
+        await self.backend.close()
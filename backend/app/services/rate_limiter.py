@@ -0,0 +1,108 @@
+import asyncio
+import math
+import time
+from typing import Optional
+
+from app.config import settings
+from app.services.parse_queue import PRIORITY_INTERACTIVE, PRIORITY_SCHEDULED
+from app.services.redis_client import get_redis, redis_url
+from app.utils.logger import logger
+
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов.
+
+    С Redis (PARSER_REDIS_URL) лимит общий для всех процессов - воркеров API,
+    прогона из cron, воркеров очереди: время делится на окна по burst / rate
+    секунд, в каждом окне не больше `burst` запросов (счетчик INCR с EXPIRE).
+    Без Redis (или если он недоступен) - токен-бакет процесса: не больше
+    `rate` запросов в секунду в среднем, всплеск до `burst` подряд.
+
+    Интерактивные запросы (пользователь ждет ответа) лимит не ждут, но
+    расходуют его - плановые после них притормаживают. Ожидающие плановые
+    обслуживаются по порядку прихода. rate <= 0 - без ограничения.
+    """
+
+    PREFIX = 'm2r:rate:'
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[int] = None, name: str = 'wb'):
+        self.rate = settings.WB_RATE_LIMIT if rate is None else rate
+        self.burst = max(1, burst or settings.WB_RATE_BURST)
+        self.name = name
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+        self.acquired = 0
+        self.waited = 0.0
+        self.errors = 0
+
+    async def acquire(self, priority: str = PRIORITY_SCHEDULED):
+        if self.rate <= 0:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        if priority == PRIORITY_INTERACTIVE:
+            await self._take(priority)
+            return
+        async with self._lock:
+            await self._take(priority)
+
+    async def _take(self, priority: str):
+        client = get_redis()
+        if client is not None:
+            try:
+                await self._take_shared(client, priority)
+                return
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Shared rate limit '{self.name}' unavailable, limiting per process: {str(e)}")
+        await self._take_local(priority)
+
+    async def _take_shared(self, client, priority: str):
+        window = self.burst / self.rate
+        while True:
+            now = time.time()
+            slot = int(now // window)
+            key = f'{self.PREFIX}{self.name}:{slot}'
+            count = await client.incr(key)
+            if count == 1:
+                await client.expire(key, max(1, math.ceil(window * 2)))
+            if count <= self.burst or priority == PRIORITY_INTERACTIVE:
+                self.acquired += 1
+                return
+            # Окно исчерпано - ждем следующего
+            delay = (slot + 1) * window - now
+            self.waited += delay
+            await asyncio.sleep(delay)
+
+    async def _take_local(self, priority: str):
+        self._refill()
+        # Интерактивные уводят бакет в минус - плановые ждут, пока он восполнится
+        while priority != PRIORITY_INTERACTIVE and self._tokens < 1:
+            delay = (1 - self._tokens) / self.rate
+            self.waited += delay
+            await asyncio.sleep(delay)
+            self._refill()
+        self._tokens -= 1
+        self.acquired += 1
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def stats(self) -> dict:
+        return {
+            'backend': 'redis' if redis_url() else 'memory',
+            'rate': self.rate,
+            'burst': self.burst,
+            'acquired': self.acquired,
+            'waited_seconds': round(self.waited, 3),
+            'errors': self.errors,
+        }
+
+
+# Общий лимит на запросы к WB (API и страницы Selenium): с Redis - на все процессы,
+# без него - на процесс
+wb_rate_limiter = RateLimiter()
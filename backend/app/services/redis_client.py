@@ -0,0 +1,75 @@
+import asyncio
+from typing import Optional
+
+from app.config import settings
+from app.utils.logger import logger
+
+# Сравнить значение ключа с токеном владельца и только тогда удалить / продлить:
+# чужую аренду (наша истекла, ключ уже взял другой процесс) не трогаем
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+EXTEND_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def redis_url() -> Optional[str]:
+    return settings.PARSER_REDIS_URL or settings.PRODUCT_CACHE_REDIS_URL
+
+
+_client = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_redis():
+    """
+    Общий клиент Redis процесса для координации парсинга между процессами
+    (API, cron, воркеры очереди). None - Redis не настроен.
+    """
+    global _client, _loop
+    url = redis_url()
+    if not url:
+        return None
+    loop = asyncio.get_running_loop()
+    # Соединения привязаны к event loop: для нового loop (asyncio.run в скрипте) - новый клиент
+    if _client is None or _loop is not loop:
+        import redis.asyncio as redis  # Опциональная зависимость - нужна только для координации
+        _client = redis.from_url(url, decode_responses=True)
+        _loop = loop
+    return _client
+
+
+async def release_lease(client, key: str, token: str) -> bool:
+    return bool(await client.eval(RELEASE_SCRIPT, 1, key, token))
+
+
+async def extend_lease(client, key: str, token: str, lease_ms: int) -> bool:
+    return bool(await client.eval(EXTEND_SCRIPT, 1, key, token, lease_ms))
+
+
+async def keep_lease(client, key: str, token: str, lease_ms: int, name: str):
+    """Продлевает аренду каждую треть ее срока, пока задачу не отменят"""
+    while True:
+        await asyncio.sleep(lease_ms / 3000)
+        try:
+            if not await extend_lease(client, key, token, lease_ms):
+                logger.warning(f"{name}: lease expired while still in use")
+                return
+        except Exception as e:
+            logger.warning(f"{name}: failed to extend lease: {str(e)}")
+
+
+async def close_redis():
+    global _client, _loop
+    if _client is not None and _loop is asyncio.get_running_loop():
+        await _client.aclose()
+        logger.info("Redis client closed")
+    _client = None
+    _loop = None
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Type
+
+from app.config import settings
+from app.services.base_parser import ParserBlockedError, ProductNotFoundError
+from app.services.redis_client import get_redis, keep_lease, redis_url, release_lease
+from app.utils.logger import logger
+
+# Результат шага ожидания: аренду ключа получили мы
+LEASED = object()
+
+
+class SingleFlight:
+    """
+    Объединение одновременных запросов с одинаковым ключом.
+
+    Первый вызывающий запускает работу, остальные ждут тот же future.
+    Отмена одного ожидающего (например, по таймауту) не отменяет работу
+    для остальных.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+            self.started += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(future)
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
+
+    def stats(self) -> dict:
+        return {
+            'in_flight': len(self._inflight),
+            'started': self.started,
+            'shared': self.shared,
+        }
+
+    def _forget(self, key: str, done: asyncio.Future):
+        if self._inflight.get(key) is done:
+            del self._inflight[key]
+        # Ошибку заберут ожидающие; если все отменились - не шумим в лог asyncio
+        if not done.cancelled():
+            done.exception()
+
+
+class SharedSingleFlight:
+    """
+    Объединение одновременных запросов с одинаковым ключом между процессами.
+
+    Внутри процесса вызовы объединяет SingleFlight, между процессами (воркеры
+    API, прогон из cron, воркеры очереди) - аренда ключа в Redis: SET NX с
+    продлением, пока работа идет. Не получивший аренду ждет результат ее
+    держателя - он публикуется под токеном аренды на RESULT_TTL секунд. Если
+    держатель пропал без результата (процесс упал, работу отменили), аренда
+    освобождается или истекает, и работу начинает следующий ожидающий.
+
+    Ошибки из shared_errors доходят до ожидающих тем же типом, остальные -
+    как Exception с текстом. Без Redis (или если он недоступен) объединение
+    действует только внутри процесса.
+    """
+
+    PREFIX = 'm2r:flight:'
+    RESULT_TTL = 30
+
+    def __init__(
+        self,
+        shared_errors: Iterable[Type[Exception]] = (),
+        lease: Optional[float] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        self.local = SingleFlight()
+        self.shared_errors = {error.__name__: error for error in shared_errors}
+        self.lease = lease or settings.PARSE_FLIGHT_LEASE
+        self.poll_interval = poll_interval or settings.PARSE_FLIGHT_POLL_INTERVAL
+        self.led = 0
+        self.joined = 0
+        self.errors = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        return await self.local.do(key, lambda: self._do_shared(key, func))
+
+    def in_flight(self, key: str) -> bool:
+        return self.local.in_flight(key)
+
+    async def _do_shared(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        client = get_redis()
+        if client is None:
+            return await func()
+
+        lease_key = self.PREFIX + 'lease:' + key
+        token = uuid.uuid4().hex
+        watched = []
+        while True:
+            try:
+                raw = await self._wait_step(client, lease_key, token, watched)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Shared single-flight for {key} unavailable, running locally: {str(e)}")
+                return await func()
+            if raw is LEASED:
+                return await self._lead(client, key, lease_key, token, func)
+            if raw is not None:
+                self.joined += 1
+                return self._decode(raw)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _wait_step(self, client, lease_key: str, token: str, watched: list):
+        """Результат ожидаемого держателя, LEASED (аренда наша) или None - ждать дальше"""
+        # Сначала результат тех, кого уже ждали: держатель мог закончить
+        # и освободить аренду, а ее за это время взял следующий
+        for watched_token in watched:
+            raw = await client.get(self._result_key(watched_token))
+            if raw is not None:
+                return raw
+        if await client.set(lease_key, token, nx=True, px=int(self.lease * 1000)):
+            return LEASED
+        holder = await client.get(lease_key)
+        if holder and holder not in watched:
+            watched.append(holder)
+        return None
+
+    async def _lead(self, client, key: str, lease_key: str, token: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        self.led += 1
+        heartbeat = asyncio.ensure_future(
+            keep_lease(client, lease_key, token, int(self.lease * 1000), f"Parse of {key}")
+        )
+        try:
+            try:
+                result = await func()
+            except Exception as e:
+                await self._publish(client, token, {
+                    'error': type(e).__name__, 'message': str(e), 'attrs': self._error_attrs(e),
+                })
+                raise
+            await self._publish(client, token, {'data': result})
+            return result
+        finally:
+            heartbeat.cancel()
+            try:
+                await release_lease(client, lease_key, token)
+            except Exception as e:
+                # Аренда истечет сама
+                logger.warning(f"Failed to release parse lease for {key}: {str(e)}")
+
+    async def _publish(self, client, token: str, value: dict):
+        try:
+            await client.set(
+                self._result_key(token), json.dumps(value, ensure_ascii=False, default=str), ex=self.RESULT_TTL
+            )
+        except Exception as e:
+            # Ожидающие не дождутся результата и возьмут аренду сами
+            self.errors += 1
+            logger.warning(f"Failed to publish shared parse result: {str(e)}")
+
+    def _result_key(self, token: str) -> str:
+        return self.PREFIX + 'result:' + token
+
+    def _decode(self, raw: str) -> Any:
+        value = json.loads(raw)
+        if 'error' in value:
+            error = self.shared_errors.get(value['error'], Exception)(value['message'])
+            if type(error) is not Exception:
+                error.__dict__.update(value.get('attrs') or {})
+            raise error
+        return value['data']
+
+    @staticmethod
+    def _error_attrs(error: Exception) -> dict:
+        """Простые атрибуты ошибки (например, ProductNotFoundError.confirmed) для ожидающих"""
+        return {
+            name: value for name, value in vars(error).items()
+            if isinstance(value, (str, int, float, bool)) or value is None
+        }
+
+    def stats(self) -> dict:
+        return {
+            **self.local.stats(),
+            'backend': 'redis' if redis_url() else 'memory',
+            'led': self.led,
+            'joined': self.joined,
+            'errors': self.errors,
+        }
+
+
+# Общий объект процесса; с Redis (PARSER_REDIS_URL) HTTP-маршрут, прогон из cron
+# и воркеры очереди ждут один и тот же парсинг артикула и из разных процессов
+parse_flight = SharedSingleFlight(shared_errors=(ProductNotFoundError, ParserBlockedError))
@@ -1,4 +1,5 @@
 from .api_parser import WBApiParser
 from .selenium_parser import WBSeleniumParser
+from .network_parser import WBNetworkParser
 
-__all__ = ['WBApiParser', 'WBSeleniumParser']
\ No newline at end of file
+__all__ = ['WBApiParser', 'WBSeleniumParser', 'WBNetworkParser']
\ No newline at end of file
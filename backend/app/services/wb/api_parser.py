@@ -1,21 +1,132 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional, Union
+
 import requests
-from ..base_parser import BaseParser
 
-class WBApiParser(BaseParser):
+from app.config import settings
+from app.utils.logger import logger
+from app.utils.timing import PhaseTimer, parse_timings
+from ..base_parser import BaseParser, AsyncBaseParser, ParserError, ProductNotFoundError
+from ..http_client import AsyncHttpClient, get_http_client
+from ..parse_queue import PRIORITY_SCHEDULED
+
+class WBApiParser(BaseParser, AsyncBaseParser):
     BASE_URL = "https://card.wb.ru/cards/detail?nm={article}"
-    
+
+    def __init__(self, http_client: Optional[AsyncHttpClient] = None):
+        self._http_client = http_client
+        # Для синхронного parse тоже держим сессию - соединение переиспользуется
+        self._sync_session: Optional[requests.Session] = None
+
+    @property
+    def http_client(self) -> AsyncHttpClient:
+        if self._http_client is None:
+            self._http_client = get_http_client()
+        return self._http_client
+
     def parse(self, article: str) -> dict:
         try:
-            response = requests.get(self.BASE_URL.format(article=article), timeout=5)
+            if self._sync_session is None:
+                self._sync_session = requests.Session()
+            response = self._sync_session.get(
+                self.BASE_URL.format(article=article),
+                timeout=settings.WB_API_TIMEOUT
+            )
             response.raise_for_status()
-            data = response.json()
-            
-            return {
-                'name': data.get('imt_name'),
-                'price': data.get('salePriceU') / 100 if data.get('salePriceU') else None,
-                'brand': data.get('selling', {}).get('brand_name'),
-                'rating': data.get('reviewRating'),
-                'feedback_count': data.get('feedbacks')
-            }
+            return self._pick(self._products_by_id(response.json()), article)
+        except ProductNotFoundError:
+            raise
         except Exception as e:
-            raise Exception(f"WB API Error: {str(e)}")
\ No newline at end of file
+            raise ParserError(f"WB API Error: {str(e)}")
+
+    async def parse_async(self, article: str) -> dict:
+        timer = PhaseTimer()
+        try:
+            with timer.phase('request'):
+                data = await self.http_client.get_json(
+                    self.BASE_URL.format(article=article),
+                    timeout=settings.WB_API_TIMEOUT
+                )
+            with timer.phase('extract'):
+                return self._pick(self._products_by_id(data), str(article))
+        except ProductNotFoundError:
+            raise
+        except Exception as e:
+            raise ParserError(f"WB API Error: {str(e)}")
+        finally:
+            timer.stop()
+            parse_timings.record_timer('api', timer)
+
+    async def parse_many(
+        self, articles: Iterable[str], rate_limiter=None, priority: str = PRIORITY_SCHEDULED
+    ) -> Dict[str, Union[dict, None, ParserError]]:
+        """
+        Пакетный парсинг: артикулы объединяются в запросы вида nm=1;2;3.
+        Возвращает словарь артикул -> данные товара; None - товара нет в ответе,
+        ParserError - запрос его пакета не удался.
+        rate_limiter - RateLimiter, каждый запрос берет у него токен в классе priority.
+        """
+        unique = list(dict.fromkeys(str(article) for article in articles))
+        chunks = [
+            unique[i:i + settings.WB_API_BATCH_SIZE]
+            for i in range(0, len(unique), settings.WB_API_BATCH_SIZE)
+        ]
+
+        results: Dict[str, Union[dict, None, ParserError]] = {article: None for article in unique}
+        responses = await asyncio.gather(
+            *(self._fetch_chunk(chunk, rate_limiter, priority) for chunk in chunks),
+            return_exceptions=True
+        )
+        for chunk, response in zip(chunks, responses):
+            if isinstance(response, Exception):
+                logger.warning(f"WB API batch of {len(chunk)} articles failed: {str(response)}")
+                error = ParserError(f"WB API Error: {str(response)}")
+                for article in chunk:
+                    results[article] = error
+                continue
+            for article in chunk:
+                results[article] = response.get(article)
+        return results
+
+    async def _fetch_chunk(self, chunk: List[str], rate_limiter=None, priority: str = PRIORITY_SCHEDULED) -> Dict[str, dict]:
+        if rate_limiter is not None:
+            await rate_limiter.acquire(priority)
+        data = await self.http_client.get_json(
+            self.BASE_URL.format(article=';'.join(chunk)),
+            timeout=settings.WB_API_TIMEOUT
+        )
+        return self._products_by_id(data)
+
+    def _pick(self, products: Dict[str, dict], article: str) -> dict:
+        if article not in products:
+            # Пустой или изменившийся ответ API - еще не доказательство, что товара нет
+            raise ProductNotFoundError(f"article {article} not found", confirmed=False)
+        return products[article]
+
+    def _products_by_id(self, data: dict) -> Dict[str, dict]:
+        return parse_card_products(data)
+
+
+def parse_card_products(data: dict) -> Dict[str, dict]:
+    """Ответ card.wb.ru (cards/detail) -> словарь артикул -> данные товара"""
+    products = (data.get('data') or {}).get('products') or data.get('products') or []
+    return {str(product.get('id')): map_card_product(product) for product in products}
+
+
+def map_card_product(product: dict) -> dict:
+    price = product.get('salePriceU')
+    if price is None:
+        # В новых ответах цены лежат в размерах товара
+        for size in product.get('sizes') or []:
+            price = (size.get('price') or {}).get('product')
+            if price:
+                break
+
+    return {
+        'name': product.get('name') or product.get('imt_name'),
+        # Цены в ответе в копейках; в рублях целым числом, как и при разборе страницы
+        'price': round(price / 100) if price else None,
+        'brand': product.get('brand') or product.get('selling', {}).get('brand_name'),
+        'rating': product.get('reviewRating'),
+        'feedback_count': product.get('feedbacks')
+    }
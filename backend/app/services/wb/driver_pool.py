@@ -0,0 +1,547 @@
+import atexit
+import functools
+import os
+import queue
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from app.config import settings, get_driver
+from app.utils.logger import logger
+from app.utils.procfs import get_process_tree_rss_mb
+from ..base_parser import ParserError
+
+
+class DriverPoolError(ParserError):
+    """Не удалось получить браузер из пула"""
+    pass
+
+
+class PooledDriver:
+    """Браузер из пула и его счетчики для решения о пересоздании"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.created_at = time.monotonic()
+
+    @property
+    def service_pid(self) -> Optional[int]:
+        try:
+            return self.driver.service.process.pid
+        except AttributeError:
+            return None
+
+    def rss_mb(self) -> float:
+        """Память chromedriver и всех процессов Chrome под ним"""
+        pid = self.service_pid
+        return get_process_tree_rss_mb(pid) if pid else 0.0
+
+
+class DriverPool:
+    """
+    Пул долгоживущих Chrome-драйверов с семантикой аренды.
+
+    Драйвер выдается через lease(), после использования возвращается в пул.
+    Перед выдачей проверяется его работоспособность, а после N страниц
+    или превышения порога RSS драйвер закрывается и создается заново.
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        max_pages: Optional[int] = None,
+        max_rss_mb: Optional[int] = None,
+        driver_factory: Callable = get_driver,
+    ):
+        self.size = size or settings.SELENIUM_POOL_SIZE
+        self.max_pages = max_pages or settings.SELENIUM_POOL_MAX_PAGES
+        self.max_rss_mb = max_rss_mb or settings.SELENIUM_POOL_MAX_RSS_MB
+        self._driver_factory = driver_factory
+        self._idle = queue.LifoQueue()  # LIFO - самый "теплый" драйвер выдается первым
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._all = set()
+        self._closed = False
+        self.pid = os.getpid()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        """Арендует драйвер на время блока with"""
+        item = self._acquire(timeout)
+        failed = False
+        try:
+            yield item.driver
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._release(item, failed)
+
+    def warm_up(self, count: Optional[int] = None):
+        """Заранее запускает браузеры, чтобы первый парсинг не ждал старта Chrome"""
+        count = min(count or self.size, self.size)
+        items = [self._acquire() for _ in range(count)]
+        for item in items:
+            self._release(item, failed=False)
+
+    def close(self):
+        """Закрывает все браузеры пула"""
+        with self._lock:
+            self._closed = True
+            items = list(self._all)
+            self._all.clear()
+        for item in items:
+            self._destroy(item, reason="pool closed")
+
+    def stats(self) -> dict:
+        return {
+            'mode': 'browser',
+            'size': self.size,
+            'alive': len(self._all),
+            'idle': self._idle.qsize(),
+        }
+
+    def _acquire(self, timeout: Optional[float] = None) -> PooledDriver:
+        if self._closed:
+            raise DriverPoolError("Driver pool is closed")
+
+        timeout = timeout if timeout is not None else settings.SELENIUM_POOL_LEASE_TIMEOUT
+        if not self._slots.acquire(timeout=timeout):
+            raise DriverPoolError(f"No free driver in pool after {timeout}s")
+
+        try:
+            while True:
+                try:
+                    item = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._create()
+
+                if self._is_healthy(item):
+                    return item
+                self._destroy(item, reason="health check failed")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, item: PooledDriver, failed: bool):
+        try:
+            item.pages += 1
+            reason = self._recycle_reason(item, failed)
+            if reason or self._closed:
+                self._destroy(item, reason=reason or "pool closed")
+                return
+
+            try:
+                # Уходим со страницы товара, чтобы браузер не держал ее в памяти
+                item.driver.get("about:blank")
+            except Exception:
+                self._destroy(item, reason="reset failed")
+                return
+
+            self._idle.put(item)
+        finally:
+            self._slots.release()
+
+    def _recycle_reason(self, item: PooledDriver, failed: bool) -> Optional[str]:
+        if failed and not self._is_healthy(item):
+            return "driver broken after error"
+        if item.pages >= self.max_pages:
+            return f"served {item.pages} pages"
+        rss = item.rss_mb()
+        if rss > self.max_rss_mb:
+            return f"RSS {rss:.0f}MB > {self.max_rss_mb}MB"
+        return None
+
+    def _is_healthy(self, item: PooledDriver) -> bool:
+        try:
+            return item.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _create(self) -> PooledDriver:
+        started = time.monotonic()
+        item = PooledDriver(self._driver_factory())
+        with self._lock:
+            self._all.add(item)
+        logger.info(f"Driver pool: started browser in {time.monotonic() - started:.2f}s "
+                    f"(alive={len(self._all)}/{self.size})")
+        return item
+
+    def _destroy(self, item: PooledDriver, reason: str):
+        with self._lock:
+            self._all.discard(item)
+        logger.info(f"Driver pool: recycling browser ({reason})")
+        _quit_driver(item.driver)
+
+
+def _quit_driver(driver):
+    """Закрывает браузер и удаляет его временный профиль"""
+    try:
+        driver.quit()
+    except Exception:
+        pass
+    temp_dir = getattr(driver, 'temp_dir', None)
+    if temp_dir:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+# Помечает текущий документ и запускает навигацию без ожидания загрузки.
+# Новый документ метки не имеет - так видно, что навигация произошла
+NAVIGATE_SCRIPT = "window.__m2rLeaving = true; window.location.href = arguments[0];"
+DOCUMENT_STATE_SCRIPT = "return window.__m2rLeaving ? 'leaving' : document.readyState;"
+TAB_LOAD_TIMEOUT = 60
+
+
+class SharedBrowser(PooledDriver):
+    """
+    Один Chrome, которым пользуются несколько потоков через вкладки.
+
+    WebDriver-сессия в каждый момент работает с одной вкладкой, поэтому каждая
+    команда выполняется под блокировкой браузера после переключения на нужную
+    вкладку. Блокировка держится только на время команды, а не загрузки страницы.
+    """
+
+    def __init__(self, driver):
+        super().__init__(driver)
+        self.lock = threading.RLock()
+        self.leased = 0
+        self.retiring = False
+        self._current = driver.current_window_handle
+        # Стартовое окно браузера становится первой вкладкой
+        self._spare = [self._current]
+
+    def call(self, handle: str, func: Callable, *args, **kwargs):
+        with self.lock:
+            self._switch(handle)
+            return func(*args, **kwargs)
+
+    def attr(self, handle: str, name: str):
+        with self.lock:
+            self._switch(handle)
+            return getattr(self.driver, name)
+
+    def open_tab(self) -> str:
+        with self.lock:
+            if self._spare:
+                return self._spare.pop()
+            self.driver.switch_to.new_window('tab')
+            self._current = self.driver.current_window_handle
+            return self._current
+
+    def close_tab(self, handle: str):
+        with self.lock:
+            # Последнее окно закрывается только вместе с браузером
+            if len(self.driver.window_handles) <= 1:
+                return
+            self._switch(handle)
+            self.driver.close()
+            self._current = None
+
+    def _switch(self, handle: str):
+        if self._current != handle:
+            self.driver.switch_to.window(handle)
+            self._current = handle
+
+
+class TabDriver:
+    """
+    Вкладка общего браузера с интерфейсом WebDriver для парсера.
+
+    Методы и свойства драйвера выполняются под блокировкой браузера.
+    get() только запускает навигацию и опрашивает готовность документа
+    между командами других вкладок, поэтому страницы грузятся одновременно.
+    WebElement из find_element выполняет свои команды в обход блокировки и без
+    переключения на вкладку - данные страницы читаются через execute_script.
+    """
+
+    def __init__(self, browser: SharedBrowser, handle: str):
+        self.browser = browser
+        self.handle = handle
+
+    def get(self, url: str):
+        self.browser.call(self.handle, self.browser.driver.execute_script, NAVIGATE_SCRIPT, url)
+        deadline = time.monotonic() + TAB_LOAD_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                state = self.browser.call(self.handle, self.browser.driver.execute_script, DOCUMENT_STATE_SCRIPT)
+            except WebDriverException:
+                # Документ выгружается - повторяем опрос
+                state = None
+            # Как page_load_strategy='eager': достаточно DOMContentLoaded
+            if state in ('interactive', 'complete'):
+                return
+            time.sleep(settings.SELENIUM_READY_POLL)
+        raise TimeoutException(f"Tab navigation to {url} timed out after {TAB_LOAD_TIMEOUT}s")
+
+    def quit(self):
+        """Закрывает только свою вкладку - браузером управляет пул"""
+        self.browser.close_tab(self.handle)
+
+    def __getattr__(self, name):
+        value = self.browser.attr(self.handle, name)
+        if callable(value):
+            return functools.partial(self.browser.call, self.handle, value)
+        return value
+
+
+class TabPool:
+    """
+    Пул вкладок одного Chrome: до `size` парсингов одновременно на браузер.
+
+    Интерфейс как у DriverPool (lease / warm_up / close / stats), но в аренду
+    выдается вкладка. Памяти на параллельный парсинг нужно намного меньше,
+    чем при отдельном Chrome на слот. Браузер пересоздается после
+    max_pages страниц на вкладку (в сумме по вкладкам) или при превышении
+    порога RSS: новые аренды получают вкладки нового браузера, а старый
+    закрывается, когда вернут его последнюю вкладку.
+
+    Performance-лог chromedriver общий на все вкладки, поэтому режим network
+    во вкладках может не поймать JSON карточки и перейти к разбору DOM.
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        max_pages: Optional[int] = None,
+        max_rss_mb: Optional[int] = None,
+        driver_factory: Callable = get_driver,
+    ):
+        self.size = size or settings.SELENIUM_TABS_PER_BROWSER
+        self.max_pages = (max_pages or settings.SELENIUM_POOL_MAX_PAGES) * self.size
+        self.max_rss_mb = max_rss_mb or settings.SELENIUM_POOL_MAX_RSS_MB
+        self._driver_factory = driver_factory
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        # Запуск Chrome - под своей блокировкой, чтобы не держать _lock секундами
+        self._create_lock = threading.Lock()
+        self._browser: Optional[SharedBrowser] = None
+        self._browsers = set()  # включая ожидающие закрытия после пересоздания
+        self._idle: List[TabDriver] = []
+        self._closed = False
+        self.pid = os.getpid()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        """Арендует вкладку на время блока with"""
+        tab = self._acquire(timeout)
+        failed = False
+        try:
+            yield tab
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._release(tab, failed)
+
+    def warm_up(self, count: Optional[int] = None):
+        """Запускает браузер и заранее открывает вкладки"""
+        count = min(count or self.size, self.size)
+        tabs = [self._acquire() for _ in range(count)]
+        for tab in tabs:
+            self._release(tab, failed=False)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            browsers = list(self._browsers)
+            self._browsers.clear()
+            self._browser = None
+            self._idle = []
+        for browser in browsers:
+            self._destroy(browser, reason="pool closed")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'mode': 'tabs',
+                'size': self.size,
+                'browsers': len(self._browsers),
+                'leased': sum(browser.leased for browser in self._browsers),
+                'idle': len(self._idle),
+            }
+
+    def _acquire(self, timeout: Optional[float] = None) -> TabDriver:
+        if self._closed:
+            raise DriverPoolError("Driver pool is closed")
+
+        timeout = timeout if timeout is not None else settings.SELENIUM_POOL_LEASE_TIMEOUT
+        if not self._slots.acquire(timeout=timeout):
+            raise DriverPoolError(f"No free browser tab in pool after {timeout}s")
+
+        try:
+            while True:
+                browser = self._current_browser()
+                with self._lock:
+                    if browser is not self._browser:
+                        # Браузер успели вывести из выдачи - берем новый
+                        continue
+                    # Аренда засчитывается сразу: браузер не закроют, пока мы с ним работаем
+                    browser.leased += 1
+                    tab = self._idle.pop() if self._idle else None
+
+                # Команды браузеру - вне блокировки пула
+                if tab is None:
+                    try:
+                        return TabDriver(browser, browser.open_tab())
+                    except Exception:
+                        self._drop_lease(browser, "tab open failed")
+                        raise
+                if self._is_healthy(tab):
+                    return tab
+                # Вкладка не отвечает - скорее всего, упал весь браузер
+                self._drop_lease(browser, "health check failed")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _current_browser(self) -> SharedBrowser:
+        """
+        Браузер для новых вкладок. Chrome запускается вне блокировки пула (аренды и
+        возвраты вкладок старого браузера не ждут) и публикуется под ней; запускает
+        его только один поток
+        """
+        with self._lock:
+            if self._browser is not None:
+                return self._browser
+        with self._create_lock:
+            with self._lock:
+                if self._browser is not None:
+                    return self._browser
+            browser = self._create()
+            with self._lock:
+                if not self._closed:
+                    self._browsers.add(browser)
+                    self._browser = browser
+                    return browser
+            self._destroy(browser, reason="pool closed")
+            raise DriverPoolError("Driver pool is closed")
+
+    def _drop_lease(self, browser: SharedBrowser, reason: str):
+        """Снимает аренду, не выданную потоку, и выводит браузер из выдачи"""
+        with self._lock:
+            destroy = self._return_lease(browser, reason)
+        if destroy:
+            self._destroy(browser, reason=destroy)
+
+    def _return_lease(self, browser: SharedBrowser, reason: Optional[str]) -> Optional[str]:
+        """
+        Снимает аренду вкладки под блокировкой пула и при `reason` выводит браузер
+        из выдачи. Возвращает причину, если браузер пора закрыть (_destroy вне блокировки)
+        """
+        browser.leased -= 1
+        if self._closed:
+            return None
+        if reason and not browser.retiring:
+            return reason if self._retire(browser, reason) else None
+        if browser.retiring and browser.leased == 0:
+            self._browsers.discard(browser)
+            return "retired"
+        return None
+
+    def _release(self, tab: TabDriver, failed: bool):
+        browser = tab.browser
+        destroy = None
+        try:
+            # Проверка вкладки - команда браузеру, ее не держим под блокировкой пула
+            healthy = not failed or self._is_healthy(tab)
+            with self._lock:
+                browser.pages += 1
+                reason = self._recycle_reason(browser, healthy)
+                reset = reason is None and not browser.retiring and not self._closed
+            if reset:
+                try:
+                    # Уходим со страницы товара, чтобы вкладка не держала ее в памяти
+                    tab.get("about:blank")
+                except Exception:
+                    reason = "tab reset failed"
+
+            with self._lock:
+                destroy = self._return_lease(browser, reason)
+                if not reason and not browser.retiring and not self._closed:
+                    self._idle.append(tab)
+        finally:
+            self._slots.release()
+            if destroy:
+                self._destroy(browser, reason=destroy)
+
+    def _recycle_reason(self, browser: SharedBrowser, healthy: bool) -> Optional[str]:
+        if not healthy:
+            return "tab broken after error"
+        if browser.pages >= self.max_pages:
+            return f"served {browser.pages} pages"
+        rss = browser.rss_mb()
+        if rss > self.max_rss_mb:
+            return f"RSS {rss:.0f}MB > {self.max_rss_mb}MB"
+        return None
+
+    def _retire(self, browser: SharedBrowser, reason: str) -> bool:
+        """
+        Выводит браузер из выдачи; вызывается под блокировкой пула. True - все
+        вкладки возвращены, и браузер нужно закрыть (_destroy, уже вне блокировки)
+        """
+        browser.retiring = True
+        logger.info(f"Tab pool: retiring browser ({reason}), {browser.leased} tabs still leased")
+        if self._browser is browser:
+            self._browser = None
+            self._idle = []
+        if browser.leased == 0:
+            self._browsers.discard(browser)
+            return True
+        return False
+
+    def _is_healthy(self, tab: TabDriver) -> bool:
+        try:
+            return tab.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _create(self) -> SharedBrowser:
+        started = time.monotonic()
+        browser = SharedBrowser(self._driver_factory())
+        logger.info(f"Tab pool: started browser in {time.monotonic() - started:.2f}s ({self.size} tabs)")
+        return browser
+
+    def _destroy(self, browser: SharedBrowser, reason: str):
+        """Закрывает браузер, уже убранный из _browsers; вызывается вне блокировки пула"""
+        logger.info(f"Tab pool: closing browser ({reason})")
+        _quit_driver(browser.driver)
+
+
+_pool = None  # DriverPool или TabPool по SELENIUM_POOL_MODE
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    """
+    Пул драйверов текущего процесса.
+    После fork (воркеры ProcessPoolExecutor) создается новый пул -
+    драйверы родителя дочернему процессу не принадлежат.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = create_driver_pool()
+        return _pool
+
+
+def create_driver_pool(size: Optional[int] = None):
+    """Новый пул в режиме SELENIUM_POOL_MODE: size браузеров или вкладок"""
+    if settings.SELENIUM_POOL_MODE == 'tabs':
+        return TabPool(size=size)
+    return DriverPool(size=size)
+
+
+def close_driver_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+atexit.register(close_driver_pool)
@@ -0,0 +1,102 @@
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.utils.logger import logger
+
+try:
+    import lxml.html
+    from lxml import etree
+    HAS_LXML = True
+except ImportError:  # lxml не установлен - работаем только через BeautifulSoup
+    HAS_LXML = False
+
+# Парсер для BeautifulSoup: lxml заметно быстрее встроенного html.parser
+SOUP_FEATURES = 'lxml' if HAS_LXML else 'html.parser'
+
+
+def _has_class(name: str) -> str:
+    """XPath-аналог CSS-селектора .name"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _class_contains(*parts: str) -> str:
+    """Класс содержит все подстроки (без учета регистра) - как в _extract_rating"""
+    lower = "translate(@class, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')"
+    return ' and '.join(f"contains({lower}, '{part}')" for part in parts)
+
+
+class LxmlDocumentBackend:
+    """
+    Быстрый путь извлечения полей через lxml и заранее скомпилированные XPath.
+
+    Возвращает "сырые" строки; приведение к числам делает парсер теми же
+    методами, что и для BeautifulSoup. Поля, которые не нашлись, остаются
+    пустыми - их добирает резервный путь через BeautifulSoup.
+    """
+
+    name = 'lxml'
+
+    def __init__(self):
+        # Порядок селекторов совпадает с _extract_name / _try_traditional_methods
+        self._name_xpaths = [etree.XPath(xpath) for xpath in (
+            f"//h1[{_has_class('product-page__title')}]",
+            f"//h1[{_has_class('product-name')}]",
+            f"//h1[{_has_class('title')}]",
+            "//*[@data-tag='productName']",
+            f"//*[{_has_class('product-card__name')}]",
+        )]
+        self._price_xpaths = [etree.XPath(xpath) for xpath in (
+            f"//span[{_has_class('price-block__final-price')}]",
+            f"//ins[{_has_class('price-block__final-price')}]",
+            "//*[@data-tag='finalPrice']",
+            f"//*[{_has_class('price-block__wallet-price')}]",
+            f"//*[{_has_class('final-price')}]",
+            f"//*[{_has_class('j-final-price')}]",
+            f"//*[{_has_class('price-block__price')}]",
+        )]
+        self._rating_xpath = etree.XPath(f"//span[@class and {_class_contains('product', 'rating')}]")
+        self._count_xpath = etree.XPath(f"//span[@class and {_class_contains('product', 'count')}]")
+        self._brand_xpath = etree.XPath("//a[contains(@href, '/brands/')]/@href")
+
+    def extract(self, html: str) -> Dict[str, object]:
+        root = lxml.html.fromstring(html)
+        return {
+            'name': self._first_text(root, self._name_xpaths),
+            'price_text': self._first_text(root, self._price_xpaths),
+            'rating_texts': self._texts(root, self._rating_xpath),
+            'count_texts': self._texts(root, self._count_xpath),
+            'brand_hrefs': [str(href) for href in self._brand_xpath(root)],
+        }
+
+    @staticmethod
+    def _first_text(root, xpaths) -> Optional[str]:
+        for xpath in xpaths:
+            for elem in xpath(root):
+                text = elem.text_content().strip()
+                if text:
+                    return text
+        return None
+
+    @staticmethod
+    def _texts(root, xpath) -> List[str]:
+        return [elem.text_content().strip() for elem in xpath(root)]
+
+
+_backends = {}
+
+
+def get_document_backend(name: Optional[str] = None) -> Optional[LxmlDocumentBackend]:
+    """
+    Быстрый backend по имени из SELENIUM_HTML_BACKEND: 'auto', 'lxml' или 'bs4'.
+    None означает, что используется только BeautifulSoup.
+    """
+    name = name or settings.SELENIUM_HTML_BACKEND
+    if name == 'bs4':
+        return None
+    if not HAS_LXML:
+        if name == 'lxml':
+            logger.warning("SELENIUM_HTML_BACKEND=lxml, but lxml is not installed - using BeautifulSoup")
+        return None
+    if 'lxml' not in _backends:
+        _backends['lxml'] = LxmlDocumentBackend()
+    return _backends['lxml']
@@ -0,0 +1,102 @@
+import base64
+import json
+import re
+import time
+from typing import Optional
+
+from app.config import settings
+from app.utils.logger import logger
+from app.utils.timing import PhaseTimer
+from app.utils.trace import parse_trace
+from .api_parser import parse_card_products
+from .resource_blocking import collect_page_metrics
+from .selenium_parser import WBSeleniumParser
+
+# XHR страницы товара с JSON карточки: card.wb.ru/cards/v2/detail?...&nm=123
+CARD_URL_RE = re.compile(r'card\.wb\.ru/cards/(?:v\d+/)?detail\?[^#]*\bnm=([\d;]+)')
+
+
+class WBNetworkParser(WBSeleniumParser):
+    """
+    Парсер, который берет данные из JSON карточки, загружаемой самой страницей.
+
+    Во время навигации слушает CDP-события Network (через performance-лог
+    chromedriver) и, как только XHR card.wb.ru завершился, читает его тело
+    через Network.getResponseBody. Ожидание отрисовки и разбор DOM не нужны;
+    если JSON не пришел, используется обычный разбор отрисованной страницы.
+    Ожидание JSON и затем отрисовки делят один срок SELENIUM_READY_TIMEOUT.
+    """
+
+    mode = 'network'
+    timing_key = 'selenium_network'
+
+    def _navigate(self, article: str, timer: PhaseTimer):
+        # Сбрасываем накопленные события предыдущих страниц
+        self._read_performance_log()
+        super()._navigate(article, timer)
+
+    def _extract_product(self, article: str, timer: PhaseTimer, ready_timeout: Optional[float] = None) -> dict:
+        timeout = settings.SELENIUM_READY_TIMEOUT if ready_timeout is None else ready_timeout
+        deadline = time.monotonic() + timeout
+        with timer.phase('network_capture'):
+            product = self._capture_card(article, deadline)
+        self.last_page_metrics = collect_page_metrics(self.driver)
+
+        if product is not None and product.get('price') is not None:
+            parse_trace.info("Данные карточки получены из сети: %s", product)
+            return product
+
+        logger.warning(f"Card JSON for {article} not captured, falling back to DOM extraction")
+        # Страница грузилась все это время - отрисовку ждем только остаток срока
+        product_data = super()._extract_product(article, timer, deadline - time.monotonic())
+        # Поля, которые есть в JSON, но не нашлись на странице
+        for field, value in (product or {}).items():
+            if product_data.get(field) is None:
+                product_data[field] = value
+        return product_data
+
+    def _capture_card(self, article: str, deadline: float) -> Optional[dict]:
+        """Ждет ответ card.wb.ru для артикула до `deadline` (time.monotonic) и возвращает данные товара"""
+        pending = set()  # requestId ответов карточки, тело которых еще грузится
+
+        while time.monotonic() < deadline:
+            for message in self._read_performance_log():
+                method = message.get('method')
+                params = message.get('params', {})
+
+                if method == 'Network.responseReceived':
+                    match = CARD_URL_RE.search(params.get('response', {}).get('url', ''))
+                    if match and article in match.group(1).split(';'):
+                        pending.add(params.get('requestId'))
+                elif method == 'Network.loadingFinished' and params.get('requestId') in pending:
+                    product = self._read_card_body(params['requestId'], article)
+                    if product is not None:
+                        return product
+                    pending.discard(params['requestId'])
+
+            time.sleep(settings.SELENIUM_READY_POLL)
+        return None
+
+    def _read_card_body(self, request_id: str, article: str) -> Optional[dict]:
+        try:
+            response = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            body = response.get('body', '')
+            if response.get('base64Encoded'):
+                body = base64.b64decode(body).decode('utf-8')
+            return parse_card_products(json.loads(body)).get(article)
+        except Exception as e:
+            logger.warning(f"Failed to read card response body: {str(e)}")
+            return None
+
+    def _read_performance_log(self):
+        try:
+            entries = self.driver.get_log('performance')
+        except Exception:
+            return []
+        messages = []
+        for entry in entries:
+            try:
+                messages.append(json.loads(entry['message'])['message'])
+            except (KeyError, TypeError, ValueError):
+                continue
+        return messages
@@ -0,0 +1,82 @@
+import json
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+_NOT_PARSED = object()
+
+
+class PageContext:
+    """
+    Индекс страницы товара, построенный за один проход по документу.
+
+    Все _extract_* методы парсера читают данные отсюда вместо того,
+    чтобы каждый раз заново обходить soup через find_all.
+    """
+
+    def __init__(self, soup):
+        self.soup = soup
+        self.by_tag: Dict[str, List[Any]] = defaultdict(list)
+        # Элементы с классами и их склеенная строка классов в нижнем регистре
+        self.classed: List[Tuple[Any, str]] = []
+        self.span_classes: List[Tuple[Any, str]] = []
+        self.brand_hrefs: List[str] = []
+        self.data_rating: List[str] = []
+        self.data_count: List[str] = []
+        self.meta_itemprop: Dict[str, str] = {}
+        self._json_ld_script = None
+        self._json_ld = _NOT_PARSED
+        self._text: Optional[str] = None
+
+        for elem in soup.find_all(True):
+            name = elem.name
+            attrs = elem.attrs
+            self.by_tag[name].append(elem)
+
+            classes = attrs.get('class')
+            if classes:
+                joined = ' '.join(classes).lower()
+                self.classed.append((elem, joined))
+                if name == 'span':
+                    self.span_classes.append((elem, joined))
+
+            if name == 'a':
+                href = attrs.get('href')
+                if href and '/brands/' in href:
+                    self.brand_hrefs.append(href)
+            elif name == 'meta':
+                itemprop = attrs.get('itemprop')
+                if itemprop and attrs.get('content') and itemprop not in self.meta_itemprop:
+                    self.meta_itemprop[itemprop] = attrs['content']
+            elif name == 'script':
+                if self._json_ld_script is None and attrs.get('type') == 'application/ld+json':
+                    self._json_ld_script = elem
+
+            if 'data-rating' in attrs:
+                self.data_rating.append(attrs['data-rating'])
+            if 'data-count' in attrs:
+                self.data_count.append(attrs['data-count'])
+
+    @property
+    def json_ld(self) -> Optional[dict]:
+        """Первый JSON-LD блок страницы, распарсенный один раз"""
+        if self._json_ld is _NOT_PARSED:
+            self._json_ld = None
+            if self._json_ld_script is not None:
+                try:
+                    data = json.loads(self._json_ld_script.string)
+                    if isinstance(data, dict):
+                        self._json_ld = data
+                except (TypeError, ValueError):
+                    pass
+        return self._json_ld
+
+    @property
+    def scripts(self) -> List[Any]:
+        return self.by_tag.get('script', [])
+
+    @property
+    def text(self) -> str:
+        """Весь текст документа (вычисляется при первом обращении)"""
+        if self._text is None:
+            self._text = self.soup.get_text()
+        return self._text
@@ -0,0 +1,59 @@
+from typing import Dict, List
+
+from app.config import settings
+
+_MEDIA = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.mp4', '*.webm', '*.mp3', '*.m3u8',
+]
+_FONTS = ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot']
+_THIRD_PARTY = [
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*mc.yandex.ru*', '*yandex.ru/metrika*', '*top-fwz1.mail.ru*',
+    '*vk.com/rtrg*', '*facebook.net*', '*criteo.*', '*adfox.ru*',
+]
+
+# Профили блокировки ресурсов (шаблоны для Network.setBlockedURLs).
+# Для извлечения цены нужны только HTML, скрипты WB и XHR с данными карточки.
+BLOCK_PROFILES: Dict[str, List[str]] = {
+    'none': [],
+    'media': _MEDIA + _FONTS,
+    'strict': _MEDIA + _FONTS + _THIRD_PARTY + ['*.css'],
+}
+
+# Объем и время загрузки страницы по Resource Timing API
+PAGE_METRICS_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+let transferred = nav ? nav.transferSize : 0;
+for (const entry of resources) transferred += entry.transferSize || 0;
+return {
+    resources: resources.length,
+    transfer_bytes: transferred,
+    dom_content_loaded_ms: nav ? Math.round(nav.domContentLoadedEventEnd) : null,
+};
+"""
+
+
+def get_block_profile(mode: str) -> str:
+    """Профиль блокировки для режима парсера из SELENIUM_BLOCK_PROFILES"""
+    profile = settings.SELENIUM_BLOCK_PROFILES.get(mode, 'none')
+    if profile not in BLOCK_PROFILES:
+        raise ValueError(f"Unknown resource block profile: {profile}")
+    return profile
+
+
+def apply_block_profile(driver, profile: str):
+    """
+    Включает блокировку ресурсов через CDP для следующих загрузок страницы.
+    Вызывается перед каждой навигацией: драйвер из пула мог использоваться с другим профилем.
+    """
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCK_PROFILES[profile]})
+
+
+def collect_page_metrics(driver) -> dict:
+    try:
+        return driver.execute_script(PAGE_METRICS_SCRIPT) or {}
+    except Exception:
+        return {}
@@ -1,18 +1,82 @@
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from ..base_parser import BaseParser
-from app.config import get_driver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from ..base_parser import BaseParser, ParserError, ParserBlockedError, ProductNotFoundError
+from .driver_pool import get_driver_pool
+from .page_context import PageContext
+from .html_backends import SOUP_FEATURES, get_document_backend
+from .resource_blocking import apply_block_profile, collect_page_metrics, get_block_profile
+from app.config import settings
+from app.utils.logger import logger
+from app.utils.timing import PhaseTimer, parse_timings
+from app.utils.trace import parse_trace
+from contextlib import ExitStack
+from typing import Optional
 import re
-import time
 from bs4 import BeautifulSoup
-import json
+
+PRODUCT_FIELDS = ('name', 'price', 'brand', 'rating', 'feedback_count')
+
+NOT_FOUND_PHRASES = (
+    'страница не найдена',
+    'такой страницы не существует',
+    'товар не найден',
+    'по вашему запросу ничего не найдено',
+)
+
+# Признаки отсутствия товара в тексте страницы (в нижнем регистре)
+OUT_OF_STOCK_PHRASES = (
+    'нет в наличии',
+    'товара нет в наличии',
+    'недоступен для покупки',
+    'раскупили',
+    'закончился',
+    'out of stock',
+    'недоступно',
+)
+
+# Страница готова к разбору, как только есть блок цены (те же селекторы, что
+# в _try_traditional_methods) или текст "нет в наличии" из OUT_OF_STOCK_PHRASES
+# (arguments[0]). Возвращает причину готовности либо null.
+READY_SCRIPT = """
+const price = document.querySelector(
+    'span.price-block__final-price, ins.price-block__final-price, [data-tag="finalPrice"], ' +
+    '.price-block__wallet-price, .final-price, .j-final-price, .price-block__price'
+);
+if (price && price.textContent.trim()) return 'price';
+const text = document.body ? document.body.innerText.toLowerCase() : '';
+if (arguments[0].some(phrase => text.includes(phrase))) return 'sold-out';
+return null;
+"""
 
 class WBSeleniumParser(BaseParser):
-    def __init__(self):
+    # Режим парсера - по нему выбирается профиль блокировки ресурсов
+    mode = 'dom'
+    # Под каким именем этапы парсинга попадают в parse_timings
+    timing_key = 'selenium'
+
+    def __init__(self, driver_pool=None, html_backend=None, block_profile=None, soup_features=None):
         self.driver = None
         self.wait = None
-        self.temp_dir = None  # Добавляем хранение пути к temp dir
+        # Длительность этапов и объем загрузки последнего парсинга
+        self.last_timings = None
+        self.last_page_metrics = None
+        # None - профиль из SELENIUM_BLOCK_PROFILES для режима парсера
+        self.block_profile = block_profile or get_block_profile(self.mode)
+        # 'auto' / 'lxml' / 'bs4'; None - из настроек SELENIUM_HTML_BACKEND
+        self.html_backend = html_backend
+        # Парсер дерева для BeautifulSoup; None - lxml, если установлен
+        self.soup_features = soup_features or SOUP_FEATURES
+        # Драйверы берутся в аренду из пула и не закрываются после каждого товара
+        self._driver_pool = driver_pool
+
+    @property
+    def driver_pool(self):
+        if self._driver_pool is None:
+            self._driver_pool = get_driver_pool()
+        return self._driver_pool
+
 # Добавляем свойство для хранения текущего артикула
     @property
     def current_article(self):
@@ -27,131 +91,214 @@ class WBSeleniumParser(BaseParser):
         Получает весь видимый текст страницы (аналог Ctrl+A)
         Этот метод должен быть объявлен в классе
         """
+        if self.driver is None:
+            # Разбор сохраненного HTML без браузера - полного текста страницы нет
+            return None
         try:
             # Ожидаем загрузки body
             self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
             
-            # Получаем весь текст body
-            body_element = self.driver.find_element(By.TAG_NAME, "body")
-            full_text = body_element.text
+            # Весь текст body одной командой: в режиме вкладок WebElement из find_element
+            # читался бы без переключения на свою вкладку
+            full_text = self.driver.execute_script("return document.body ? document.body.innerText : ''") or ''
             
-            print(f"Получено текста: {len(full_text)} символов")
+            parse_trace.debug("Получено текста: %s символов", len(full_text))
             return full_text
             
         except Exception as e:
-            print(f"Ошибка получения текста страницы: {e}")
+            parse_trace.warning("Ошибка получения текста страницы: %s", e)
             return None
         
     def parse(self, article: str) -> dict:
+        """Основной метод парсинга через Selenium"""
+        timer = PhaseTimer()
+        self.last_timings = timer
         try:
-            self.current_article = article
-            # Инициализируем драйвер
-            self.driver = get_driver()
-            # Сохраняем temp_dir из драйвера для последующей очистки
-            self.temp_dir = getattr(self.driver, 'temp_dir', None)
-            
-            # ... остальная логика парсинга без изменений ...
-            
-        except Exception as e:
-            self._cleanup()
-            raise
+            with ExitStack() as stack:
+                with timer.phase('driver_acquire'):
+                    driver = stack.enter_context(self.driver_pool.lease())
+                try:
+                    self.driver = driver
+                    self.wait = WebDriverWait(self.driver, 20)
+                    return self._parse_page(article, timer)
+                finally:
+                    self.driver = None
+                    self.wait = None
         finally:
-            self._cleanup()
-    
-    def _cleanup(self):
-        """Очистка ресурсов включая временные файлы"""
-        if self.driver:
-            try:
-                self.driver.quit()
-            except:
-                pass
-            finally:
-                self.driver = None
-                self.wait = None
-        
-        # Очищаем временные файлы
-        if hasattr(self, 'temp_dir') and self.temp_dir:
-            try:
-                import shutil
-                shutil.rmtree(self.temp_dir, ignore_errors=True)
-            except:
-                pass
-            
-    def parse(self, article: str) -> dict:
-        """Основной метод парсинга через Selenium"""
+            timer.stop()
+            parse_timings.record_timer(self.timing_key, timer)
+            parse_trace.begin(None)
+
+    def _parse_page(self, article: str, timer: PhaseTimer) -> dict:
+        """Парсинг страницы товара арендованным драйвером"""
+        self.last_page_metrics = {}
         try:
-            # Инициализируем драйвер и wait
-            self.driver = get_driver()
-            self.wait = WebDriverWait(self.driver, 20)
+            self.current_article = article
+            parse_trace.begin(article)
             
-            print(f"Парсим артикул: {article}")
-            self.driver.get(f"https://www.wildberries.ru/catalog/{article}/detail.aspx")
+            parse_trace.info("Парсим артикул: %s", article)
+            self._navigate(article, timer)
             
             # Добавляем подробное логирование
-            print("URL загружен, ожидаем элементы...")
+            parse_trace.debug("URL загружен, ожидаем элементы...")
             
-            # Ожидаем различные элементы с таймаутами
-            try:
-                # Ожидаем загрузки страницы по разным элементам
-                self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-                print("Body загружен")
-                
-                # Дополнительные ожидания для ключевых элементов
-                self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "h1")))
-                print("H1 найден")
-                
-                # Ждем немного для полной загрузки
-                time.sleep(2)
-                
-            except Exception as e:
-                print(f"Ошибка ожидания элементов: {e}")
-                # Продолжаем парсинг даже если некоторые элементы не загрузились
-                
-            # Получаем HTML страницы
-            html = self.driver.page_source
-            
-            # Сохраняем HTML для отладки
-            # with open(f"debug_{self.current_article}.html", "w", encoding="utf-8") as f:
-            #     f.write(html)
-            # print(f"HTML сохранен в debug_{self.current_article}.html")
+            product_data = self._extract_product(article, timer)
             
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Детальный парсинг с логированием
-            product_data = {
-                'name': self._extract_name(soup),
-                'price': self._extract_price(soup),
-                'brand': self._extract_brand(soup),
-                'rating': self._extract_rating(soup),
-                'feedback_count': self._extract_feedback_count(soup),
-            }
-            
-            print("Результат парсинга:", product_data)
+            parse_trace.info("Результат парсинга: %s", product_data)
+            logger.info(f"Parse timings for {article} ({self.mode}): {timer.summary()} "
+                        f"block_profile={self.block_profile} "
+                        f"transfer={self.last_page_metrics.get('transfer_bytes', 0) / 1024:.0f}KB "
+                        f"resources={self.last_page_metrics.get('resources')}")
             
             # Проверяем, что хотя бы некоторые данные получены
             if all(value is None for value in product_data.values()):
-                print("ВНИМАНИЕ: Все данные None! Возможно, антибот-защита")
+                if self._is_not_found_page():
+                    raise ProductNotFoundError(f"Product {article} not found")
+                parse_trace.warning("ВНИМАНИЕ: Все данные None! Возможно, антибот-защита")
+                raise ParserBlockedError(f"No product data for {article}: page blocked or not rendered")
                 
             return product_data
             
+        except ParserError:
+            raise
         except Exception as e:
-            print(f"Критическая ошибка парсинга: {e}")
-            if self.driver:
-                self.driver.quit()
-                self.driver = None
+            parse_trace.warning("Критическая ошибка парсинга: %s", e)
             raise
-        finally:
-            # Всегда закрываем драйвер
-            if self.driver:
-                self.driver.quit()
-                self.driver = None
 
-    def _extract_name(self, soup):
+    def _is_not_found_page(self) -> bool:
+        """Страница WB "товар не найден" (в отличие от пустой страницы антибота)"""
+        try:
+            text = self.driver.execute_script(
+                "return document.title + ' ' + (document.body ? document.body.innerText.slice(0, 5000) : '')"
+            ) or ''
+        except Exception:
+            return False
+        text = text.lower()
+        return any(phrase in text for phrase in NOT_FOUND_PHRASES)
+
+    def _navigate(self, article: str, timer: PhaseTimer):
+        try:
+            apply_block_profile(self.driver, self.block_profile)
+        except Exception as e:
+            logger.warning(f"Resource blocking ({self.block_profile}) not applied: {str(e)}")
+
+        with timer.phase('navigation'):
+            self.driver.get(f"https://www.wildberries.ru/catalog/{article}/detail.aspx")
+
+    def _extract_product(self, article: str, timer: PhaseTimer, ready_timeout: Optional[float] = None) -> dict:
+        """Извлечение полей из отрисованной страницы"""
+        with timer.phase('readiness'):
+            self._wait_until_ready(ready_timeout)
+        self.last_page_metrics = collect_page_metrics(self.driver)
+            
+        # Получаем HTML страницы
+        with timer.phase('page_source'):
+            html = self.driver.page_source
+        
+        # Сохраняем HTML для отладки
+        # with open(f"debug_{self.current_article}.html", "w", encoding="utf-8") as f:
+        #     f.write(html)
+        # print(f"HTML сохранен в debug_{self.current_article}.html")
+        
+        return self.extract_from_html(html, timer)
+
+    def _wait_until_ready(self, timeout: Optional[float] = None):
+        """
+        Ждет, пока на странице появится цена или признак "нет в наличии",
+        но не дольше `timeout` секунд (по умолчанию SELENIUM_READY_TIMEOUT;
+        0 - одна проверка). Вместо фиксированной паузы - опрос состояния DOM,
+        поэтому готовая страница не ждет лишнего.
+        """
+        timeout = settings.SELENIUM_READY_TIMEOUT if timeout is None else max(0.0, timeout)
+        try:
+            reason = WebDriverWait(
+                self.driver,
+                timeout,
+                poll_frequency=settings.SELENIUM_READY_POLL
+            ).until(lambda driver: driver.execute_script(READY_SCRIPT, list(OUT_OF_STOCK_PHRASES)))
+            parse_trace.info("Страница готова: %s", reason)
+        except TimeoutException:
+            # Продолжаем парсинг даже если ключевые элементы не появились
+            parse_trace.info("Страница не готова за %.1fs, парсим как есть", timeout)
+        except WebDriverException as e:
+            # Ошибка скрипта проверки (страница перезагружается и т.п.) - тоже парсим как есть
+            parse_trace.warning("Ошибка ожидания готовности страницы: %s", e)
+
+    def extract_from_html(self, html: str, timer: Optional[PhaseTimer] = None) -> dict:
+        """
+        Извлекает поля товара из HTML.
+        Сначала быстрый backend (lxml + скомпилированные XPath), затем
+        BeautifulSoup только для полей, которые быстрый путь не нашел.
+        Этапы (fast_extract, soup_build, extract_<поле>) пишутся в timer, если он передан.
+        """
+        timer = timer or PhaseTimer()
+        product_data = dict.fromkeys(PRODUCT_FIELDS)
+
+        backend = get_document_backend(self.html_backend)
+        if backend is not None:
+            try:
+                with timer.phase('fast_extract'):
+                    product_data.update(self._extract_fast(backend.extract(html)))
+            except Exception as e:
+                parse_trace.warning("Ошибка быстрого backend %s: %s", backend.name, e)
+
+        missing = [field for field in PRODUCT_FIELDS if product_data[field] is None]
+        if missing:
+            with timer.phase('soup_build'):
+                soup = BeautifulSoup(html, self.soup_features)
+                # Один проход по документу - дальше все _extract_* читают из индекса
+                ctx = PageContext(soup)
+            extractors = {
+                'name': self._extract_name,
+                'price': self._extract_price,
+                'brand': self._extract_brand,
+                'rating': self._extract_rating,
+                'feedback_count': self._extract_feedback_count,
+            }
+            for field in missing:
+                with timer.phase(f'extract_{field}'):
+                    product_data[field] = extractors[field](ctx)
+
+        return product_data
+
+    def _extract_fast(self, raw: dict) -> dict:
+        """Приводит сырые строки быстрого backend к значениям полей"""
+        price = None
+        if raw['price_text']:
+            digits = re.sub(r'[^\d]', '', raw['price_text'])
+            price = int(digits) if digits else None
+
+        brand = None
+        for href in raw['brand_hrefs']:
+            brand = self._extract_brand_from_url(href)
+            if brand:
+                break
+
+        return {
+            'name': raw['name'],
+            'price': price,
+            'brand': brand,
+            'rating': self._first_parsed(raw['rating_texts'], self._parse_rating_text),
+            'feedback_count': self._first_parsed(raw['count_texts'], self._parse_count_text),
+        }
+
+    @staticmethod
+    def _first_parsed(texts, parse):
+        """Первое значение, которое удалось разобрать из списка текстов"""
+        for text in texts:
+            if text:
+                value = parse(text)
+                if value is not None:
+                    return value
+        return None
+
+    def _extract_name(self, ctx):
+        soup = ctx.soup
         try:
             name = soup.find('h1', class_='product-page__title')
             if name:
                 result = name.text.strip()
-                print(f"Найдено название: {result}")
+                parse_trace.debug("Найдено название: %s", result)
                 return result
             
             # Альтернативные селекторы
@@ -166,28 +313,28 @@ class WBSeleniumParser(BaseParser):
                 elem = soup.select_one(selector)
                 if elem:
                     result = elem.text.strip()
-                    print(f"Найдено название (альтернативный селектор): {result}")
+                    parse_trace.debug("Найдено название (альтернативный селектор): %s", result)
                     return result
             
-            print("Название не найдено")
+            parse_trace.debug("Название не найдено")
             return None
             
         except Exception as e:
-            print(f"Ошибка извлечения названия: {e}")
+            parse_trace.warning("Ошибка извлечения названия: %s", e)
             return None
 
 
-    def _extract_price(self, soup):
+    def _extract_price(self, ctx):
         """Улучшенный метод извлечения цены с приоритетом поиска пар"""
         try:
             # Сначала пробуем традиционные методы
-            traditional_price = self._try_traditional_methods(soup)
+            traditional_price = self._try_traditional_methods(ctx.soup)
             if traditional_price:
-                print(f"Цена найдена традиционным методом: {traditional_price} ₽")
+                parse_trace.info("Цена найдена традиционным методом: %s ₽", traditional_price)
                 return traditional_price
             
             # Если не сработало - получаем весь текст страницы
-            print("Традиционные методы не сработали, ищем в полном тексте...")
+            parse_trace.debug("Традиционные методы не сработали, ищем в полном тексте...")
             full_text = self.get_full_page_text()
             
             if not full_text:
@@ -201,14 +348,14 @@ class WBSeleniumParser(BaseParser):
             # Сначала ищем пары цен (более надёжный метод)
             price = self._find_price_in_text(full_text)
             if price:
-                print(f"Цена найдена через поиск пар: {price} ₽")
+                parse_trace.info("Цена найдена через поиск пар: %s ₽", price)
                 return price
             
-            print("Цена не найдена даже в полном тексте")
+            parse_trace.debug("Цена не найдена даже в полном тексте")
             return None
             
         except Exception as e:
-            print(f"Ошибка в улучшенном extract_price: {e}")
+            parse_trace.warning("Ошибка в улучшенном extract_price: %s", e)
             return None
     
     def _try_traditional_methods(self, soup):
@@ -227,17 +374,17 @@ class WBSeleniumParser(BaseParser):
                 price_elem = soup.select_one(selector)
                 if price_elem and price_elem.text.strip():
                     price_text = price_elem.text.strip()
-                    print(f"Найдена цена через селектор {selector}: {price_text}")
+                    parse_trace.debug("Найдена цена через селектор %s: %s", selector, price_text)
                     
                     # Извлекаем цифры
                     digits = re.sub(r'[^\d]', '', price_text)
                     if digits:
                         result = int(digits)
-                        print(f"Цена после обработки: {result}")
+                        parse_trace.debug("Цена после обработки: %s", result)
                         return result
             return None
         except Exception as e:
-            print(f"Ошибка извлечения цены: {e}")
+            parse_trace.warning("Ошибка извлечения цены: %s", e)
             return None
 
     def _parse_price_text(self, price_text):
@@ -254,39 +401,29 @@ class WBSeleniumParser(BaseParser):
             
             if digits:
                 result = int(digits)
-                print(f"Цена преобразована: {price_text} -> {result}")
+                parse_trace.debug("Цена преобразована: %s -> %s", price_text, result)
                 return result
             else:
-                print(f"Не удалось извлечь цифры из: {price_text}")
+                parse_trace.debug("Не удалось извлечь цифры из: %s", price_text)
                 return None
                 
         except Exception as e:
-            print(f"Ошибка преобразования цены: {e}")
+            parse_trace.warning("Ошибка преобразования цены: %s", e)
             return None
 
     def _find_price_in_text(self, text):
         """Ищет первую пару цен в тексте, предварительно проверяя наличие товара"""
         try:
-            print("Проверяем наличие товара...")
+            parse_trace.debug("Проверяем наличие товара...")
             
             # Сначала проверяем, есть ли товар в наличии
-            out_of_stock_phrases = [
-                'нет в наличии',
-                'товара нет в наличии',
-                'недоступен для покупки',
-                'раскупили',
-                'закончился',
-                'out of stock',
-                'недоступно'
-            ]
-            
             text_lower = text.lower()
-            for phrase in out_of_stock_phrases:
+            for phrase in OUT_OF_STOCK_PHRASES:
                 if phrase in text_lower:
-                    print(f"Товар отсутствует: найдена фраза '{phrase}'")
+                    parse_trace.debug("Товар отсутствует: найдена фраза '%s'", phrase)
                     return None
             
-            print("Товар в наличии, ищем цену...")
+            parse_trace.debug("Товар в наличии, ищем цену...")
             
             # Основной паттерн для поиска пар цен: "ЦЕНА ₽ ЦЕНА ₽"
             price_pair_patterns = [
@@ -308,15 +445,15 @@ class WBSeleniumParser(BaseParser):
                     if price1 and price2:
                         # Выбираем меньшую цену как актуальную
                         actual_price = min(price1, price2)
-                        print(f"Найдена пара цен: {price1} ₽ и {price2} ₽ → берём {actual_price} ₽")
+                        parse_trace.debug("Найдена пара цен: %s ₽ и %s ₽ → берём %s ₽", price1, price2, actual_price)
                         return actual_price
             
             # Если не нашли пар, ищем одиночные цены
-            print("Пар цен не найдено, ищем одиночные цены...")
+            parse_trace.debug("Пар цен не найдено, ищем одиночные цены...")
             return self._find_single_price_in_text(text)
             
         except Exception as e:
-            print(f"Ошибка поиска пар цен в тексте: {e}")
+            parse_trace.warning("Ошибка поиска пар цен в тексте: %s", e)
             return None
         
     def _find_single_price_in_text(self, text):
@@ -337,18 +474,18 @@ class WBSeleniumParser(BaseParser):
                     price = self._parse_single_price(price_text)
                     if price and self._is_realistic_price(price):
                         found_prices.append(price)
-                        print(f"Найдена одиночная цена: {price} ₽")
+                        parse_trace.debug("Найдена одиночная цена: %s ₽", price)
             
             if found_prices:
                 # Для одиночных цен берём минимальную (наиболее вероятно актуальную)
                 actual_price = min(found_prices)
-                print(f"Выбрана минимальная из одиночных цен: {actual_price} ₽")
+                parse_trace.debug("Выбрана минимальная из одиночных цен: %s ₽", actual_price)
                 return actual_price
             
             return None
             
         except Exception as e:
-            print(f"Ошибка поиска одиночных цен: {e}")
+            parse_trace.warning("Ошибка поиска одиночных цен: %s", e)
             return None
 
     def _parse_single_price(self, price_text):
@@ -368,7 +505,7 @@ class WBSeleniumParser(BaseParser):
             return None
             
         except Exception as e:
-            print(f"Ошибка парсинга отдельной цены '{price_text}': {e}")
+            parse_trace.warning("Ошибка парсинга отдельной цены '%s': %s", price_text, e)
             return None
 
     def _is_realistic_price(self, price):
@@ -379,34 +516,30 @@ class WBSeleniumParser(BaseParser):
         except:
             return False
 
-    def _extract_brand(self, soup):
+    def _extract_brand(self, ctx):
         """
         Простой метод извлечения бренда из ссылок, содержащих /brands/
         """
         try:
-            # Ищем все ссылки на странице
-            all_links = soup.find_all('a', href=True)
+            # Ссылки с /brands/ уже отобраны при индексации страницы
+            brand_links = ctx.brand_hrefs
             
-            # Фильтруем ссылки, содержащие /brands/
-            brand_links = [link for link in all_links if '/brands/' in link['href']]
+            parse_trace.debug("Найдено %s ссылок с /brands/", len(brand_links))
             
-            print(f"Найдено {len(brand_links)} ссылок с /brands/")
-            
-            for link in brand_links:
-                href = link['href']
-                print(f"Анализируем ссылку: {href}")
+            for href in brand_links:
+                parse_trace.debug("Анализируем ссылку: %s", href)
                 
                 # Извлекаем бренд из URL
                 brand = self._extract_brand_from_url(href)
                 if brand:
-                    print(f"Найден бренд: {brand}")
+                    parse_trace.debug("Найден бренд: %s", brand)
                     return brand
             
             # Если в ссылках не нашли, ищем в JavaScript данных
-            return self._extract_brand_from_scripts(soup)
+            return self._extract_brand_from_scripts(ctx)
             
         except Exception as e:
-            print(f"Ошибка извлечения бренда: {e}")
+            parse_trace.warning("Ошибка извлечения бренда: %s", e)
             return None
 
     def _extract_brand_from_url(self, url):
@@ -436,29 +569,24 @@ class WBSeleniumParser(BaseParser):
             return None
             
         except Exception as e:
-            print(f"Ошибка извлечения бренда из URL: {e}")
+            parse_trace.warning("Ошибка извлечения бренда из URL: %s", e)
             return None
 
-    def _extract_brand_from_scripts(self, soup):
+    def _extract_brand_from_scripts(self, ctx):
         """
         Резервный метод: поиск бренда в script тегах
         """
         try:
             # Ищем в JSON-LD данных
-            script = soup.find('script', type='application/ld+json')
-            if script:
-                try:
-                    data = json.loads(script.string)
-                    brand = data.get('brand', {}).get('name') if isinstance(data.get('brand'), dict) else data.get('brand')
-                    if brand:
-                        print(f"Найден бренд в JSON-LD: {brand}")
-                        return str(brand)
-                except:
-                    pass
+            data = ctx.json_ld
+            if data:
+                brand = data.get('brand', {}).get('name') if isinstance(data.get('brand'), dict) else data.get('brand')
+                if brand:
+                    parse_trace.debug("Найден бренд в JSON-LD: %s", brand)
+                    return str(brand)
             
             # Ищем в JavaScript переменных
-            scripts = soup.find_all('script')
-            for script in scripts:
+            for script in ctx.scripts:
                 if script.string:
                     # Ищем паттерны типа brand: "NAME", brandName: "NAME"
                     patterns = [
@@ -471,50 +599,45 @@ class WBSeleniumParser(BaseParser):
                         match = re.search(pattern, script.string)
                         if match:
                             brand = match.group(1)
-                            print(f"Найден бренд в script: {brand}")
+                            parse_trace.debug("Найден бренд в script: %s", brand)
                             return brand
             
             return None
             
         except Exception as e:
-            print(f"Ошибка извлечения бренда из scripts: {e}")
+            parse_trace.warning("Ошибка извлечения бренда из scripts: %s", e)
             return None
     
-    def _extract_rating(self, soup):
+    def _extract_rating(self, ctx):
         """
         Универсальный метод извлечения рейтинга по классам содержащим 'product' и 'rating'
         """
         try:
-            # Ищем все span элементы
-            all_spans = soup.find_all('span')
-            
             # Фильтруем span'ы у которых в классе есть и 'product' и 'rating'
             rating_spans = []
-            for span in all_spans:
-                if span.get('class'):
-                    classes = ' '.join(span.get('class')).lower()
-                    if 'product' in classes and 'rating' in classes:
-                        rating_spans.append(span)
-                        print(f"Найден потенциальный рейтинг-span: {span}")
+            for span, classes in ctx.span_classes:
+                if 'product' in classes and 'rating' in classes:
+                    rating_spans.append(span)
+                    parse_trace.debug("Найден потенциальный рейтинг-span: %s", span)
             
-            print(f"Найдено {len(rating_spans)} span'ов с product и rating в классах")
+            parse_trace.debug("Найдено %s span'ов с product и rating в классах", len(rating_spans))
             
             # Проверяем найденные span'ы
             for span in rating_spans:
                 rating_text = span.get_text(strip=True)
-                print(f"Текст рейтинга: '{rating_text}'")
+                parse_trace.debug("Текст рейтинга: '%s'", rating_text)
                 
                 if rating_text:
                     rating_value = self._parse_rating_text(rating_text)
                     if rating_value is not None:
-                        print(f"Успешно извлечен рейтинг: {rating_value}")
+                        parse_trace.debug("Успешно извлечен рейтинг: %s", rating_value)
                         return rating_value
             
             # Если не нашли, пробуем альтернативные методы
-            return self._find_rating_alternative(soup)
+            return self._find_rating_alternative(ctx)
                 
         except Exception as e:
-            print(f"Ошибка извлечения рейтинга: {e}")
+            parse_trace.warning("Ошибка извлечения рейтинга: %s", e)
             return None
 
     def _parse_rating_text(self, rating_text):
@@ -534,90 +657,83 @@ class WBSeleniumParser(BaseParser):
             if 0 <= rating_value <= 5:
                 return rating_value
             else:
-                print(f"Рейтинг вне диапазона 0-5: {rating_value}")
+                parse_trace.debug("Рейтинг вне диапазона 0-5: %s", rating_value)
                 return None
                 
         except (ValueError, TypeError):
-            print(f"Не удалось преобразовать в число: '{rating_text}'")
+            parse_trace.debug("Не удалось преобразовать в число: '%s'", rating_text)
             return None
 
-    def _find_rating_alternative(self, soup):
+    def _find_rating_alternative(self, ctx):
         """
         Альтернативные методы поиска рейтинга
         """
         try:
             # 1. Поиск по data-атрибутам
-            rating_elements = soup.find_all(attrs={"data-rating": True})
-            for elem in rating_elements:
-                rating_value = self._parse_rating_text(elem['data-rating'])
+            for value in ctx.data_rating:
+                rating_value = self._parse_rating_text(value)
                 if rating_value is not None:
-                    print(f"Найден рейтинг в data-атрибуте: {rating_value}")
+                    parse_trace.debug("Найден рейтинг в data-атрибуте: %s", rating_value)
                     return rating_value
             
             # 2. Поиск в мета-тегах
-            meta_rating = soup.find('meta', itemprop="ratingValue")
-            if meta_rating and meta_rating.get('content'):
-                rating_value = self._parse_rating_text(meta_rating['content'])
+            meta_rating = ctx.meta_itemprop.get('ratingValue')
+            if meta_rating:
+                rating_value = self._parse_rating_text(meta_rating)
                 if rating_value is not None:
-                    print(f"Найден рейтинг в meta-теге: {rating_value}")
+                    parse_trace.debug("Найден рейтинг в meta-теге: %s", rating_value)
                     return rating_value
             
             # 4. Поиск в JSON-LD
-            script = soup.find('script', type='application/ld+json')
-            if script:
+            data = ctx.json_ld
+            if data:
                 try:
-                    data = json.loads(script.string)
                     rating = data.get('aggregateRating', {}).get('ratingValue')
                     if rating:
                         rating_value = self._parse_rating_text(str(rating))
                         if rating_value is not None:
-                            print(f"Найден рейтинг в JSON-LD: {rating_value}")
+                            parse_trace.debug("Найден рейтинг в JSON-LD: %s", rating_value)
                             return rating_value
-                except:
+                except AttributeError:
                     pass
             
-            print("Рейтинг не найден")
+            parse_trace.debug("Рейтинг не найден")
             return None
             
         except Exception as e:
-            print(f"Ошибка альтернативного поиска рейтинга: {e}")
+            parse_trace.warning("Ошибка альтернативного поиска рейтинга: %s", e)
             return None
     
-    def _extract_feedback_count(self, soup):
+    def _extract_feedback_count(self, ctx):
         """
         Универсальный метод извлечения количества отзывов по классам содержащим 'product' и 'count'
         """
         try:
-            # Ищем все span элементы
-            all_spans = soup.find_all('span')
-            
             # Фильтруем span'ы у которых в классе есть и 'product' и 'count'
             count_spans = []
-            for span in all_spans:
-                if span.get('class'):
-                    classes = ' '.join(span.get('class')).lower()
-                    if 'product' in classes and 'count' in classes:
-                        count_spans.append(span)
-                        print(f"Найден потенциальный count-span: {span}")
+            for span, classes in ctx.span_classes:
+                if 'product' in classes and 'count' in classes:
+                    count_spans.append(span)
+                    parse_trace.debug("Найден потенциальный count-span: %s", span)
             
-            print(f"Найдено {len(count_spans)} span'ов с product и count в классах")
+            parse_trace.debug("Найдено %s span'ов с product и count в классах", len(count_spans))
             
             # Проверяем найденные span'ы
             for span in count_spans:
                 count_text = span.get_text(strip=True)
-                print(f"Текст количества отзывов: '{count_text}'")
+                parse_trace.debug("Текст количества отзывов: '%s'", count_text)
                 
                 if count_text:
                     count_value = self._parse_count_text(count_text)
                     if count_value is not None:
-                        print(f"Успешно извлечено количество отзывов: {count_value}")
+                        parse_trace.debug("Успешно извлечено количество отзывов: %s", count_value)
                         return count_value
             
             # Если не нашли, пробуем альтернативные методы
-            return self._find_feedback_count_alternative(soup)
+            return self._find_feedback_count_alternative(ctx)
                 
         except Exception as e:
-            print(f"Ошибка извлечения количества отзывов: {e}")
+            parse_trace.warning("Ошибка извлечения количества отзывов: %s", e)
             return None
 
     def _parse_count_text(self, count_text):
@@ -648,61 +764,60 @@ class WBSeleniumParser(BaseParser):
                 if count_value >= 0:
                     return count_value
                 else:
-                    print(f"Количество отзывов отрицательное: {count_value}")
+                    parse_trace.debug("Количество отзывов отрицательное: %s", count_value)
                     return None
             else:
-                print("Не найдено цифр в тексте")
+                parse_trace.debug("Не найдено цифр в тексте")
                 return None
                 
         except (ValueError, TypeError) as e:
-            print(f"Не удалось преобразовать в число: '{count_text}' - {e}")
+            parse_trace.debug("Не удалось преобразовать в число: '%s' - %s", count_text, e)
             return None
 
-    def _find_feedback_count_alternative(self, soup):
+    def _find_feedback_count_alternative(self, ctx):
         """
         Альтернативные методы поиска количества отзывов
         """
         try:
             # 1. Поиск по data-атрибутам
-            count_elements = soup.find_all(attrs={"data-count": True})
-            for elem in count_elements:
-                count_value = self._parse_count_text(elem['data-count'])
+            for value in ctx.data_count:
+                count_value = self._parse_count_text(value)
                 if count_value is not None:
-                    print(f"Найдено количество в data-атрибуте: {count_value}")
+                    parse_trace.debug("Найдено количество в data-атрибуте: %s", count_value)
                     return count_value
             
             # 2. Поиск по классам содержащим 'review', 'feedback', 'comment'
             count_patterns = ['review', 'feedback', 'comment', 'оцен', 'отзыв']
             
             for pattern in count_patterns:
-                elements = soup.find_all(class_=re.compile(pattern, re.IGNORECASE))
+                # Строки классов уже в нижнем регистре - достаточно проверки вхождения
+                elements = [elem for elem, classes in ctx.classed if pattern in classes]
                 for elem in elements:
                     count_text = elem.get_text(strip=True)
                     count_value = self._parse_count_text(count_text)
                     if count_value is not None:
-                        print(f"Найдено количество в элементе с '{pattern}': {count_value}")
+                        parse_trace.debug("Найдено количество в элементе с '%s': %s", pattern, count_value)
                         return count_value
             
             # 3. Поиск в мета-тегах
-            meta_review_count = soup.find('meta', itemprop="reviewCount")
-            if meta_review_count and meta_review_count.get('content'):
-                count_value = self._parse_count_text(meta_review_count['content'])
+            meta_review_count = ctx.meta_itemprop.get('reviewCount')
+            if meta_review_count:
+                count_value = self._parse_count_text(meta_review_count)
                 if count_value is not None:
-                    print(f"Найдено количество в meta-теге: {count_value}")
+                    parse_trace.debug("Найдено количество в meta-теге: %s", count_value)
                     return count_value
             
             # 4. Поиск в JSON-LD
-            script = soup.find('script', type='application/ld+json')
-            if script:
+            data = ctx.json_ld
+            if data:
                 try:
-                    data = json.loads(script.string)
                     review_count = data.get('aggregateRating', {}).get('reviewCount')
                     if review_count:
                         count_value = self._parse_count_text(str(review_count))
                         if count_value is not None:
-                            print(f"Найдено количество в JSON-LD: {count_value}")
+                            parse_trace.debug("Найдено количество в JSON-LD: %s", count_value)
                             return count_value
-                except:
+                except AttributeError:
                     pass
             
             # 5. Поиск по тексту содержащему "оценок", "отзывов", "reviews"
@@ -713,20 +828,21 @@ class WBSeleniumParser(BaseParser):
                 r'(\d[\d\s]*) feedbacks'
             ]
             
+            page_text = ctx.text
             for pattern in text_patterns:
-                matches = re.findall(pattern, soup.get_text(), re.IGNORECASE)
+                matches = re.findall(pattern, page_text, re.IGNORECASE)
                 for match in matches:
                     if match:
                         count_value = self._parse_count_text(match)
                         if count_value is not None:
-                            print(f"Найдено количество по текстовому паттерну: {count_value}")
+                            parse_trace.debug("Найдено количество по текстовому паттерну: %s", count_value)
                             return count_value
             
-            print("Количество отзывов не найдено")
+            parse_trace.debug("Количество отзывов не найдено")
             return None
             
         except Exception as e:
-            print(f"Ошибка альтернативного поиска количества отзывов: {e}")
+            parse_trace.warning("Ошибка альтернативного поиска количества отзывов: %s", e)
             return None
     
     def _extract_seller_info(self, soup):
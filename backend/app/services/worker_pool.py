@@ -0,0 +1,252 @@
+import functools
+import multiprocessing
+import multiprocessing.util
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from app.config import settings, resolve_chromedriver_path, set_chromedriver_path
+from app.services.wb.driver_pool import close_driver_pool
+from app.utils.logger import logger
+from app.utils.procfs import find_pids_by_environ, get_process_name, get_process_tree_rss_mb
+
+# Сколько ждать, пока выведенный из работы пул доделает начатые парсинги
+RETIRE_TIMEOUT = 120
+# Пауза между SIGTERM и SIGKILL для оставшихся браузеров
+KILL_GRACE = 2
+# Метка поколения пула в окружении воркера: ее наследуют chromedriver и Chrome,
+# так что браузер находится и после того, как воркер умер и его дерево распалось
+POOL_ENV = 'PARSER_WORKER_POOL'
+
+
+def _init_worker(chromedriver_path: Optional[str], pool_id: str):
+    """Инициализатор процесса-воркера"""
+    os.environ[POOL_ENV] = pool_id
+    if chromedriver_path:
+        set_chromedriver_path(chromedriver_path)
+    # Воркер, завершающийся по max_tasks_per_child, закрывает свои браузеры сам
+    multiprocessing.util.Finalize(None, close_driver_pool, exitpriority=10)
+
+
+def _is_browser_process(pid: int) -> bool:
+    return 'chrom' in get_process_name(pid).lower()
+
+
+class ParserWorkerPool(Executor):
+    """
+    Пул процессов для Selenium-парсинга с пересозданием воркеров.
+
+    - воркер перезапускается после PARSER_WORKER_MAX_TASKS задач (max_tasks_per_child);
+    - по завершении задач, не чаще раза в PARSER_WORKER_RSS_CHECK_INTERVAL секунд,
+      проверяется память воркеров вместе с их Chrome (обход /proc): если
+      какой-то превысил PARSER_WORKER_MAX_RSS_MB, новые задачи идут в новый пул,
+      а старый доделывает начатое и завершается. Так же пул восстанавливается
+      после падения воркера (BrokenProcessPool);
+    - при закрытии и выводе пула из работы добиваются все chromedriver и Chrome
+      его воркеров, даже если воркер умер, не закрыв браузер.
+
+    Совместим с loop.run_in_executor.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_tasks: Optional[int] = None,
+        max_rss_mb: Optional[int] = None,
+        shutdown_timeout: Optional[float] = None,
+        rss_check_interval: Optional[float] = None,
+    ):
+        self.workers = workers or settings.PARSER_WORKERS
+        self.max_tasks = settings.PARSER_WORKER_MAX_TASKS if max_tasks is None else max_tasks
+        self.max_rss_mb = settings.PARSER_WORKER_MAX_RSS_MB if max_rss_mb is None else max_rss_mb
+        self.shutdown_timeout = settings.PARSER_WORKER_SHUTDOWN_TIMEOUT if shutdown_timeout is None else shutdown_timeout
+        self.rss_check_interval = (
+            settings.PARSER_WORKER_RSS_CHECK_INTERVAL if rss_check_interval is None else rss_check_interval
+        )
+
+        try:
+            self._chromedriver_path = resolve_chromedriver_path()
+        except Exception as e:
+            # Воркеры попробуют определить путь сами
+            logger.error(f"ChromeDriver resolution failed: {str(e)}")
+            self._chromedriver_path = None
+
+        self._lock = threading.Lock()
+        self._closed = False
+        self._generation = 0
+        self._submitted = 0
+        self._completed = 0
+        self._recycles: Dict[str, int] = {}
+        self._rss_checked_at = 0.0
+        self._retiring: Dict[ProcessPoolExecutor, threading.Thread] = {}
+        self._pool_ids: Dict[ProcessPoolExecutor, str] = {}
+        # Момент, после которого остановка любого поколения перестает ждать воркеры
+        self._close_deadline = float('inf')
+        self._executor = self._create()
+
+    def _create(self) -> ProcessPoolExecutor:
+        self._generation += 1
+        pool_id = f'{os.getpid()}.{self._generation}'
+        # max_tasks_per_child несовместим с fork; spawn к тому же не копирует в воркер
+        # состояние основного процесса (event loop, соединения с БД)
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self._chromedriver_path, pool_id),
+            max_tasks_per_child=self.max_tasks or None,
+        )
+        self._pool_ids[executor] = pool_id
+        return executor
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('cannot schedule new futures after shutdown')
+            executor = self._executor
+        try:
+            future = executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            # Воркер упал между задачами - заменяем пул и повторяем
+            self._recycle(executor, 'broken')
+            with self._lock:
+                executor = self._executor
+            future = executor.submit(fn, *args, **kwargs)
+        with self._lock:
+            self._submitted += 1
+        # Пересоздается только пул, в котором выполнялась задача: остальные задачи
+        # упавшего пула и поздние ответы выведенного не трогают уже новое поколение
+        future.add_done_callback(functools.partial(self._on_done, executor))
+        return future
+
+    def _on_done(self, executor: ProcessPoolExecutor, future):
+        with self._lock:
+            self._completed += 1
+        if self._closed:
+            return
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._recycle(executor, 'broken')
+        elif self.max_rss_mb and self._rss_check_due() and self._max_worker_rss(executor) > self.max_rss_mb:
+            self._recycle(executor, 'rss')
+
+    def _rss_check_due(self) -> bool:
+        """Пора ли снова обойти /proc: проверка памяти не чаще раза в rss_check_interval"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._rss_checked_at < self.rss_check_interval:
+                return False
+            self._rss_checked_at = now
+            return True
+
+    @staticmethod
+    def _worker_pids(executor: ProcessPoolExecutor) -> List[int]:
+        # copy() атомарен: управляющий поток пула может менять словарь параллельно
+        processes = executor._processes
+        return list(processes.copy()) if processes else []
+
+    def _max_worker_rss(self, executor: ProcessPoolExecutor) -> float:
+        return max((get_process_tree_rss_mb(pid) for pid in self._worker_pids(executor)), default=0.0)
+
+    def _recycle(self, executor: ProcessPoolExecutor, reason: str):
+        """Заменяет пул новым; старый доделывает начатые задачи в фоне"""
+        with self._lock:
+            if self._closed or executor is not self._executor:
+                return  # уже заменен другим потоком
+            self._executor = self._create()
+            self._recycles[reason] = self._recycles.get(reason, 0) + 1
+            generation = self._generation
+            thread = self._retiring[executor] = threading.Thread(
+                target=self._retire, args=(executor,), name='parser-pool-retire', daemon=True
+            )
+            thread.start()
+        logger.warning(f"Parser worker pool recycled ({reason}), generation {generation}")
+
+    def _retire(self, executor: ProcessPoolExecutor):
+        try:
+            self._stop(executor, RETIRE_TIMEOUT, cancel_futures=False)
+        finally:
+            with self._lock:
+                self._retiring.pop(executor, None)
+
+    def _stop(self, executor: ProcessPoolExecutor, timeout: float, cancel_futures: bool):
+        """
+        Останавливает пул и добивает все его процессы: воркеры, не завершившиеся
+        за timeout, и Chrome/chromedriver, оставшиеся после воркеров
+        """
+        processes = list((executor._processes or {}).copy().values())
+        executor.shutdown(wait=False, cancel_futures=cancel_futures)
+
+        deadline = time.monotonic() + timeout
+        alive = processes
+        while alive and time.monotonic() < min(deadline, self._close_deadline):
+            alive[0].join(0.2)
+            alive = [process for process in alive if process.is_alive()]
+
+        for process in alive:
+            logger.warning(f"Parser worker {process.pid} did not exit in time, killing")
+            process.kill()
+            process.join(KILL_GRACE)
+
+        # Браузеры воркеров, завершившихся раньше (max_tasks_per_child, падение), тоже здесь
+        self._kill_browsers(self._pool_ids.pop(executor))
+
+    @staticmethod
+    def _kill_browsers(pool_id: str):
+        """SIGTERM, затем SIGKILL оставшимся процессам Chrome/chromedriver поколения пула"""
+        targets = [pid for pid in find_pids_by_environ(POOL_ENV, pool_id) if _is_browser_process(pid)]
+        if not targets:
+            return
+        logger.warning(f"Reaping {len(targets)} leftover browser processes")
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            for pid in targets:
+                try:
+                    os.kill(pid, sig)
+                except OSError:
+                    pass
+            deadline = time.monotonic() + KILL_GRACE
+            while time.monotonic() < deadline:
+                targets = [pid for pid in targets if _is_browser_process(pid)]
+                if not targets:
+                    return
+                time.sleep(0.1)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        """Останавливает все поколения пула; wait=False - не дожидаясь воркеров"""
+        timeout = self.shutdown_timeout if wait else 0
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._close_deadline = time.monotonic() + timeout
+            retiring = list(self._retiring.values())
+        self._stop(self._executor, timeout, cancel_futures=True)
+        # Выведенные из работы поколения сокращают ожидание до того же срока и добивают свои процессы
+        for thread in retiring:
+            thread.join(timeout + 2 * KILL_GRACE + 1)
+        logger.info("Parser worker pool closed")
+
+    def close(self):
+        self.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            executor = self._executor
+            result = {
+                'generation': self._generation,
+                'max_workers': self.workers,
+                'max_tasks_per_worker': self.max_tasks,
+                'max_rss_mb': self.max_rss_mb,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'recycles': dict(self._recycles),
+                'retiring_pools': len(self._retiring),
+            }
+        result['workers'] = [
+            {'pid': pid, 'rss_mb': round(get_process_tree_rss_mb(pid), 1)}
+            for pid in self._worker_pids(executor)
+        ]
+        return result
@@ -1,19 +1,28 @@
+import argparse
 import asyncio
 import sys
 import os
+import time
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional
 
 # Добавляем путь к проекту в PYTHONPATH
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.database import SessionLocal
 from app.models.tracking import Tracking
 from app.models.price_history import PriceHistory
 from app.models.user import User
 from app.services.parser_service import ParserService
+from app.services.parse_queue import PRIORITY_SCHEDULED, ParseQueue, shared_capacity
+from app.services.job_queue import enqueue
+from app.services.rate_limiter import wb_rate_limiter
+from app.services.http_client import close_http_client
+from app.services.redis_client import close_redis
+from app.services.wb.driver_pool import create_driver_pool
 from app.utils.logger import get_schedule_logger
 
 # Настройка логгера
@@ -21,67 +30,152 @@ logger = get_schedule_logger()
 
 async def parse_all_active_trackings():
     """
-    Парсит все активные отслеживания и сохраняет результаты в базу
+    Парсит все активные отслеживания и сохраняет результаты в базу.
+
+    Каждый артикул парсится один раз за прогон, результат раскладывается
+    по всем его отслеживаниям. Артикулы идут пакетом: сначала пакетные
+    запросы к API, оставшиеся - в Selenium не более PARSER_BATCH_CONCURRENCY
+    одновременно; все запросы к WB проходят общий лимит WB_RATE_LIMIT.
+    Результаты сохраняются по мере готовности.
     """
     db: Session = SessionLocal()
+    started = time.monotonic()
+    concurrency = settings.PARSER_BATCH_CONCURRENCY
+    # Прогон из cron идет в отдельном процессе, пользовательских парсингов в нем нет -
+    # резерв внутри процесса не держим. Пользовательские парсинги API обходят плановые
+    # в общей мощности shared_capacity: там действуют резерв и приоритет интерактивных
+    schedule_queue = ParseQueue(capacity=concurrency, interactive_reserve=0, shared=shared_capacity)
+    # Один пул браузеров на весь прогон: Chrome стартует один раз, а не на каждый артикул.
+    # Прогрев идет в фоне, пока выполняются пакетные запросы к API
+    driver_pool = create_driver_pool(concurrency)
+    warm_up = start_warm_up(driver_pool)
     try:
         # Получаем все активные отслеживания
         active_trackings = db.query(Tracking).filter(
             Tracking.is_active == True
         ).all()
         
-        logger.info(f"Найдено {len(active_trackings)} активных отслеживаний для парсинга")
+        trackings_by_item = group_by_item(active_trackings)
+        logger.info(f"Найдено {len(active_trackings)} активных отслеживаний, "
+                    f"уникальных артикулов для парсинга: {len(trackings_by_item)}")
         
-        # Парсим каждое отслеживание
-        for tracking in active_trackings:
-            try:
-                await parse_single_tracking(tracking, db)
-                # Небольшая задержка чтобы не нагружать WB
-                await asyncio.sleep(1)
-            except Exception as e:
-                logger.error(f"Ошибка при парсинге отслеживания {tracking.id}: {str(e)}")
+        parser_service = ParserService(driver_pool=driver_pool, parse_queue=schedule_queue)
+        parsed = failed = 0
+        async for item in parser_service.parse_many(
+            trackings_by_item,
+            concurrency=concurrency,
+            priority=PRIORITY_SCHEDULED,
+            rate_limiter=wb_rate_limiter,
+        ):
+            wb_item_id = int(item['article'])
+            if item['error']:
+                failed += 1
+                logger.error(f"Ошибка при парсинге артикула {wb_item_id}: {item['error']}")
                 continue
+            parsed += 1
+            await save_item_result(trackings_by_item[wb_item_id], item['data'], db)
+        
+        logger.info(f"Прогон завершен за {time.monotonic() - started:.1f}s: "
+                    f"артикулов получено {parsed}, с ошибкой {failed}")
         
     except Exception as e:
         logger.error(f"Ошибка в основном цикле парсинга: {str(e)}")
     finally:
         db.close()
+        await close_driver_pool_after(driver_pool, warm_up)
+        wait = schedule_queue.stats()['classes'][PRIORITY_SCHEDULED]['wait']
+        logger.info(f"Ожидание Selenium в очереди: {wait['count']} парсингов, "
+                    f"p50 {wait['p50']}s, p90 {wait['p90']}s, max {wait['max']}s; "
+                    f"лимит WB: {wb_rate_limiter.stats()}")
+        await close_http_client()
+        await close_redis()
+
+def start_warm_up(driver_pool) -> Optional[asyncio.Future]:
+    """Прогрев пула браузеров в фоне (если Selenium вообще используется)"""
+    if 'selenium' not in settings.PARSER_BACKENDS:
+        return None
+    return asyncio.get_running_loop().run_in_executor(None, driver_pool.warm_up)
+
+async def close_driver_pool_after(driver_pool, warm_up: Optional[asyncio.Future]):
+    """Дожидается прогрева (браузер не должен стартовать после закрытия) и закрывает пул"""
+    if warm_up is not None:
+        try:
+            await warm_up
+        except Exception as e:
+            logger.warning(f"Прогрев браузеров не удался: {str(e)}")
+    await asyncio.get_running_loop().run_in_executor(None, driver_pool.close)
 
-async def parse_single_tracking(tracking: Tracking, db: Session):
+def group_by_item(trackings: List[Tracking]) -> Dict[int, List[Tracking]]:
+    """Отслеживания по артикулу, в порядке первого появления артикула"""
+    grouped: Dict[int, List[Tracking]] = {}
+    for tracking in trackings:
+        grouped.setdefault(tracking.wb_item_id, []).append(tracking)
+    return grouped
+
+async def save_item_result(trackings: List[Tracking], result: dict, db: Session):
     """
-    Парсит одно отслеживание и сохраняет результат
+    Раскладывает результат парсинга артикула по его отслеживаниям.
+    Ошибка сохранения одного отслеживания не мешает остальным
     """
-    try:
-        # Получаем парсер
-        parser_service = ParserService()
-        result = parser_service.parse_wb_product(tracking.wb_item_id)
-        
-        if not result:
-            logger.warning(f"Не удалось получить данные для артикула {tracking.wb_item_id}")
-            return
-        
-        # Сохраняем результат в историю цен
-        price_history = PriceHistory(
-            tracking_id=tracking.id,
-            wb_id=tracking.wb_item_id,
-            wb_name=result['name'],
-            rating=result.get('rating'),
-            comment_count=result.get('feedback_count'),
-            price=result['price'],
-            checked_at=datetime.now()
-        )
+    for tracking in trackings:
+        try:
+            await save_tracking_result(tracking, result, db)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Ошибка при сохранении отслеживания {tracking.id}: {str(e)}")
+
+def add_item_result(trackings: List[Tracking], result: dict, db: Session) -> List[Tracking]:
+    """
+    Добавляет записи истории цен по всем отслеживаниям артикула в текущую
+    транзакцию, без commit - каждое в своей точке сохранения, так что ошибка
+    одного не мешает остальным. Возвращает отслеживания, получившие запись
+    """
+    added = []
+    for tracking in trackings:
+        try:
+            with db.begin_nested():
+                if add_tracking_result(tracking, result, db):
+                    added.append(tracking)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении отслеживания {tracking.id}: {str(e)}")
+    return added
+
+async def save_tracking_result(tracking: Tracking, result: dict, db: Session):
+    """
+    Сохраняет результат парсинга в историю цен отслеживания и проверяет целевую цену
+    """
+    if not add_tracking_result(tracking, result, db):
+        return
+    db.commit()
+    logger.info(f"Успешно сохранена запись для отслеживания {tracking.id}")
     
-        db.add(price_history)
-        db.commit()
-        logger.info(f"Успешно сохранена запись для отслеживания {tracking.id}")
-        
-        # Проверяем достижение целевой цены
-        await check_target_price_reached(tracking, result, db)
-        
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Ошибка при парсинге артикула {tracking.wb_item_id}: {str(e)}")
-        raise
+    # Проверяем достижение целевой цены
+    await check_target_price_reached(tracking, result, db)
+
+def add_tracking_result(tracking: Tracking, result: dict, db: Session) -> bool:
+    """Добавляет запись истории цен в текущую транзакцию, без commit. False - записывать нечего"""
+    if not result:
+        logger.warning(f"Не удалось получить данные для артикула {tracking.wb_item_id}")
+        return False
+    
+    if result.get('price') is None:
+        # Нет в наличии - цену в историю не пишем
+        logger.info(f"Товар {tracking.wb_item_id} без цены (нет в наличии), пропускаем")
+        return False
+    
+    # Сохраняем результат в историю цен
+    price_history = PriceHistory(
+        tracking_id=tracking.id,
+        wb_id=tracking.wb_item_id,
+        wb_name=result['name'],
+        rating=result.get('rating'),
+        comment_count=result.get('feedback_count'),
+        price=result['price'],
+        checked_at=datetime.now()
+    )
+
+    db.add(price_history)
+    return True
 
 async def check_target_price_reached(tracking: Tracking, result: dict, db: Session):
     """
@@ -97,6 +191,29 @@ async def check_target_price_reached(tracking: Tracking, result: dict, db: Sessi
     except Exception as e:
         logger.error(f"Ошибка при проверке целевой цены: {str(e)}")
 
+def enqueue_active_trackings() -> int:
+    """
+    Ставит в очередь parse_jobs по одной задаче на каждый отслеживаемый артикул
+    вместо парсинга в этом процессе; воркеры run_parse_worker.py парсят артикул
+    и обновляют все его активные отслеживания
+    """
+    db: Session = SessionLocal()
+    try:
+        item_ids = [row[0] for row in db.query(Tracking.wb_item_id).filter(
+            Tracking.is_active == True
+        ).distinct().all()]
+        
+        queued = 0
+        for wb_item_id in item_ids:
+            if enqueue(db, wb_item_id, PRIORITY_SCHEDULED, refresh_trackings=True):
+                queued += 1
+        
+        logger.info(f"В очередь поставлено {queued} из {len(item_ids)} отслеживаемых артикулов "
+                    f"(у остальных задача еще не завершена)")
+        return queued
+    finally:
+        db.close()
+
 def run_scheduled_parsing():
     """
     Функция для запуска из cron
@@ -104,4 +221,14 @@ def run_scheduled_parsing():
     asyncio.run(parse_all_active_trackings())
 
 if __name__ == "__main__":
-    run_scheduled_parsing()
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description="Плановое обновление цен отслеживаний")
+    arg_parser.add_argument(
+        '--enqueue', action='store_true',
+        help="поставить задачи в очередь parse_jobs для воркеров вместо парсинга в этом процессе"
+    )
+    args = arg_parser.parse_args()
+    
+    if args.enqueue:
+        enqueue_active_trackings()
+    else:
+        run_scheduled_parsing()
\ No newline at end of file
@@ -0,0 +1,86 @@
+import os
+from typing import Dict, List
+
+
+def _read_ppid_map() -> Dict[int, int]:
+    """Строит карту pid -> ppid по /proc (только Linux)"""
+    ppids = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                stat = f.read()
+            # Имя процесса в скобках может содержать пробелы - берем хвост после ')'
+            fields = stat[stat.rfind(')') + 2:].split()
+            ppids[int(entry)] = int(fields[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    return ppids
+
+
+def get_descendant_pids(pid: int) -> List[int]:
+    """Возвращает pid всех потомков процесса (дети, внуки и т.д.)"""
+    if not os.path.isdir('/proc'):
+        return []
+
+    children: Dict[int, List[int]] = {}
+    for child, parent in _read_ppid_map().items():
+        children.setdefault(parent, []).append(child)
+
+    result = []
+    stack = list(children.get(pid, []))
+    while stack:
+        current = stack.pop()
+        result.append(current)
+        stack.extend(children.get(current, []))
+    return result
+
+
+def find_pids_by_environ(name: str, value: str) -> List[int]:
+    """
+    pid процессов, запущенных с переменной окружения name=value.
+    Переменная наследуется потомками, поэтому находит и процессы,
+    переподчиненные init после смерти родителя
+    """
+    if not os.path.isdir('/proc'):
+        return []
+
+    needle = f'{name}={value}'.encode()
+    result = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/environ', 'rb') as f:
+                if needle in f.read().split(b'\0'):
+                    result.append(int(entry))
+        except OSError:
+            continue
+    return result
+
+
+def get_process_name(pid: int) -> str:
+    """Имя исполняемого файла процесса из /proc/<pid>/comm (пусто, если процесс недоступен)"""
+    try:
+        with open(f'/proc/{pid}/comm', 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+
+def get_rss_mb(pid: int) -> float:
+    """RSS одного процесса в мегабайтах (0, если процесс недоступен)"""
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0.0
+
+
+def get_process_tree_rss_mb(pid: int) -> float:
+    """Суммарный RSS процесса и всех его потомков в мегабайтах"""
+    return get_rss_mb(pid) + sum(get_rss_mb(child) for child in get_descendant_pids(pid))
@@ -0,0 +1,129 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class PhaseTimer:
+    """Замер длительности этапов одной операции (например, парсинга товара)"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._stopped: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float):
+        # Этап может выполняться несколько раз - суммируем
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def stop(self):
+        """Фиксирует общее время - дальнейшие обращения к total его не меняют"""
+        if self._stopped is None:
+            self._stopped = time.perf_counter()
+
+    @property
+    def total(self) -> float:
+        return (self._stopped or time.perf_counter()) - self._started
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(seconds, 4) for name, seconds in self.phases.items()}
+
+    def summary(self) -> str:
+        parts = [f"{name}={seconds:.2f}s" for name, seconds in self.phases.items()]
+        parts.append(f"total={self.total:.2f}s")
+        return ' '.join(parts)
+
+
+# Границы корзин гистограммы в секундах (последняя корзина - все, что больше)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def as_dict(self) -> dict:
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'avg': round(self.sum / self.count, 4) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'max': round(self.max, 4),
+            'buckets': dict(zip(bounds, self.counts)),
+        }
+
+
+class PhaseHistograms:
+    """
+    Агрегат записей PhaseTimer: гистограмма на каждую пару (бэкенд, этап).
+    Пишется из потоков executor, поэтому под блокировкой.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms: Dict[str, Dict[str, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, backend: str, phases: Dict[str, float], total: Optional[float] = None):
+        with self._lock:
+            histograms = self._histograms.setdefault(backend, {})
+            if total is not None:
+                phases = {**phases, 'total': total}
+            for name, seconds in phases.items():
+                if name not in histograms:
+                    histograms[name] = Histogram(self.buckets)
+                histograms[name].observe(seconds)
+
+    def record_timer(self, backend: str, timer: PhaseTimer):
+        self.record(backend, timer.phases, timer.total)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                backend: {name: histogram.as_dict() for name, histogram in histograms.items()}
+                for backend, histograms in self._histograms.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+# Общий агрегат процесса; записи из процессов пула присылаются в основной процесс
+parse_timings = PhaseHistograms()
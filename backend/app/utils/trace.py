@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+TRACE_OFF = 'off'
+TRACE_LEVELS = {
+    'debug': 10,
+    'info': 20,
+    'warning': 30,
+    TRACE_OFF: 100,
+}
+
+
+class ParseTrace:
+    """
+    Диагностическая трасса парсинга вместо print.
+
+    События пишутся в ограниченный кольцевой буфер по артикулу текущего потока
+    (последние `max_events` событий для последних `max_articles` артикулов).
+    Сообщение передается шаблоном с аргументами: при выключенном уровне вызов
+    сводится к одному сравнению, аргументы не форматируются - в продакшене
+    диагностика ничего не стоит.
+    """
+
+    def __init__(self, level: Optional[str] = None, max_articles: Optional[int] = None, max_events: Optional[int] = None):
+        self.max_articles = max_articles or settings.PARSER_TRACE_MAX_ARTICLES
+        self.max_events = max_events or settings.PARSER_TRACE_MAX_EVENTS
+        self._threshold = TRACE_LEVELS[TRACE_OFF]
+        self.set_level(level or settings.PARSER_TRACE)
+        self._buffers: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def set_level(self, level: str):
+        if level not in TRACE_LEVELS:
+            raise ValueError(f"Unknown trace level: {level}")
+        self.level = level
+        self._threshold = TRACE_LEVELS[level]
+
+    @property
+    def enabled(self) -> bool:
+        return self._threshold < TRACE_LEVELS[TRACE_OFF]
+
+    def begin(self, article: Optional[str]):
+        """Привязывает последующие события потока к артикулу и очищает его прошлую трассу"""
+        self._local.article = article
+        if article is not None and self.enabled:
+            with self._lock:
+                self._buffers.pop(article, None)
+
+    def debug(self, message: str, *args):
+        if self._threshold <= 10:
+            self._add(10, message, args)
+
+    def info(self, message: str, *args):
+        if self._threshold <= 20:
+            self._add(20, message, args)
+
+    def warning(self, message: str, *args):
+        if self._threshold <= 30:
+            self._add(30, message, args)
+
+    def _add(self, level: int, message: str, args: tuple):
+        article = getattr(self._local, 'article', None)
+        if article is None:
+            return
+        with self._lock:
+            buffer = self._buffers.get(article)
+            if buffer is None:
+                buffer = self._buffers[article] = deque(maxlen=self.max_events)
+                while len(self._buffers) > self.max_articles:
+                    self._buffers.popitem(last=False)
+            # Форматируем сразу: аргументы (элементы soup, словари) не удерживаются в буфере
+            buffer.append((time.time(), level, self._format(message, args)))
+
+    @staticmethod
+    def _format(message: str, args: tuple) -> str:
+        if not args:
+            return message
+        try:
+            return message % args
+        except (TypeError, ValueError):
+            return f"{message} {args}"
+
+    def dump(self, article: str) -> List[str]:
+        """Отформатированные события трассы артикула (пустой список, если ее нет)"""
+        with self._lock:
+            events = list(self._buffers.get(str(article), ()))
+        names = {value: name.upper() for name, value in TRACE_LEVELS.items()}
+        lines = []
+        for timestamp, level, text in events:
+            if level is None:
+                # Строка, уже отформатированная в процессе пула
+                lines.append(text)
+                continue
+            clock = time.strftime('%H:%M:%S', time.localtime(timestamp))
+            lines.append(f"{clock}.{int(timestamp % 1 * 1000):03d} {names[level]} {text}")
+        return lines
+
+    def export(self, article: str) -> Optional[List[str]]:
+        """Трасса для передачи из процесса пула; None, если трасса выключена"""
+        return self.dump(article) if self.enabled else None
+
+    def load(self, article: str, lines: List[str]):
+        """Принимает уже отформатированную трассу из процесса пула"""
+        with self._lock:
+            buffer = deque(((None, None, line) for line in lines), maxlen=self.max_events)
+            self._buffers[str(article)] = buffer
+            self._buffers.move_to_end(str(article))
+            while len(self._buffers) > self.max_articles:
+                self._buffers.popitem(last=False)
+
+    def articles(self) -> List[str]:
+        with self._lock:
+            return list(self._buffers)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'level': self.level,
+                'articles': len(self._buffers),
+                'events': sum(len(buffer) for buffer in self._buffers.values()),
+                'max_articles': self.max_articles,
+                'max_events': self.max_events,
+            }
+
+
+# Общая трасса процесса
+parse_trace = ParseTrace()
@@ -0,0 +1,199 @@
+"""
+Офлайн-бенчмарк извлечения полей на корпусе страниц товаров WB.
+
+Запуск из каталога backend:
+    python benchmarks/bench_extraction.py [--fixtures benchmarks/fixtures] [--repeat 50]
+    python benchmarks/bench_extraction.py --save before.json
+    python benchmarks/bench_extraction.py --compare before.json
+
+Для каждой страницы корпуса и каждого backend'а разбора замеряются этапы
+extract_from_html (построение дерева и каждый _extract_*), а для текстовых
+дампов - _find_price_in_text. Печатается пропускная способность (страниц/с, MB/с)
+и память (пик и удержанное по tracemalloc). Результаты сверяются с manifest.json,
+при расхождениях код возврата 1.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+# Добавляем путь к проекту в PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.wb.html_backends import HAS_LXML
+from app.services.wb.selenium_parser import WBSeleniumParser
+from app.utils.timing import PhaseTimer
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+
+
+def build_parsers() -> dict:
+    parsers = {
+        'bs4[html.parser]': WBSeleniumParser(html_backend='bs4', soup_features='html.parser'),
+    }
+    if HAS_LXML:
+        parsers['bs4[lxml]'] = WBSeleniumParser(html_backend='bs4', soup_features='lxml')
+        parsers['lxml fast path'] = WBSeleniumParser(html_backend='lxml')
+    return parsers
+
+
+def load_corpus(fixtures_dir: Path) -> list:
+    """Страницы корпуса: имя, HTML, текстовый дамп (если есть) и ожидаемые значения"""
+    manifest_path = fixtures_dir / 'manifest.json'
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8')) if manifest_path.exists() else {}
+    corpus = []
+    for page in sorted(fixtures_dir.glob('*.html')):
+        text_path = page.with_suffix('.txt')
+        corpus.append({
+            'name': page.stem,
+            'html': page.read_text(encoding='utf-8'),
+            'text': text_path.read_text(encoding='utf-8') if text_path.exists() else None,
+            'expected': manifest.get(page.stem, {}),
+        })
+    return corpus
+
+
+def time_extraction(parser: WBSeleniumParser, html: str, repeat: int) -> dict:
+    """Среднее время этапов extract_from_html на одну страницу, в мс"""
+    phases = defaultdict(float)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        timer = PhaseTimer()
+        parser.extract_from_html(html, timer)
+        for name, seconds in timer.phases.items():
+            phases[name] += seconds
+    elapsed = time.perf_counter() - started
+    result = {name: seconds / repeat * 1000 for name, seconds in phases.items()}
+    result['total'] = elapsed / repeat * 1000
+    return result
+
+
+def time_text_search(parser: WBSeleniumParser, text: str, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        parser._find_price_in_text(text)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def measure_memory(func, *args) -> dict:
+    """Пик и удержанная память одного вызова, в KB"""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = func(*args)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {'peak_kb': (peak - before) / 1024, 'retained_kb': (current - before) / 1024}
+
+
+def run(fixtures_dir: Path, repeat: int) -> dict:
+    corpus = load_corpus(fixtures_dir)
+    if not corpus:
+        print(f"Нет *.html страниц в {fixtures_dir}")
+        return {}
+
+    total_bytes = sum(len(page['html'].encode('utf-8')) for page in corpus)
+    print(f"Страниц: {len(corpus)}, объем: {total_bytes / 1024:.0f} KB, повторов: {repeat}\n")
+
+    report = {'repeat': repeat, 'backends': {}, 'text_search': {}, 'mismatches': []}
+    for backend_name, parser in build_parsers().items():
+        pages = {}
+        for page in corpus:
+            timings = time_extraction(parser, page['html'], repeat)
+            memory = measure_memory(parser.extract_from_html, page['html'])
+            pages[page['name']] = {'timings': timings, 'memory': memory}
+
+            expected = page['expected'].get('expected')
+            if expected is not None:
+                actual = parser.extract_from_html(page['html'])
+                if actual != expected:
+                    report['mismatches'].append({'backend': backend_name, 'page': page['name'],
+                                                 'expected': expected, 'actual': actual})
+
+        total_ms = sum(page['timings']['total'] for page in pages.values())
+        report['backends'][backend_name] = {
+            'pages': pages,
+            'pages_per_second': len(corpus) / total_ms * 1000,
+            'mb_per_second': total_bytes / 1024 / 1024 / total_ms * 1000,
+        }
+        print_backend(backend_name, report['backends'][backend_name])
+
+    text_parser = WBSeleniumParser()
+    print("_find_price_in_text по текстовым дампам")
+    for page in corpus:
+        if page['text'] is None:
+            continue
+        ms = time_text_search(text_parser, page['text'], repeat)
+        report['text_search'][page['name']] = ms
+        expected = page['expected']
+        status = ''
+        if 'expected_text_price' in expected:
+            actual = text_parser._find_price_in_text(page['text'])
+            if actual != expected['expected_text_price']:
+                status = f"DIFF {actual} != {expected['expected_text_price']}"
+                report['mismatches'].append({'backend': 'text', 'page': page['name'],
+                                             'expected': expected['expected_text_price'], 'actual': actual})
+        print(f"  {page['name']:<24} {ms:8.3f} ms {status}")
+    print()
+    return report
+
+
+def print_backend(name: str, result: dict):
+    pages = result['pages']
+    phases = sorted({phase for page in pages.values() for phase in page['timings']} - {'total'})
+    print(f"== {name}: {result['pages_per_second']:.1f} страниц/с, {result['mb_per_second']:.2f} MB/с")
+    widths = {phase: max(12, len(phase) + 2) for phase in phases}
+    header = f"  {'страница':<24}" + ''.join(f"{phase:>{widths[phase]}}" for phase in phases)
+    print(header + f"{'total':>12}{'peak KB':>10}{'kept KB':>10}")
+    for page_name, page in pages.items():
+        timings = page['timings']
+        row = f"  {page_name:<24}" + ''.join(
+            f"{timings[phase]:>{widths[phase] - 2}.3f}ms" if phase in timings else f"{'-':>{widths[phase]}}"
+            for phase in phases
+        )
+        row += f"{timings['total']:>10.3f}ms{page['memory']['peak_kb']:>10.0f}{page['memory']['retained_kb']:>10.1f}"
+        print(row)
+    print()
+
+
+def compare(report: dict, baseline_path: Path):
+    """Изменение среднего времени страницы относительно сохраненного прогона"""
+    baseline = json.loads(baseline_path.read_text(encoding='utf-8'))
+    print(f"Сравнение с {baseline_path}")
+    for name, result in report['backends'].items():
+        before = baseline.get('backends', {}).get(name)
+        if before is None:
+            continue
+        for page_name, page in result['pages'].items():
+            old = before['pages'].get(page_name)
+            if old is None:
+                continue
+            old_ms, new_ms = old['timings']['total'], page['timings']['total']
+            print(f"  {name:<18} {page_name:<24} {old_ms:8.3f} -> {new_ms:8.3f} ms ({(new_ms / old_ms - 1) * 100:+.1f}%)")
+    print()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--fixtures', type=Path, default=FIXTURES_DIR)
+    arg_parser.add_argument('--repeat', type=int, default=50)
+    arg_parser.add_argument('--save', type=Path, help="сохранить результаты в JSON")
+    arg_parser.add_argument('--compare', type=Path, help="сравнить с сохраненными результатами")
+    args = arg_parser.parse_args()
+
+    report = run(args.fixtures, args.repeat)
+    if args.compare:
+        compare(report, args.compare)
+    if args.save:
+        args.save.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    for mismatch in report.get('mismatches', []):
+        print(f"DIFF {mismatch['backend']} {mismatch['page']}: {mismatch['actual']} != {mismatch['expected']}")
+    sys.exit(1 if report.get('mismatches') else 0)
@@ -0,0 +1,91 @@
+"""
+Сравнение backend'ов разбора HTML на сохраненных страницах товаров WB.
+
+Запуск из каталога backend:
+    python benchmarks/bench_html_backends.py [путь/к/страницам] [--repeat 20]
+
+Страницы - файлы *.html (например, сохраненные через driver.page_source);
+по умолчанию - офлайн-корпус benchmarks/fixtures.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Добавляем путь к проекту в PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from app.services.wb.html_backends import HAS_LXML
+from app.services.wb.page_context import PageContext
+from app.services.wb.selenium_parser import WBSeleniumParser
+
+
+def extract_with_soup(parser: WBSeleniumParser, html: str, features: str) -> dict:
+    """Полный путь через BeautifulSoup с указанным парсером дерева"""
+    ctx = PageContext(BeautifulSoup(html, features))
+    return {
+        'name': parser._extract_name(ctx),
+        'price': parser._try_traditional_methods(ctx.soup),
+        'brand': parser._extract_brand(ctx),
+        'rating': parser._extract_rating(ctx),
+        'feedback_count': parser._extract_feedback_count(ctx),
+    }
+
+
+def build_variants():
+    variants = {
+        'bs4[html.parser]': lambda html: extract_with_soup(WBSeleniumParser(html_backend='bs4'), html, 'html.parser'),
+    }
+    if HAS_LXML:
+        variants['bs4[lxml]'] = lambda html: extract_with_soup(WBSeleniumParser(html_backend='bs4'), html, 'lxml')
+        variants['lxml fast path'] = WBSeleniumParser(html_backend='lxml').extract_from_html
+    return variants
+
+
+def run(pages_dir: Path, repeat: int):
+    pages = sorted(pages_dir.glob('*.html'))
+    if not pages:
+        print(f"Нет *.html страниц в {pages_dir}")
+        return
+
+    documents = [(page.name, page.read_text(encoding='utf-8')) for page in pages]
+    total_bytes = sum(len(html.encode('utf-8')) for _, html in documents)
+    print(f"Страниц: {len(documents)}, объем: {total_bytes / 1024:.0f} KB, повторов: {repeat}\n")
+
+    results = {}
+    for name, extract in build_variants().items():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for _, html in documents:
+                extract(html)
+        elapsed = time.perf_counter() - started
+        per_page_ms = elapsed / (repeat * len(documents)) * 1000
+        results[name] = per_page_ms
+        print(f"{name:<20} {per_page_ms:8.2f} ms/страница")
+
+    baseline = results['bs4[html.parser]']
+    print()
+    for name, per_page_ms in results.items():
+        print(f"{name:<20} x{baseline / per_page_ms:.1f} относительно bs4[html.parser]")
+
+    # Проверка, что быстрый путь извлекает то же самое
+    if HAS_LXML:
+        print()
+        fast = WBSeleniumParser(html_backend='lxml')
+        slow = WBSeleniumParser(html_backend='bs4')
+        for page_name, html in documents:
+            fast_data = fast.extract_from_html(html)
+            slow_data = slow.extract_from_html(html)
+            status = "OK" if fast_data == slow_data else f"DIFF {fast_data} != {slow_data}"
+            print(f"{page_name:<40} {status}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('pages_dir', type=Path, nargs='?', default=Path(__file__).parent / 'fixtures')
+    arg_parser.add_argument('--repeat', type=int, default=20)
+    args = arg_parser.parse_args()
+    run(args.pages_dir, args.repeat)
@@ -0,0 +1,59 @@
+"""
+Время загрузки и объем трафика страницы товара WB при разных профилях блокировки ресурсов.
+
+Запуск из каталога backend (нужен Chrome и доступ к wildberries.ru):
+    python benchmarks/bench_resource_blocking.py 452962756 240155230 [--profiles none media strict]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+from statistics import median
+
+# Добавляем путь к проекту в PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.wb.driver_pool import DriverPool
+from app.services.wb.resource_blocking import BLOCK_PROFILES
+from app.services.wb.selenium_parser import WBSeleniumParser
+
+
+def run(articles, profiles, repeat):
+    pool = DriverPool(size=1)
+    try:
+        # Первый запуск браузера не должен попадать в замер
+        pool.warm_up()
+        # Без кэша transferSize отражает реальный трафик каждой загрузки
+        with pool.lease() as driver:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setCacheDisabled', {'cacheDisabled': True})
+        print(f"{'profile':<8} {'load, s':>8} {'ready, s':>9} {'KB':>8} {'requests':>9} {'price found':>12}")
+        for profile in profiles:
+            loads, readies, kbytes, requests, found = [], [], [], [], 0
+            for _ in range(repeat):
+                for article in articles:
+                    parser = WBSeleniumParser(driver_pool=pool, block_profile=profile)
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        data = parser.parse(article)
+                    phases = parser.last_timings.phases
+                    metrics = parser.last_page_metrics or {}
+                    loads.append(phases.get('navigation', 0))
+                    readies.append(phases.get('navigation', 0) + phases.get('readiness', 0))
+                    kbytes.append(metrics.get('transfer_bytes', 0) / 1024)
+                    requests.append(metrics.get('resources', 0))
+                    found += data.get('price') is not None
+            total = repeat * len(articles)
+            print(f"{profile:<8} {median(loads):>8.2f} {median(readies):>9.2f} "
+                  f"{median(kbytes):>8.0f} {median(requests):>9.0f} {found:>6}/{total}")
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('articles', nargs='+')
+    arg_parser.add_argument('--profiles', nargs='+', default=list(BLOCK_PROFILES), choices=list(BLOCK_PROFILES))
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+    run(args.articles, args.profiles, args.repeat)
@@ -0,0 +1,64 @@
+"""
+Сохранение живой страницы товара WB в офлайн-корпус benchmarks/fixtures.
+
+Запуск из каталога backend:
+    python benchmarks/capture_fixture.py 152784390 in_stock_sneakers
+
+Сохраняет <имя>.html (driver.page_source после готовности страницы),
+<имя>.txt (innerText страницы - вход _find_price_in_text) и добавляет
+в manifest.json значения, которые извлек текущий парсер. Ожидаемые значения
+нужно проверить глазами по странице перед коммитом.
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# Добавляем путь к проекту в PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.wb.driver_pool import DriverPool
+from app.services.wb.selenium_parser import WBSeleniumParser
+from app.utils.timing import PhaseTimer
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+
+
+def capture(article: str, name: str, fixtures_dir: Path):
+    pool = DriverPool(size=1)
+    parser = WBSeleniumParser(driver_pool=pool)
+    try:
+        with pool.lease() as driver:
+            parser.driver = driver
+            parser._navigate(article, PhaseTimer())
+            parser._wait_until_ready()
+            html = driver.page_source
+            text = driver.execute_script("return document.body ? document.body.innerText : ''") or ''
+    finally:
+        parser.driver = None
+        pool.close()
+
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+    (fixtures_dir / f'{name}.html').write_text(html, encoding='utf-8')
+    (fixtures_dir / f'{name}.txt').write_text(text, encoding='utf-8')
+
+    manifest_path = fixtures_dir / 'manifest.json'
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8')) if manifest_path.exists() else {}
+    manifest[name] = {
+        'expected': parser.extract_from_html(html),
+        'expected_text_price': parser._find_price_in_text(text),
+    }
+    manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2) + '\n', encoding='utf-8')
+
+    print(f"Сохранено: {name}.html ({len(html) / 1024:.0f} KB), {name}.txt ({len(text) / 1024:.0f} KB)")
+    print(f"Ожидаемые значения (проверьте по странице): {manifest[name]}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('article')
+    arg_parser.add_argument('name', help="имя файлов в корпусе, например out_of_stock_dress")
+    arg_parser.add_argument('--fixtures', type=Path, default=FIXTURES_DIR)
+    args = arg_parser.parse_args()
+    capture(args.article, args.name, args.fixtures)
@@ -0,0 +1,48 @@
+"""
+Воркер очереди парсинга parse_jobs.
+
+Запуск из каталога backend (сколько угодно процессов на любых хостах с доступом к БД):
+    python run_parse_worker.py [--concurrency 2] [--worker-id host-1]
+    python run_parse_worker.py --retry-dead   # вернуть задачи из dead в очередь и выйти
+
+Задачи ставят планировщик (python app/utils/parse_on_schedule.py --enqueue)
+и POST /api/products/{article}/jobs.
+"""
+import argparse
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+# Загружаем .env
+load_dotenv()
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+from app.database import SessionLocal
+from app.services.job_queue import retry_dead
+from app.services.parse_worker import run_worker
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--concurrency', type=int, help="задач одновременно (по умолчанию PARSE_JOB_WORKER_CONCURRENCY)")
+    arg_parser.add_argument('--worker-id', help="имя воркера в parse_jobs.locked_by (по умолчанию host:pid)")
+    arg_parser.add_argument('--retry-dead', action='store_true', help="вернуть задачи из dead в очередь и выйти")
+    args = arg_parser.parse_args()
+    
+    if args.retry_dead:
+        db = SessionLocal()
+        try:
+            print(f"Возвращено в очередь: {retry_dead(db)}")
+        finally:
+            db.close()
+        return
+    
+    asyncio.run(run_worker(args.concurrency, args.worker_id))
+
+if __name__ == "__main__":
+    main()